@@ -1,6 +1,154 @@
+import json
+import os
+import sys
 import tkinter as tk
 from tkinter import colorchooser, filedialog
-from PIL import ImageGrab  # 需要安装 Pillow 库：pip install Pillow
+
+import instrument
+import startup_profile
+
+# 位图相关功能需要安装 Pillow 库：pip install Pillow
+# PIL 只在压平、加载文档和保存图片时才导入，以加快启动
+
+# 画布上保留为独立对象的最近图形数量，超出后较早的图形会被压平到背景位图
+LIVE_ITEM_LIMIT = 200
+
+# 画板文档：JSON Lines 格式的操作日志，第一行为文件头，之后每行一个图形或操作
+DOCUMENT_FORMAT = "huaban-strokes"
+DOCUMENT_VERSION = 1
+AUTOSAVE_FILE = "autosave.hbd"
+
+
+class Stroke:
+    """场景模型中的一个已完成图形"""
+
+    def __init__(self, shape, coords, color, width):
+        self.shape = shape
+        self.coords = coords
+        self.color = color
+        self.width = width
+        self.item = None  # 对应的画布对象ID，压平到背景后为 None
+
+    def to_record(self):
+        return {"shape": self.shape, "coords": list(self.coords),
+                "color": self.color, "width": self.width}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["shape"], tuple(record["coords"]), record["color"], record["width"])
+
+
+def render_stroke(draw, stroke, scale=1):
+    """用 PIL 把图形绘制到位图上"""
+    x0, y0, x1, y1 = (c * scale for c in stroke.coords)
+    width = max(1, round(stroke.width * scale))
+    if stroke.shape == "line":
+        draw.line((x0, y0, x1, y1), fill=stroke.color, width=width)
+        return
+    box = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    if stroke.shape == "rectangle":
+        draw.rectangle(box, outline=stroke.color, width=width)
+    elif stroke.shape == "oval":
+        draw.ellipse(box, outline=stroke.color, width=width)
+
+
+def dump_record(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def read_document(path):
+    """读取画板文档并回放操作日志，返回 (文件头, 图形列表, 日志中是否有撤销/清空操作)"""
+    header = None
+    strokes = []
+    replayed = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 程序崩溃时最后一行可能只写了一半，跳过即可
+                continue
+            if header is None:
+                if record.get("format") != DOCUMENT_FORMAT:
+                    raise ValueError("不是有效的画板文档")
+                header = record
+                continue
+            op = record.get("op")
+            if op is None:
+                strokes.append(Stroke.from_record(record))
+            elif op == "undo":
+                if strokes:
+                    strokes.pop()
+                replayed = True
+            elif op == "clear":
+                strokes.clear()
+                replayed = True
+    if header is None:
+        raise ValueError("不是有效的画板文档")
+    return header, strokes, replayed
+
+
+def set_aside(path):
+    """把读不了的文档改名为 <文件名>.bad 留作排查，原位置空出来"""
+    try:
+        os.replace(path, path + ".bad")
+    except OSError:
+        pass
+
+
+def write_document(path, strokes, size):
+    """把场景完整写成一个紧凑的画板文档（先写临时文件再替换）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(dump_record({"format": DOCUMENT_FORMAT, "version": DOCUMENT_VERSION,
+                             "width": size[0], "height": size[1]}))
+        f.writelines(dump_record(stroke.to_record()) for stroke in strokes)
+    os.replace(tmp_path, path)
+
+
+def make_thumbnail(path, max_size=(160, 120)):
+    """直接按缩略图尺寸绘制文档内容，不需要渲染完整画面"""
+    from PIL import Image, ImageDraw
+
+    header, strokes, _ = read_document(path)
+    width, height = header.get("width", 800), header.get("height", 600)
+    for stroke in strokes:
+        width = max(width, stroke.coords[0], stroke.coords[2])
+        height = max(height, stroke.coords[1], stroke.coords[3])
+    scale = min(max_size[0] / width, max_size[1] / height)
+    image = Image.new("RGB", (max(1, int(width * scale)), max(1, int(height * scale))), "white")
+    draw = ImageDraw.Draw(image)
+    for stroke in strokes:
+        render_stroke(draw, stroke, scale)
+    return image
+
+
+class DocumentLog:
+    """只追加写入的文档日志，每条记录写完立即刷新到磁盘"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        if self.file.tell() == 0:
+            self.append({"format": DOCUMENT_FORMAT, "version": DOCUMENT_VERSION,
+                         "width": size[0], "height": size[1]})
+        else:
+            # 上次崩溃留下半行时先换行，免得新记录接在残缺的行后面
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def append(self, record):
+        self.file.write(dump_record(record))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
 
 class DrawingApp:
     def __init__(self, root):
@@ -13,6 +161,14 @@ class DrawingApp:
         self.draw_shape = "line"  # 当前绘制形状：line/rectangle/oval
         self.start_x, self.start_y = None, None  # 记录起始坐标
 
+        # 场景模型：按绘制顺序保存全部图形，strokes[:flat_count] 已压平到背景位图
+        self.strokes = []
+        self.flat_count = 0
+        self.background = None  # 背景位图（PIL Image）
+        self.background_photo = None
+        self.background_item = None
+        self.document = None  # 当前文档的追加日志
+
         # 创建画布
         self.canvas = tk.Canvas(root, bg="white", width=800, height=600)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -52,10 +208,27 @@ class DrawingApp:
         save_btn = tk.Button(control_frame, text="保存图片", command=self.save_image)
         save_btn.pack(pady=5)
 
+        # 文档按钮
+        tk.Button(control_frame, text="打开文档", command=self.open_document).pack(pady=5)
+        tk.Button(control_frame, text="另存文档", command=self.save_document_as).pack(pady=5)
+
         # 绑定鼠标事件
         self.canvas.bind("<Button-1>", self.start_drawing)
         self.canvas.bind("<B1-Motion>", self.drawing)
         self.canvas.bind("<ButtonRelease-1>", self.stop_drawing)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.root.bind("<Control-z>", self.undo)
+
+        # 自动保存：启动时恢复上次的内容，之后每一笔都追加写入
+        if os.path.exists(AUTOSAVE_FILE):
+            try:
+                self.load_document(AUTOSAVE_FILE)
+            except (OSError, ValueError, KeyError):
+                # 崩溃后自动保存文件可能是空的或文件头不完整：挪到一边，从空白画布开始
+                self.reset_scene()
+                set_aside(AUTOSAVE_FILE)
+        if self.document is None:
+            self.document = DocumentLog(AUTOSAVE_FILE, self.background_size())
 
     def choose_color(self):
         color = colorchooser.askcolor()[1]
@@ -67,59 +240,172 @@ class DrawingApp:
         self.pen_size = int(value)
 
     def clear_canvas(self):
+        self.reset_scene()
+        self.document.append({"op": "clear"})
+
+    def reset_scene(self):
         self.canvas.delete("all")
+        self.strokes = []
+        self.flat_count = 0
+        self.background = None
+        self.background_photo = None
+        self.background_item = None
 
     def start_drawing(self, event):
         self.start_x, self.start_y = event.x, event.y
 
+    def create_shape(self, shape, coords, color, width, tags=()):
+        """在画布上创建一个图形对象"""
+        if shape == "line":
+            return self.canvas.create_line(*coords, fill=color, width=width, tags=tags)
+        elif shape == "rectangle":
+            return self.canvas.create_rectangle(*coords, outline=color, width=width, tags=tags)
+        elif shape == "oval":
+            return self.canvas.create_oval(*coords, outline=color, width=width, tags=tags)
+
     def drawing(self, event):
         if self.start_x and self.start_y:
             # 绘制临时图形（跟随鼠标移动）
             self.canvas.delete("temp")  # 删除上一个临时图形
-            shape = self.shape_var.get()
-            if shape == "line":
-                self.canvas.create_line(
-                    self.start_x, self.start_y, event.x, event.y,
-                    fill=self.pen_color, width=self.pen_size, tags="temp"
-                )
-            elif shape == "rectangle":
-                self.canvas.create_rectangle(
-                    self.start_x, self.start_y, event.x, event.y,
-                    outline=self.pen_color, width=self.pen_size, tags="temp"
-                )
-            elif shape == "oval":
-                self.canvas.create_oval(
-                    self.start_x, self.start_y, event.x, event.y,
-                    outline=self.pen_color, width=self.pen_size, tags="temp"
-                )
+            self.create_shape(self.shape_var.get(),
+                              (self.start_x, self.start_y, event.x, event.y),
+                              self.pen_color, self.pen_size, tags="temp")
 
     def stop_drawing(self, event):
         # 绘制最终图形
         if self.start_x and self.start_y:
-            shape = self.shape_var.get()
-            if shape == "line":
-                self.canvas.create_line(
-                    self.start_x, self.start_y, event.x, event.y,
-                    fill=self.pen_color, width=self.pen_size
-                )
-            elif shape == "rectangle":
-                self.canvas.create_rectangle(
-                    self.start_x, self.start_y, event.x, event.y,
-                    outline=self.pen_color, width=self.pen_size
-                )
-            elif shape == "oval":
-                self.canvas.create_oval(
-                    self.start_x, self.start_y, event.x, event.y,
-                    outline=self.pen_color, width=self.pen_size
-                )
+            self.canvas.delete("temp")
+            stroke = Stroke(self.shape_var.get(),
+                            (self.start_x, self.start_y, event.x, event.y),
+                            self.pen_color, self.pen_size)
+            self.add_stroke(stroke)
+            self.document.append(stroke.to_record())
         self.start_x, self.start_y = None, None
 
+    def add_stroke(self, stroke):
+        """把图形加入场景模型，画布对象过多时压平较早的图形"""
+        self.strokes.append(stroke)
+        stroke.item = self.create_shape(stroke.shape, stroke.coords,
+                                        stroke.color, stroke.width, tags="live")
+        if len(self.strokes) - self.flat_count > LIVE_ITEM_LIMIT:
+            # 一次压平一半，避免每画一笔都重建背景位图
+            self.flatten(len(self.strokes) - LIVE_ITEM_LIMIT // 2)
+
+    def flatten(self, upto):
+        """把 strokes[:upto] 绘制到背景位图并删除对应的画布对象"""
+        if upto <= self.flat_count:
+            return
+        from PIL import Image, ImageDraw
+
+        if self.background is None:
+            self.background = Image.new("RGB", self.background_size(), "white")
+        draw = ImageDraw.Draw(self.background)
+        for stroke in self.strokes[self.flat_count:upto]:
+            render_stroke(draw, stroke)
+            self.canvas.delete(stroke.item)
+            stroke.item = None
+        self.flat_count = upto
+        self.show_background()
+
+    def undo(self, event=None):
+        """撤销最后一个图形"""
+        if not self.strokes:
+            return
+        stroke = self.strokes.pop()
+        self.document.append({"op": "undo"})
+        if stroke.item is not None:
+            self.canvas.delete(stroke.item)
+        else:
+            # 图形已压平，从场景模型重绘背景位图
+            self.flat_count = len(self.strokes)
+            self.rebuild_background()
+
+    def rebuild_background(self, size=None):
+        """根据场景模型重新绘制背景位图"""
+        if self.flat_count == 0:
+            self.canvas.delete("background")
+            self.background = None
+            self.background_photo = None
+            self.background_item = None
+            return
+        from PIL import Image, ImageDraw
+
+        self.background = Image.new("RGB", size or self.background_size(), "white")
+        draw = ImageDraw.Draw(self.background)
+        for stroke in self.strokes[:self.flat_count]:
+            render_stroke(draw, stroke)
+        self.show_background()
+
+    def background_size(self):
+        width = max(self.canvas.winfo_width(), int(self.canvas["width"]))
+        height = max(self.canvas.winfo_height(), int(self.canvas["height"]))
+        return width, height
+
+    def show_background(self):
+        """把背景位图显示在画布最底层"""
+        from PIL import ImageTk
+
+        self.background_photo = ImageTk.PhotoImage(self.background)
+        if self.background_item is None:
+            self.background_item = self.canvas.create_image(0, 0, anchor=tk.NW,
+                                                            image=self.background_photo,
+                                                            tags="background")
+            self.canvas.tag_lower(self.background_item)
+        else:
+            self.canvas.itemconfig(self.background_item, image=self.background_photo)
+
+    def on_resize(self, event):
+        # 画布变大时按新尺寸重绘背景，避免压平的图形被裁掉
+        if self.background is not None and (event.width > self.background.width or
+                                            event.height > self.background.height):
+            self.rebuild_background((max(event.width, self.background.width),
+                                     max(event.height, self.background.height)))
+
+    def load_document(self, path):
+        """加载画板文档：较早的图形一次性绘制到背景位图，只为最近的图形创建画布对象"""
+        header, strokes, replayed = read_document(path)
+        if self.document is not None:
+            self.document.close()
+        self.reset_scene()
+        self.strokes = strokes
+        self.flat_count = max(0, len(strokes) - LIVE_ITEM_LIMIT // 2)
+        self.rebuild_background()
+        for stroke in strokes[self.flat_count:]:
+            stroke.item = self.create_shape(stroke.shape, stroke.coords,
+                                            stroke.color, stroke.width, tags="live")
+        if replayed:
+            # 日志里有撤销/清空记录时顺便压缩文档
+            write_document(path, strokes, (header["width"], header["height"]))
+        self.document = DocumentLog(path, self.background_size())
+        self.root.title(f"画板 - {os.path.basename(path)}")
+
+    def open_document(self):
+        file_path = filedialog.askopenfilename(filetypes=[("画板文档", "*.hbd"), ("所有文件", "*.*")])
+        if file_path:
+            try:
+                self.load_document(file_path)
+            except (OSError, ValueError, KeyError) as e:
+                tk.messagebox.showerror("打开失败", f"无法读取文档：{e}")
+
+    def save_document_as(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".hbd",
+            filetypes=[("画板文档", "*.hbd"), ("所有文件", "*.*")]
+        )
+        if file_path:
+            write_document(file_path, self.strokes, self.background_size())
+            self.document.close()
+            self.document = DocumentLog(file_path, self.background_size())
+            self.root.title(f"画板 - {os.path.basename(file_path)}")
+
     def save_image(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
             filetypes=[("PNG 图片", "*.png"), ("所有文件", "*.*")]
         )
         if file_path:
+            from PIL import ImageGrab
+
             # 获取画布区域坐标
             x = self.root.winfo_rootx() + self.canvas.winfo_x()
             y = self.root.winfo_rooty() + self.canvas.winfo_y()
@@ -130,6 +416,14 @@ class DrawingApp:
             tk.messagebox.showinfo("保存成功", f"图片已保存至：{file_path}")
 
 if __name__ == "__main__":
+    # python 11.py --thumbnail 文档.hbd 缩略图.png
+    if len(sys.argv) == 4 and sys.argv[1] == "--thumbnail":
+        make_thumbnail(sys.argv[2]).save(sys.argv[3])
+        sys.exit()
+
+    startup_profile.run_if_requested()
     root = tk.Tk()
+    instrument.install_if_enabled(root)
     app = DrawingApp(root)
+    startup_profile.watch_first_paint(root)
     root.mainloop()
\ No newline at end of file
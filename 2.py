@@ -1,48 +1,13 @@
+import random
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-import os
 from tkinter import font as tkfont
-import random
-
-
-class AddressBook:
-    def __init__(self, filename='contacts.json'):
-        self.filename = filename
-        self.contacts = []
-        self.load_contacts()
-
-    def load_contacts(self):
-        if os.path.exists(self.filename):
-            with open(self.filename, 'r') as f:
-                data = json.load(f)
-                self.contacts = [Contact(**item) for item in data]
-
-    def save_contacts(self):
-        data = [vars(contact) for contact in self.contacts]
-        with open(self.filename, 'w') as f:
-            json.dump(data, f, indent=2)
-
-    def add_contact(self, contact):
-        self.contacts.append(contact)
-        self.save_contacts()
-
-    def delete_contact(self, name):
-        self.contacts = [c for c in self.contacts if c.name != name]
-        self.save_contacts()
-
-    def search_contacts(self, keyword):
-        return [c for c in self.contacts
-                if keyword.lower() in c.name.lower() or
-                keyword in c.phone]
+from tkinter import ttk, messagebox
 
+import instrument
+import startup_profile
+from addressbook import AddressBook, ConflictError, Contact
 
-class Contact:
-    def __init__(self, name, phone, email, address):
-        self.name = name
-        self.phone = phone
-        self.email = email
-        self.address = address
+POLL_MS = 1000  # 检查其他程序是否修改了通讯录的间隔
 
 
 class CyberpunkContactApp:
@@ -67,6 +32,8 @@ class CyberpunkContactApp:
         self.create_cyber_ui()
         self.address_book = AddressBook()
         self.update_contact_list()
+        # 与 txl 共用同一个通讯录时，定期合并对方保存的修改
+        self.root.after(POLL_MS, self.poll_contacts)
 
     def setup_fonts(self):
         # 尝试加载赛博朋克风格字体
@@ -307,6 +274,13 @@ class CyberpunkContactApp:
                 contact.email
             ))
 
+    def poll_contacts(self):
+        """其他程序修改了通讯录时刷新列表"""
+        changes = self.address_book.poll_changes()
+        if changes and any(changes.values()):
+            self.update_contact_list(self.search_var.get())
+        self.root.after(POLL_MS, self.poll_contacts)
+
     def on_search(self, event):
         self.update_contact_list(self.search_var.get())
 
@@ -364,8 +338,7 @@ class CyberpunkContactApp:
             try:
                 if contact:
                     # 更新现有联系人
-                    contact.__dict__.update(data)
-                    self.address_book.save_contacts()
+                    self.address_book.update_contact(contact, data)
                     self.show_cyber_message("成功", f"{data['name']} 已更新！")
                 else:
                     # 添加新联系人
@@ -374,6 +347,11 @@ class CyberpunkContactApp:
 
                 self.update_contact_list()
                 dialog.destroy()
+            except ConflictError as e:
+                # 内存中已是其他终端保存的最新内容，关闭对话框让用户重新编辑
+                self.update_contact_list(self.search_var.get())
+                dialog.destroy()
+                self.show_cyber_message("冲突", str(e), is_error=True)
             except Exception as e:
                 self.show_cyber_message("错误", f"保存失败: {str(e)}", is_error=True)
 
@@ -607,7 +585,9 @@ class CyberpunkContactApp:
 
 
 if __name__ == "__main__":
+    startup_profile.run_if_requested()
     root = tk.Tk()
+    instrument.install_if_enabled(root)
 
     # 添加启动动画
     splash = tk.Toplevel(root)
@@ -642,10 +622,12 @@ if __name__ == "__main__":
             splash.update()
             root.after(20)
         splash.destroy()
+        root.deiconify()  # 显示主窗口
         root.after(100, lambda: CyberpunkContactApp(root))
 
 
     root.after(100, update_progress)
     root.withdraw()
+    startup_profile.watch_first_paint(root)
 
     root.mainloop()
\ No newline at end of file
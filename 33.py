@@ -1,8 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 from datetime import datetime
 
+import agent_schema
+import agent_store
+import instrument
+import startup_profile
+from change_feed import DELETED, INSERTED, UPDATED
+from sorted_view import SortedView
+
 
 class CIASurveillanceSystem:
     def __init__(self, root):
@@ -21,12 +27,17 @@ class CIASurveillanceSystem:
             "button_color": "#003366"  # 按钮颜色
         }
 
-        self.agents = {}
+        self.store = agent_store.AgentStore()
         self.current_file = None
+        self.refresh_id = None
+        # 点击列标题排序，按住 Shift 点击追加次要排序列
+        self.sorter = SortedView(self.sort_value)
 
         # 初始化样式
         self.configure_styles()
         self.create_widgets()
+        # 列表订阅数据变化，每次修改只更新变化的那几行
+        self.store.changes.subscribe(self.on_agent_changed)
         self.load_initial_data()
 
     def configure_styles(self):
@@ -115,6 +126,17 @@ class CIASurveillanceSystem:
         ttk.Button(btn_frame, text="删除特工", command=self.delete_agent).pack(side=tk.LEFT, padx=3)
         ttk.Button(btn_frame, text="深度分析", command=self.show_analysis).pack(side=tk.LEFT, padx=3)
 
+        # 全文检索栏，支持 location:莫斯科 status:活跃 这样的字段过滤
+        search_frame = ttk.Frame(self.root)
+        search_frame.pack(fill=tk.X, padx=10)
+
+        ttk.Label(search_frame, text="情报检索:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=50)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<KeyRelease>", lambda e: self.update_treeview())
+        ttk.Label(search_frame, text="例: location:莫斯科 status:活跃 核武").pack(side=tk.LEFT)
+
         # 情报数据库视图
         tree_frame = ttk.Frame(self.root)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -132,8 +154,9 @@ class CIASurveillanceSystem:
             "last_contact": 150
         }
 
+        self.column_titles = {col: col.replace("_", " ").title() for col in columns}
         for col in columns:
-            self.tree.heading(col, text=col.replace("_", " ").title())
+            self.tree.heading(col, text=self.column_titles[col])
             self.tree.column(col, width=col_widths[col], anchor=tk.CENTER)
 
         vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
@@ -150,6 +173,8 @@ class CIASurveillanceSystem:
         # 绑定事件
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
         self.tree.bind("<Double-1>", self.show_full_profile)
+        self.tree.bind("<Button-1>", self.on_heading_click)
+        self.tree.bind("<Shift-Button-1>", lambda e: self.on_heading_click(e, extend=True))
 
     def update_agent(self):
         agent_id = self.entries["agent_id"].get().strip()
@@ -173,8 +198,11 @@ class CIASurveillanceSystem:
             messagebox.showerror("错误", "必须填写行动代号和当前位置")
             return
 
-        self.agents[agent_id] = agent_data
-        self.update_treeview()
+        try:
+            self.store.put(agent_id, agent_data)
+        except agent_schema.SchemaError as e:
+            messagebox.showerror("错误", str(e))
+            return
         messagebox.showinfo("成功", f"特工 {agent_data['codename']} 档案已更新")
         self.clear_entries()
 
@@ -183,42 +211,100 @@ class CIASurveillanceSystem:
         if not selected:
             return
 
-        agent_id = self.tree.item(selected[0], "values")[0]
+        agent_id = selected[0]
         if messagebox.askyesno("确认", f"确定要删除特工 {agent_id} 的所有记录？"):
-            del self.agents[agent_id]
-            self.update_treeview()
+            self.store.delete(agent_id)
 
     def update_treeview(self):
+        self.refresh_id = None
         self.tree.delete(*self.tree.get_children())
-        for agent_id, data in self.agents.items():
-            self.tree.insert("", "end", values=(
-                agent_id,
-                data["codename"],
-                data["age"],
-                data["location"],
-                data["status"],
-                data["last_contact"]
-            ))
+        query = self.search_var.get().strip()
+        agent_ids = self.store.search(query) if query else self.store.agents
+        if self.sorter:
+            # 排序键按特工缓存，换一种排序或重新检索时不必再算
+            self.sorter.rebuild(agent_ids)
+            agent_ids = self.sorter.records()
+        for agent_id in agent_ids:
+            # 行号就是特工编号
+            self.tree.insert("", "end", iid=agent_id, values=self.row_values(agent_id))
+
+    def row_values(self, agent_id):
+        data = self.store[agent_id]
+        return (
+            agent_id,
+            data["codename"],
+            data.text("age"),
+            data["location"],
+            data["status"],
+            data.text("last_contact")
+        )
+
+    def on_agent_changed(self, event):
+        """按单条变化更新列表；有检索条件时合并成一次重新检索"""
+        if event.kind != INSERTED:
+            self.sorter.forget(event.key)
+        if self.search_var.get().strip():
+            if self.refresh_id is None:
+                self.refresh_id = self.root.after_idle(self.update_treeview)
+        elif self.sorter:
+            self.apply_sorted_change(event)
+        elif event.kind == DELETED:
+            if self.tree.exists(event.key):
+                self.tree.delete(event.key)
+        elif self.tree.exists(event.key):
+            self.tree.item(event.key, values=self.row_values(event.key))
+        else:
+            self.tree.insert("", "end", iid=event.key, values=self.row_values(event.key))
+
+    def apply_sorted_change(self, event):
+        """排序状态下用 bisect 找到变化的位置，只移动这一行"""
+        if event.kind == DELETED:
+            self.sorter.remove(event.key)
+            self.tree.delete(event.key)
+        elif event.kind == UPDATED:
+            _, pos = self.sorter.update(event.key)
+            self.tree.item(event.key, values=self.row_values(event.key))
+            # 先摘下再放回，move 的位置就是最终位置
+            self.tree.detach(event.key)
+            self.tree.move(event.key, "", pos)
+        else:
+            pos = self.sorter.insert(event.key)
+            self.tree.insert("", pos, iid=event.key, values=self.row_values(event.key))
+
+    def sort_value(self, agent_id, column):
+        return agent_id if column == "agent_id" else self.store[agent_id].get(column, "")
+
+    def on_heading_click(self, event, extend=False):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return
+        column = self.tree.column(self.tree.identify_column(event.x), "id")
+        if column not in self.column_titles:
+            return
+        if not self.sorter.toggle(column, extend):
+            self.sorter.rebuild(())
+        for column, title in self.sorter.headings(self.column_titles).items():
+            self.tree.heading(column, text=title)
+        self.update_treeview()
 
     def on_select(self, event):
         selected = self.tree.selection()
         if not selected:
             return
 
-        agent_id = self.tree.item(selected[0], "values")[0]
-        agent_data = self.agents.get(agent_id)
+        agent_id = selected[0]
+        agent_data = self.store.get(agent_id)
         if agent_data:
             self.entries["agent_id"].delete(0, tk.END)
             self.entries["agent_id"].insert(0, agent_id)
             self.entries["codename"].delete(0, tk.END)
             self.entries["codename"].insert(0, agent_data["codename"])
             self.entries["age"].delete(0, tk.END)
-            self.entries["age"].insert(0, agent_data["age"])
+            self.entries["age"].insert(0, agent_data.text("age"))
             self.entries["location"].delete(0, tk.END)
             self.entries["location"].insert(0, agent_data["location"])
             self.entries["status"].set(agent_data["status"])
             self.entries["last_contact"].delete(0, tk.END)
-            self.entries["last_contact"].insert(0, agent_data["last_contact"])
+            self.entries["last_contact"].insert(0, agent_data.text("last_contact"))
             self.mission_log.delete("1.0", tk.END)
             self.mission_log.insert("1.0", agent_data.get("missions", ""))
 
@@ -227,8 +313,8 @@ class CIASurveillanceSystem:
         if not selected:
             return
 
-        agent_id = self.tree.item(selected[0], "values")[0]
-        agent_data = self.agents.get(agent_id)
+        agent_id = selected[0]
+        agent_data = self.store.get(agent_id)
 
         profile_window = tk.Toplevel(self.root)
         profile_window.title(f"绝密档案 - {agent_id}")
@@ -245,11 +331,11 @@ class CIASurveillanceSystem:
         profile_content = f"""▌ CIA 绝密档案 - {agent_data['codename']} ▐
 
 编号: {agent_id}
-年龄: {agent_data['age']}
+年龄: {agent_data.text('age')}
 状态: {agent_data['status']}
 最后已知位置: {agent_data['location']}
-最后联络时间: {agent_data['last_contact']}
-建档时间: {agent_data['created']}
+最后联络时间: {agent_data.text('last_contact')}
+建档时间: {agent_data.text('created')}
 
 === 任务记录 ===
 {agent_data.get('missions', '暂无记录')}
@@ -262,13 +348,10 @@ class CIASurveillanceSystem:
         analysis_window.title("战略态势分析")
         analysis_window.geometry("400x300")
 
-        status_count = {}
-        for agent in self.agents.values():
-            status = agent["status"]
-            status_count[status] = status_count.get(status, 0) + 1
+        status_count = self.store.counts
 
         analysis_text = "▌ 当前行动态势分析 ▐\n\n"
-        analysis_text += f"总特工人数: {len(self.agents)}\n"
+        analysis_text += f"总特工人数: {len(self.store)}\n"
         for status, count in status_count.items():
             analysis_text += f"{status}: {count}\n"
 
@@ -277,16 +360,15 @@ class CIASurveillanceSystem:
 
     def new_db(self):
         if messagebox.askyesno("新建数据库", "这将清除当前所有数据，是否继续？"):
-            self.agents.clear()
-            self.update_treeview()
+            self.store.clear()
             self.current_file = None
 
     def open_db(self):
         file_path = filedialog.askopenfilename(filetypes=[("CIA数据库文件", "*.ciadb")])
         if file_path:
             try:
-                with open(file_path, "r") as f:
-                    self.agents = json.load(f)
+                self.store.load(file_path)
+                self.sorter.reset()
                 self.current_file = file_path
                 self.update_treeview()
                 messagebox.showinfo("成功", "数据库加载完成")
@@ -299,8 +381,7 @@ class CIASurveillanceSystem:
             return
 
         try:
-            with open(self.current_file, "w") as f:
-                json.dump(self.agents, f, indent=2)
+            self.store.save(self.current_file, encoded=False)
             messagebox.showinfo("成功", "数据库保存成功")
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {str(e)}")
@@ -320,7 +401,7 @@ class CIASurveillanceSystem:
                 with open(file_path, "w") as f:
                     f.write("▌ CIA 战略情报报告 ▐\n")
                     f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                    for agent_id, data in self.agents.items():
+                    for agent_id, data in self.store.items():
                         f.write(f"特工编号: {agent_id}\n")
                         f.write(f"行动代号: {data['codename']}\n")
                         f.write(f"当前状态: {data['status']}\n")
@@ -339,7 +420,7 @@ class CIASurveillanceSystem:
 
     def load_initial_data(self):
         # 示例数据加载（实际使用时可移除）
-        self.agents["007"] = {
+        self.store.put("007", {
             "codename": "Ghost",
             "age": 35,
             "location": "莫斯科",
@@ -347,11 +428,13 @@ class CIASurveillanceSystem:
             "last_contact": "2023-10-05 22:00",
             "missions": "2023-09-15: 成功渗透克格勃网络\n2023-10-01: 获取核武计划情报",
             "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.update_treeview()
+        })
 
 
 if __name__ == "__main__":
+    startup_profile.run_if_requested()
     root = tk.Tk()
+    instrument.install_if_enabled(root)
     app = CIASurveillanceSystem(root)
+    startup_profile.watch_first_paint(root)
     root.mainloop()
\ No newline at end of file
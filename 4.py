@@ -1,9 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
-import base64
 from datetime import datetime
-import webbrowser
+
+import agent_schema
+import agent_store
+import instrument
+import startup_profile
+from change_feed import DELETED, INSERTED, UPDATED
+from sorted_view import SortedView, collation_key
+
+# 分组视图可选的字段
+GROUP_FIELDS = {"不分组": None, "状态": "status", "密级": "clearance", "位置": "location"}
+# 失联阈值的候选天数（也可以直接输入），以及定时检查的间隔
+STALE_DAYS = ("1", "7", "30", "90", "365")
+STALE_CHECK_MS = 60 * 1000
 
 
 class CIASurveillanceSystem:
@@ -13,15 +23,31 @@ class CIASurveillanceSystem:
         self.root.geometry("1280x800")
         self.root.configure(bg="#001933")
 
-        # 初始化情报数据库
-        self.agents = {}
+        # 初始化情报数据库；全文索引和状态统计由 store 随修改增量维护
+        self.store = agent_store.AgentStore()
         self.current_file = None
         self.encryption_key = "CIA-TOP-SECRET-2023"
+        self.refresh_id = None
+        # 点击列标题排序，按住 Shift 点击追加次要排序列
+        self.sorter = SortedView(self.sort_value)
+        # 分组视图：分组节点只显示人数，展开时才插入组内的特工，收起时删掉
+        self.group_field = None
+        self.group_members = {}
+        self.group_values = {}
+        self.open_groups = set()
+        # 最后联络早于阈值的算失联；按时间索引定时检查，状态栏显示人数
+        self.stale_days = 30.0
+        self.stale_total = 0
+        self.stale_check_id = None
+        self.analytics = None
 
         # 配置冷战风格界面
         self.configure_styles()
         self.create_interface()
+        # 列表和状态栏订阅数据变化，每次修改只处理变化的那几行
+        self.store.changes.subscribe(self.on_agent_changed)
         self.load_demo_data()
+        self.check_stale()
 
         # 绑定全局事件
         self.root.bind("<Control-n>", lambda e: self.new_db())
@@ -82,6 +108,7 @@ class CIASurveillanceSystem:
             ("打开数据库", "icons/folder_open.png", self.open_db),
             ("保存数据库", "icons/disk.png", self.save_db),
             ("导出报告", "icons/report.png", self.export_report),
+            ("态势分析", "icons/chart_bar.png", self.show_analytics),
             ("卫星定位", "icons/satellite.png", self.show_geo_map),
             ("通讯监听", "icons/radio.png", self.monitor_comms),
             ("销毁证据", "icons/fire.png", self.wipe_data)
@@ -157,6 +184,7 @@ class CIASurveillanceSystem:
 
     def create_data_view(self):
         """创建情报数据库视图"""
+        self.create_search_bar()
         tree_frame = ttk.Frame(self.root)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
@@ -173,6 +201,7 @@ class CIASurveillanceSystem:
         self.tree = ttk.Treeview(tree_frame, columns=[c[0] for c in columns],
                                  show="headings", selectmode="extended")
 
+        self.column_titles = {col_id: col_text for col_id, col_text, _ in columns}
         for col_id, col_text, col_width in columns:
             self.tree.heading(col_id, text=col_text)
             self.tree.column(col_id, width=col_width, anchor=tk.CENTER)
@@ -188,10 +217,43 @@ class CIASurveillanceSystem:
         # 绑定右键菜单
         self.tree.bind("<Button-3>", self.show_context_menu)
         self.tree.bind("<Double-1>", self.show_full_profile)
+        self.tree.bind("<Button-1>", self.on_heading_click)
+        self.tree.bind("<Shift-Button-1>", lambda e: self.on_heading_click(e, extend=True))
+        self.tree.bind("<<TreeviewOpen>>", self.on_group_open)
+        self.tree.bind("<<TreeviewClose>>", self.on_group_close)
 
         tree_frame.grid_columnconfigure(0, weight=1)
         tree_frame.grid_rowconfigure(0, weight=1)
 
+    def create_search_bar(self):
+        """创建全文检索栏，支持 location:莫斯科 status:活跃 这样的字段过滤"""
+        search_frame = ttk.Frame(self.root)
+        search_frame.pack(fill=tk.X, padx=10)
+
+        ttk.Label(search_frame, text="情报检索:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=50)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<KeyRelease>", lambda e: self.update_treeview())
+        ttk.Label(search_frame, text="例: location:莫斯科 status:活跃 核武").pack(side=tk.LEFT)
+
+        self.group_var = tk.StringVar(value="不分组")
+        group_box = ttk.Combobox(search_frame, textvariable=self.group_var, values=list(GROUP_FIELDS),
+                                 state="readonly", width=8)
+        group_box.pack(side=tk.RIGHT)
+        group_box.bind("<<ComboboxSelected>>", lambda e: self.set_grouping(GROUP_FIELDS[self.group_var.get()]))
+        ttk.Label(search_frame, text="分组:").pack(side=tk.RIGHT)
+
+        self.stale_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="只看失联", variable=self.stale_only,
+                        command=self.update_treeview).pack(side=tk.RIGHT, padx=5)
+        self.stale_days_var = tk.StringVar(value=f"{self.stale_days:g}")
+        stale_box = ttk.Combobox(search_frame, textvariable=self.stale_days_var, values=STALE_DAYS, width=5)
+        stale_box.pack(side=tk.RIGHT)
+        stale_box.bind("<<ComboboxSelected>>", lambda e: self.check_stale())
+        stale_box.bind("<Return>", lambda e: self.check_stale())
+        ttk.Label(search_frame, text="失联阈值(天):").pack(side=tk.RIGHT)
+
     def create_status_bar(self):
         """创建情报系统状态栏"""
         self.status = ttk.Label(self.root, text="就绪 | 数据库: 未加载 | 特工总数: 0",
@@ -201,8 +263,29 @@ class CIASurveillanceSystem:
     def update_status(self):
         """更新状态栏信息"""
         db_status = self.current_file if self.current_file else "未加载"
-        count = len(self.agents)
-        self.status.config(text=f"就绪 | 数据库: {db_status} | 特工总数: {count}")
+        count = len(self.store)
+        self.stale_total = self.store.stale_count(self.stale_cutoff())
+        self.status.config(text=f"就绪 | 数据库: {db_status} | 特工总数: {count}"
+                                f" | 失联超过 {self.stale_days:g} 天: {self.stale_total}")
+
+    def stale_cutoff(self):
+        """失联阈值对应的时间戳，最后联络早于它的算失联"""
+        try:
+            self.stale_days = max(0.0, float(self.stale_days_var.get()))
+        except ValueError:
+            pass  # 输入到一半的值先沿用上一次的阈值
+        return agent_schema.current_timestamp() - int(self.stale_days * 86400)
+
+    def check_stale(self):
+        """定时检查失联特工：只在时间索引上做一次二分查找，不扫描全部档案"""
+        if self.stale_check_id is not None:
+            self.root.after_cancel(self.stale_check_id)
+        self.stale_check_id = self.root.after(STALE_CHECK_MS, self.check_stale)
+        previous = self.stale_total
+        self.update_status()
+        # 档案的修改会立即刷新列表，这里只需处理随时间推移新变成失联的
+        if self.stale_only.get() and self.stale_total != previous:
+            self.update_treeview()
 
     def update_agent(self):
         """更新或添加特工档案"""
@@ -228,49 +311,226 @@ class CIASurveillanceSystem:
             messagebox.showerror("输入错误", "必须填写行动代号")
             return
 
-        self.agents[agent_id] = agent_data
-        self.update_treeview()
-        self.update_status()
+        # 年龄和时间在这里转换成整数，格式不对时提示
+        try:
+            self.store.put(agent_id, agent_data)
+        except agent_schema.SchemaError as e:
+            messagebox.showerror("输入错误", str(e))
+            return
         messagebox.showinfo("操作成功", f"特工档案 {agent_id} 已更新")
         self.clear_entries()
 
     def delete_agent(self):
         """删除选定特工档案"""
-        selected = self.tree.selection()
+        selected = self.selected_agents()
         if not selected:
             return
 
-        agent_ids = [self.tree.item(i, "values")[0] for i in selected]
+        # 列表的行号就是特工编号
+        agent_ids = selected
         confirm = messagebox.askyesno("确认删除",
                                       f"确定要永久删除选定的 {len(agent_ids)} 个特工档案？")
         if confirm:
             for agent_id in agent_ids:
-                del self.agents[agent_id]
-            self.update_treeview()
-            self.update_status()
+                self.store.delete(agent_id)
 
     def update_treeview(self):
         """更新情报数据库视图"""
+        self.refresh_id = None
         self.tree.delete(*self.tree.get_children())
-        for agent_id, data in self.agents.items():
-            self.tree.insert("", "end", values=(
-                agent_id,
-                data["codename"],
-                data["age"],
-                data["status"],
-                data["clearance"],
-                data["location"],
-                data["last_contact"]
-            ))
+        agent_ids = self.filtered_agents()
+        if self.group_field:
+            self.show_groups(agent_ids)
+            return
+        if agent_ids is None:
+            agent_ids = self.store.agents
+        if self.sorter:
+            # 排序键按特工缓存，换一种排序或重新检索时不必再算
+            self.sorter.rebuild(agent_ids)
+            agent_ids = self.sorter.records()
+        for agent_id in agent_ids:
+            self.tree.insert("", "end", iid=agent_id, values=self.row_values(agent_id))
+
+    def filtered_agents(self):
+        """检索和"只看失联"筛选后的特工编号；没有筛选条件时返回 None"""
+        query = self.search_var.get().strip()
+        if not self.stale_only.get():
+            return self.store.search(query) if query else None
+        # 失联最久的排在前面
+        agent_ids = self.store.stale(self.stale_cutoff())
+        if query:
+            hits = set(self.store.search(query))
+            agent_ids = [agent_id for agent_id in agent_ids if agent_id in hits]
+        return agent_ids
+
+    def row_values(self, agent_id):
+        data = self.store[agent_id]
+        return (
+            agent_id,
+            data["codename"],
+            data.text("age"),
+            data["status"],
+            data["clearance"],
+            data["location"],
+            data.text("last_contact")
+        )
+
+    def on_agent_changed(self, event):
+        """按单条变化更新列表；有筛选条件时命中情况可能改变，合并成一次重新筛选"""
+        if event.kind != INSERTED:
+            self.sorter.forget(event.key)
+        if self.search_var.get().strip() or self.stale_only.get():
+            if self.refresh_id is None:
+                self.refresh_id = self.root.after_idle(self.update_treeview)
+        elif self.group_field:
+            self.apply_grouped_change(event)
+        elif self.sorter:
+            self.apply_sorted_change(event)
+        elif event.kind == DELETED:
+            if self.tree.exists(event.key):
+                self.tree.delete(event.key)
+        elif self.tree.exists(event.key):
+            self.tree.item(event.key, values=self.row_values(event.key))
+        else:
+            self.tree.insert("", "end", iid=event.key, values=self.row_values(event.key))
+        self.update_status()
+
+    def apply_sorted_change(self, event):
+        """排序状态下用 bisect 找到变化的位置，只移动这一行"""
+        if event.kind == DELETED:
+            self.sorter.remove(event.key)
+            self.tree.delete(event.key)
+        elif event.kind == UPDATED:
+            _, pos = self.sorter.update(event.key)
+            self.tree.item(event.key, values=self.row_values(event.key))
+            # 先摘下再放回，move 的位置就是最终位置
+            self.tree.detach(event.key)
+            self.tree.move(event.key, "", pos)
+        else:
+            pos = self.sorter.insert(event.key)
+            self.tree.insert("", pos, iid=event.key, values=self.row_values(event.key))
+
+    def set_grouping(self, field):
+        """切换分组字段，None 为不分组的平铺列表"""
+        self.group_field = field
+        self.open_groups = set()
+        self.tree.configure(show="tree headings" if field else "headings")
+        if field:
+            title = next(text for text, name in GROUP_FIELDS.items() if name == field)
+            self.tree.heading("#0", text=title)
+            self.tree.column("#0", width=180, stretch=False)
+        self.update_treeview()
+
+    def show_groups(self, agent_ids):
+        """只插入分组节点；有筛选时按筛选出的特工分组，否则直接用 store 增量维护的分组"""
+        if agent_ids is not None:
+            self.group_members = {}
+            for agent_id in agent_ids:
+                value = self.store[agent_id].get(self.group_field, "")
+                self.group_members.setdefault(value, {})[agent_id] = None
+        else:
+            self.group_members = self.store.group(self.group_field)
+        self.group_values = {}
+        for value in sorted(self.group_members, key=collation_key):
+            self.refresh_group(value, "end")
+
+    def group_node(self, value):
+        return f"#group:{value}"
+
+    def refresh_group(self, value, pos=None):
+        """新建、更新或删掉一个分组节点；收起的分组放一个占位子节点，让它显示展开箭头"""
+        node = self.group_node(value)
+        members = self.group_members.get(value)
+        if not members:
+            if self.tree.exists(node):
+                self.tree.delete(node)
+            self.group_values.pop(node, None)
+            self.open_groups.discard(value)
+            return
+        label = f"{value or '(未填写)'} ({len(members)})"
+        if self.tree.exists(node):
+            self.tree.item(node, text=label)
+            return
+        if pos is None:
+            pos = sorted(self.group_members, key=collation_key).index(value)
+        self.tree.insert("", pos, iid=node, text=label, open=value in self.open_groups)
+        self.group_values[node] = value
+        if value in self.open_groups:
+            self.load_group(value)
+        else:
+            self.tree.insert(node, "end", iid=f"#stub:{value}", text="加载中…")
+
+    def load_group(self, value):
+        node = self.group_node(value)
+        self.tree.delete(*self.tree.get_children(node))
+        members = self.group_members.get(value, ())
+        for agent_id in self.sorter.ordered(members) if self.sorter else members:
+            self.tree.insert(node, "end", iid=agent_id, values=self.row_values(agent_id))
+
+    def on_group_open(self, event):
+        value = self.group_values.get(self.tree.focus())
+        if value is not None and value not in self.open_groups:
+            self.open_groups.add(value)
+            self.load_group(value)
+
+    def on_group_close(self, event):
+        node = self.tree.focus()
+        value = self.group_values.get(node)
+        if value is not None and value in self.open_groups:
+            self.open_groups.discard(value)
+            self.tree.delete(*self.tree.get_children(node))
+            self.tree.insert(node, "end", iid=f"#stub:{value}", text="加载中…")
+
+    def apply_grouped_change(self, event):
+        """分组视图中的单条变化：更新所在分组的人数，只有展开的分组才增删行"""
+        old = event.old.get(self.group_field, "") if event.old is not None else None
+        new = event.new.get(self.group_field, "") if event.new is not None else None
+        if old is not None and old != new:
+            if self.tree.exists(event.key):
+                self.tree.delete(event.key)
+            self.refresh_group(old)
+        if new is None:
+            return
+        self.refresh_group(new)
+        if new not in self.open_groups:
+            return
+        node = self.group_node(new)
+        pos = self.sorter.ordered(self.group_members[new]).index(event.key) if self.sorter else "end"
+        if not self.tree.exists(event.key):
+            self.tree.insert(node, pos, iid=event.key, values=self.row_values(event.key))
+            return
+        self.tree.item(event.key, values=self.row_values(event.key))
+        if self.sorter:
+            self.tree.detach(event.key)
+            self.tree.move(event.key, node, pos)
+
+    def selected_agents(self):
+        """选中的特工编号，分组节点不算在内"""
+        return [iid for iid in self.tree.selection() if iid in self.store]
+
+    def sort_value(self, agent_id, column):
+        return agent_id if column == "agent_id" else self.store[agent_id].get(column, "")
+
+    def on_heading_click(self, event, extend=False):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return
+        column = self.tree.column(self.tree.identify_column(event.x), "id")
+        if column not in self.column_titles:
+            return
+        if not self.sorter.toggle(column, extend):
+            self.sorter.rebuild(())
+        for column, title in self.sorter.headings(self.column_titles).items():
+            self.tree.heading(column, text=title)
+        self.update_treeview()
 
     def show_full_profile(self, event):
         """显示完整特工档案"""
-        selected = self.tree.selection()
+        selected = self.selected_agents()
         if not selected:
             return
 
-        agent_id = self.tree.item(selected[0], "values")[0]
-        data = self.agents.get(agent_id)
+        agent_id = selected[0]
+        data = self.store.get(agent_id)
 
         profile = tk.Toplevel(self.root)
         profile.title(f"绝密档案 - {agent_id}")
@@ -297,13 +557,13 @@ class CIASurveillanceSystem:
         """创建档案信息标签页"""
         fields = [
             ("行动代号:", data["codename"]),
-            ("年龄:", data["age"]),
+            ("年龄:", data.text("age")),
             ("当前状态:", data["status"]),
             ("安全密级:", data["clearance"]),
             ("最后已知位置:", data["location"]),
-            ("最后联络时间:", data["last_contact"]),
-            ("建档时间:", data["created"]),
-            ("最后修改:", data["modified"])
+            ("最后联络时间:", data.text("last_contact")),
+            ("建档时间:", data.text("created")),
+            ("最后修改:", data.text("modified"))
         ]
 
         for i, (label, value) in enumerate(fields):
@@ -313,26 +573,11 @@ class CIASurveillanceSystem:
 
     def risk_analysis(self):
         """执行风险评估分析"""
-        analysis = {
-            "active": 0,
-            "captured": 0,
-            "compromised": 0,
-            "high_risk": 0
-        }
-
-        for agent in self.agents.values():
-            if agent["status"] == "被捕":
-                analysis["captured"] += 1
-                analysis["high_risk"] += 1
-            elif agent["status"] == "叛逃":
-                analysis["compromised"] += 1
-                analysis["high_risk"] += 1
-            elif agent["status"] == "活跃":
-                analysis["active"] += 1
+        analysis = self.store.risk_summary()
 
         report = f"""▌ 风险评估报告 ▐
 
-总特工人数: {len(self.agents)}
+总特工人数: {len(self.store)}
 活跃特工: {analysis['active']}
 被捕人员: {analysis['captured']}
 叛逃特工: {analysis['compromised']}
@@ -347,22 +592,33 @@ class CIASurveillanceSystem:
 
         messagebox.showinfo("风险评估", report)
 
+    def show_analytics(self):
+        """打开态势分析窗口（统计图表），已打开时提到最前"""
+        if self.analytics:
+            self.analytics.lift()
+            return
+        from analytics_view import AnalyticsWindow
+
+        self.analytics = AnalyticsWindow(self.root, self.store, on_close=self.forget_analytics)
+
+    def forget_analytics(self):
+        self.analytics = None
+
     # 以下为数据持久化相关方法
     def new_db(self):
         if messagebox.askyesno("新建数据库", "这将清除当前所有未保存数据，是否继续？"):
-            self.agents.clear()
+            self.store.clear()
             self.current_file = None
-            self.update_treeview()
             self.update_status()
 
     def open_db(self):
         file_path = filedialog.askopenfilename(filetypes=[("CIA数据库", "*.ciadb")])
         if file_path:
             try:
-                with open(file_path, "r") as f:
-                    encrypted = f.read()
-                    decoded = base64.b64decode(encrypted).decode()
-                    self.agents = json.loads(decoded)
+                self.store.load(file_path)
+                self.sorter.reset()
+                if self.analytics:
+                    self.analytics.reload()
                 self.current_file = file_path
                 self.update_treeview()
                 self.update_status()
@@ -376,10 +632,7 @@ class CIASurveillanceSystem:
             return
 
         try:
-            data = json.dumps(self.agents, indent=2)
-            encrypted = base64.b64encode(data.encode()).decode()
-            with open(self.current_file, "w") as f:
-                f.write(encrypted)
+            self.store.save(self.current_file)
             messagebox.showinfo("成功", "数据库加密保存完成")
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {str(e)}")
@@ -401,7 +654,7 @@ class CIASurveillanceSystem:
                     f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                     f.write(f"数据库路径: {self.current_file or '内存数据库'}\n")
                     f.write("\n=== 活跃特工名单 ===\n")
-                    for agent_id, data in self.agents.items():
+                    for agent_id, data in self.store.items():
                         if data["status"] == "活跃":
                             f.write(f"{agent_id} | {data['codename']} | {data['location']}\n")
                 messagebox.showinfo("成功", "行动报告导出完成")
@@ -421,16 +674,45 @@ class CIASurveillanceSystem:
 
     def change_status(self, status):
         """快速修改特工状态"""
-        selected = self.tree.selection()
-        for item in selected:
-            agent_id = self.tree.item(item, "values")[0]
-            self.agents[agent_id]["status"] = status
-        self.update_treeview()
+        selected = self.selected_agents()
+        for agent_id in selected:
+            self.store.update(agent_id, status=status)
 
     def mark_location(self):
         """地图标记功能（演示）"""
+        import webbrowser
+
         webbrowser.open("https://www.openstreetmap.org/")
 
+    def show_geo_map(self):
+        """卫星定位：在地图上搜索选定特工的最后位置"""
+        import webbrowser
+        from urllib.parse import quote
+
+        selected = self.selected_agents()
+        if not selected:
+            self.mark_location()
+            return
+        agent_id = selected[0]
+        location = self.store[agent_id]["location"]
+        webbrowser.open(f"https://www.openstreetmap.org/search?query={quote(location)}")
+
+    def send_order(self):
+        """向选定特工发送指令，并记入任务记录"""
+        from tkinter import simpledialog
+
+        selected = self.selected_agents()
+        if not selected:
+            return
+        order = simpledialog.askstring("发送指令", "指令内容:", parent=self.root)
+        if not order:
+            return
+        stamp = datetime.now().strftime("%Y-%m-%d")
+        for agent_id in selected:
+            missions = self.store[agent_id].get("missions", "")
+            self.store.update(agent_id, missions=f"{missions}\n{stamp}: 指令 - {order}".strip())
+        messagebox.showinfo("发送指令", f"指令已发送至 {len(selected)} 名特工")
+
     def monitor_comms(self):
         """通讯监听模拟"""
         messagebox.showinfo("通讯监听", "正在扫描加密频道...\n检测到3条未解密信息")
@@ -438,9 +720,8 @@ class CIASurveillanceSystem:
     def wipe_data(self):
         """安全擦除数据"""
         if messagebox.askyesno("销毁证据", "将永久删除所有数据！"):
-            self.agents.clear()
+            self.store.clear()
             self.current_file = None
-            self.update_treeview()
             self.update_status()
 
     def clear_entries(self):
@@ -454,7 +735,7 @@ class CIASurveillanceSystem:
 
     def load_demo_data(self):
         """加载演示数据"""
-        self.agents["007"] = {
+        self.store.put("007", {
             "codename": "幽灵",
             "age": 35,
             "status": "活跃",
@@ -464,12 +745,13 @@ class CIASurveillanceSystem:
             "missions": "2023-09-01: 渗透克格勃总部\n2023-10-05: 获取核武计划",
             "created": "2023-01-01 09:00",
             "modified": "2023-10-15 23:45"
-        }
-        self.update_treeview()
-        self.update_status()
+        })
 
 
 if __name__ == "__main__":
+    startup_profile.run_if_requested()
     root = tk.Tk()
+    instrument.install_if_enabled(root)
     app = CIASurveillanceSystem(root)
+    startup_profile.watch_first_paint(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,607 @@
+"""通讯录数据层（不依赖 tkinter，可在无界面环境使用）
+
+文件名以 .snap 结尾时使用只读快照加增量日志（见 snapshot.py），
+联系人在访问时才从 mmap 中读出，适合几百万条的大通讯录。快照里同样保存编号和版本号。
+
+JSON 文件可以被多个程序同时打开：读写都加文件锁，写入前先把其他进程的修改合并进来；
+每个联系人带编号和版本号，编辑冲突时抛出 ConflictError；poll_changes() 按修改时间
+发现外部修改，只重建变化的联系人。
+
+所有增删改（包括合并进来的外部修改）都通过 changes 发出 ChangeEvent（见 change_feed.py），
+号码、姓名和全文索引订阅它增量更新，界面等也可以订阅。
+"""
+import json
+import os
+import time
+import weakref
+
+import fulltext
+from change_feed import DELETED, INSERTED, UPDATED, ChangeFeed
+from name_search import NameIndex
+from phone_index import PhoneIndex, is_phone_query
+from search_cache import ContactQuery, SearchCache
+from file_lock import FileLock, lock_path
+from snapshot import SnapshotTable
+
+FIELDS = ('name', 'phone', 'email', 'address')
+TEXT_FIELDS = FIELDS
+SNAPSHOT_SUFFIX = '.snap'
+SNAPSHOT_FIELDS = FIELDS + ('id', 'version')
+# Windows 上数据文件正被别的程序（杀毒软件、编辑器）打开时 os.replace 会失败，隔一会儿重试
+REPLACE_RETRIES = 20
+REPLACE_WAIT = 0.05
+
+
+class ConflictError(Exception):
+    """要修改的联系人已被其他进程修改或删除"""
+
+
+class AddressBook:
+    def __init__(self, filename='contacts.json'):
+        self.filename = filename
+        self.contacts = []
+        self.by_id = {}
+        self.table = None
+        # 上次读写数据文件时的签名，用来发现其他进程的修改
+        self.known_signature = None
+        self.phone_index = PhoneIndex()
+        self.name_index = NameIndex()
+        # 全文索引第一次全文检索时才读取或建立，见 ensure_text_index
+        self.text_index = None
+        self.text_ids = {}
+        self.text_docs = {}
+        self.next_text_id = 0
+        self.text_from_file = False
+        # search_contacts 的结果缓存，随变化事件逐条修补
+        self.search_cache = SearchCache()
+        self.changes = ChangeFeed()
+        self.changes.subscribe(self._on_change)
+        self.changes.subscribe(self.search_cache.on_change)
+        self.load_contacts()
+
+    def is_snapshot(self):
+        return self.filename.endswith(SNAPSHOT_SUFFIX)
+
+    def load_contacts(self):
+        if self.is_snapshot():
+            if self.table is not None:
+                self.table.close()
+            self.table = SnapshotTable(self.filename, SNAPSHOT_FIELDS)
+            if 'id' not in self.table.fields:
+                # 旧快照没有编号和版本号列，补上后整个重写一次，与 JSON 模式补编号一样
+                self.table.compact(SNAPSHOT_FIELDS, snapshot_record)
+            self.contacts = SnapshotContacts(self.table)
+        elif os.path.exists(self.filename):
+            with FileLock(lock_path(self.filename)):
+                self.contacts = [Contact(**item) for item in self._read_file()]
+                self.known_signature = self._file_signature()
+                if any(c.id is None for c in self.contacts):
+                    # 旧格式的文件没有编号，补上后立即写回，其他进程读到的编号才一致
+                    for c in self.contacts:
+                        if c.id is None:
+                            c.id = new_contact_id()
+                    self._write_file()
+        self.rebuild_index()
+        # 内存中的联系人与数据文件一致，可以使用磁盘上的全文索引
+        self.text_from_file = True
+
+    def rebuild_index(self):
+        """直接替换 contacts 列表后调用，重建号码、姓名和全文索引"""
+        if self.table is None:
+            self.by_id = {c.id: c for c in self.contacts}
+            self.phone_index.reset(lambda: self.contacts, lambda c: c.phone)
+            self.name_index.build(self.contacts, lambda c: c.name)
+        else:
+            # 快照模式下索引登记的是记录位置，只读需要的字段，不生成也不持有 Contact 对象；
+            # 预计算要扫描全表，推迟到第一次查询
+            table = self.table
+            self.phone_index.reset(table.positions, lambda pos: table.get_field(pos, 'phone'))
+            self.name_index.reset(table.positions, lambda pos: table.get_field(pos, 'name'))
+        self.text_index = None
+        self.text_from_file = False
+        self.search_cache.clear()
+
+    def _file_signature(self):
+        if not os.path.exists(self.filename):
+            return None
+        return fulltext.file_signature(self.filename)
+
+    def _read_file(self):
+        with open(self.filename, 'r') as f:
+            return json.load(f)
+
+    def _write_file(self):
+        """先写临时文件再整体替换，其他进程任何时候都读不到写了一半的文件（调用方应持有文件锁）"""
+        data = [vars(contact) for contact in self.contacts]
+        tmp_path = self.filename + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, self.filename)
+                break
+            except PermissionError:
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(REPLACE_WAIT)
+        self.known_signature = self._file_signature()
+
+    def _sync(self):
+        """数据文件被其他进程改过时，把变化合并进来（调用方应持有文件锁）"""
+        signature = self._file_signature()
+        if signature is None or signature == self.known_signature:
+            return None
+        changes = self._merge(self._read_file())
+        self.known_signature = signature
+        return changes
+
+    def _merge(self, data):
+        """按编号和版本号对比，只重建有变化的联系人及其索引"""
+        changes = {'added': [], 'updated': [], 'removed': []}
+        events = []
+        merged = []
+        for item in data:
+            contact = self.by_id.get(item.get('id'))
+            if contact is None:
+                contact = Contact(**item)
+                if contact.id is None:
+                    contact.id = new_contact_id()
+                events.append((INSERTED, contact, None))
+                changes['added'].append(contact)
+            elif vars(contact) != item:
+                old = dict(vars(contact))
+                for field, value in item.items():
+                    setattr(contact, field, value)
+                events.append((UPDATED, contact, old))
+                changes['updated'].append(contact)
+            merged.append(contact)
+        kept = {c.id for c in merged}
+        for contact in self.contacts:
+            if contact.id not in kept:
+                events.append((DELETED, contact, None))
+                changes['removed'].append(contact)
+        self.contacts = merged
+        self.by_id = {c.id: c for c in merged}
+        # 列表换好之后再发事件，订阅者看到的总是合并完成的状态
+        for kind, contact, old in events:
+            self._emit(kind, contact, old)
+        return changes
+
+    def poll_changes(self):
+        """检查数据文件是否被其他进程修改，有则增量合并并返回变化，否则返回 None
+
+        签名没变时不加锁直接返回；变了才加锁读取。Windows 上读取时打开着数据文件，
+        会让写入方的 os.replace 失败，持锁期间其他程序不会替换文件。
+        """
+        if self.table is not None:
+            return None
+        signature = self._file_signature()
+        if signature is None or signature == self.known_signature:
+            return None
+        try:
+            with FileLock(lock_path(self.filename)):
+                return self._sync()
+        except (OSError, ValueError):
+            # 被不加锁的程序（如文本编辑器）改到一半等，一时读不出来，下次再读
+            return None
+
+    def ensure_text_index(self):
+        """读取数据文件旁边的全文索引，过期或不存在时重建并写回
+
+        索引里的文档编号就是联系人在数据文件中的位置；快照模式下是快照表里的记录位置，
+        与 _index_key 一致，建立索引时直接读表。
+        """
+        if self.text_index is not None:
+            return self.text_index
+        if self.table is None:
+            self.text_ids = {contact: pos for pos, contact in enumerate(self.contacts)}
+            self.text_docs = dict(enumerate(self.contacts))
+            self.next_text_id = len(self.contacts)
+            records = ((pos, vars(contact)) for pos, contact in self.text_docs.items())
+        else:
+            records = ((pos, self.table.get(pos)) for pos in self.table.positions())
+        self.text_index = fulltext.FullTextIndex(TEXT_FIELDS)
+        path = fulltext.index_path(self.filename)
+        on_disk = self.text_from_file and os.path.exists(self.filename)
+        if not (on_disk and self.text_index.load(path, self.data_signature())):
+            for pos, record in records:
+                self.text_index.add(pos, record)
+            if on_disk:
+                self.save_index()
+        return self.text_index
+
+    def save_index(self):
+        """把全文索引写到数据文件旁边，程序退出前调用"""
+        if self.text_index is None or not self.text_from_file or not os.path.exists(self.filename):
+            return
+        if self.table is None and self._file_signature() != self.known_signature:
+            # 其他进程刚改过数据文件，内存里的索引已经对不上了
+            return
+        if self.table is not None:
+            # 记录位置随快照和增量日志一起固定，签名相同时位置也相同，不必重新编号
+            positions = None
+        else:
+            positions = {self.text_ids[contact]: pos for pos, contact in enumerate(self.contacts)}
+        self.text_index.save(fulltext.index_path(self.filename), self.data_signature(), positions)
+
+    def data_signature(self):
+        """数据文件的签名；快照模式下还包括增量日志"""
+        signature = fulltext.file_signature(self.filename)
+        if self.table is not None and os.path.exists(self.table.delta_path):
+            signature += fulltext.file_signature(self.table.delta_path)
+        return signature
+
+    def compact(self):
+        """快照模式下把增量合并进快照；JSON 模式下就是保存"""
+        if self.table is None:
+            self.save_contacts()
+            return
+        self.table.compact()
+        self.load_contacts()
+
+    def iter_records(self, contacts=None):
+        """逐条产出联系人记录（字典），导出用；contacts 缺省为全部联系人
+
+        快照模式下导出全部时直接读表，不生成 Contact 对象，内存占用与联系人数无关；
+        读的是调用时的视图（见 SnapshotTable.frozen_records），可以放在后台线程里。
+        """
+        if contacts is None and self.table is not None:
+            return self.table.frozen_records()
+        return (vars(c) for c in (self.contacts if contacts is None else contacts))
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+
+    def save_contacts(self):
+        """把内存中的全部联系人写回文件，会覆盖其他进程尚未合并的修改
+
+        增删改请用 add_contact / update_contact / delete_contact，它们会先合并再写。
+        """
+        if self.table is not None:
+            # 快照模式下每次修改都已经写进增量日志
+            return
+        with FileLock(lock_path(self.filename)):
+            self._write_file()
+
+    def add_contact(self, contact):
+        if self.table is not None:
+            # 快照模式下 append 会写增量日志
+            if contact.id is None:
+                contact.id = new_contact_id()
+            self.contacts.append(contact)
+            self._emit(INSERTED, contact)
+            return
+        with FileLock(lock_path(self.filename)):
+            self._sync()
+            if contact.id is None:
+                contact.id = new_contact_id()
+            self.contacts.append(contact)
+            self.by_id[contact.id] = contact
+            self._write_file()
+        self._emit(INSERTED, contact)
+
+    def add_contacts(self, contacts):
+        """批量新增；JSON 模式下只加一次锁、写一次文件"""
+        contacts = list(contacts)
+        if self.table is not None:
+            for contact in contacts:
+                self.add_contact(contact)
+            return
+        with FileLock(lock_path(self.filename)):
+            self._sync()
+            for contact in contacts:
+                if contact.id is None:
+                    contact.id = new_contact_id()
+                self.by_id[contact.id] = contact
+            self.contacts.extend(contacts)
+            self._write_file()
+        for contact in contacts:
+            self._emit(INSERTED, contact)
+
+    def update_contact(self, contact, data):
+        """修改联系人字段并同步索引
+
+        联系人在打开编辑之后被其他进程改过或删掉时抛出 ConflictError，
+        此时内存中已经是最新内容。
+        """
+        if self.table is not None:
+            old = dict(vars(contact))
+            self._apply(contact, data)
+            contact.version += 1
+            self.contacts.update(contact)
+            self._emit(UPDATED, contact, old)
+            return
+        with FileLock(lock_path(self.filename)):
+            base_version = contact.version
+            self._sync()
+            if self.by_id.get(contact.id) is not contact:
+                raise ConflictError(f"{contact.name} 已被其他终端删除")
+            if contact.version != base_version:
+                raise ConflictError(f"{contact.name} 已被其他终端修改，已载入最新内容，请重新编辑")
+            old = dict(vars(contact))
+            self._apply(contact, data)
+            contact.version += 1
+            self._write_file()
+        self._emit(UPDATED, contact, old)
+
+    @staticmethod
+    def _apply(contact, data):
+        for field, value in data.items():
+            if field in FIELDS:
+                setattr(contact, field, value)
+
+    def delete_contact(self, name):
+        """删除所有叫 name 的联系人，返回被删除的联系人列表"""
+        if self.table is not None:
+            removed = list(self.contacts.find('name', name))
+            for c in removed:
+                self.contacts.remove(c)
+                self._emit(DELETED, c)
+            return removed
+        with FileLock(lock_path(self.filename)):
+            self._sync()
+            removed = self._delete_where(lambda c: c.name == name)
+        for c in removed:
+            self._emit(DELETED, c)
+        return removed
+
+    def contact_by_id(self, contact_id):
+        """按编号找联系人，没有时返回 None；快照模式下要扫描编号列"""
+        if self.table is not None:
+            return next(self.contacts.find('id', contact_id), None)
+        return self.by_id.get(contact_id)
+
+    def delete_contact_by_id(self, contact_id):
+        """按编号删除一个联系人，返回被删除的联系人或 None"""
+        if self.table is not None:
+            contact = self.contact_by_id(contact_id)
+            if contact is not None:
+                self.contacts.remove(contact)
+                self._emit(DELETED, contact)
+            return contact
+        with FileLock(lock_path(self.filename)):
+            self._sync()
+            removed = self._delete_where(lambda c: c.id == contact_id)
+        for c in removed:
+            self._emit(DELETED, c)
+        return removed[0] if removed else None
+
+    def apply_batch(self, updates=(), deletions=()):
+        """批量修改和删除（合并重复联系人用）：updates 为 [(联系人, 字段字典)]，
+        deletions 为联系人列表。JSON 模式下只加一次锁、写一次文件；
+        有任何一条在之后被其他进程改过或删掉时抛出 ConflictError，什么也不写入。
+        """
+        if self.table is not None:
+            for contact, data in updates:
+                self.update_contact(contact, data)
+            for contact in deletions:
+                self.contacts.remove(contact)
+                self._emit(DELETED, contact)
+            return
+        with FileLock(lock_path(self.filename)):
+            base_versions = [(c, c.version) for c in [c for c, _ in updates] + list(deletions)]
+            self._sync()
+            for contact, base_version in base_versions:
+                if self.by_id.get(contact.id) is not contact:
+                    raise ConflictError(f"{contact.name} 已被其他终端删除")
+                if contact.version != base_version:
+                    raise ConflictError(f"{contact.name} 已被其他终端修改，已载入最新内容，请重新查找")
+            changed = []
+            for contact, data in updates:
+                changed.append((contact, dict(vars(contact))))
+                self._apply(contact, data)
+                contact.version += 1
+            removed = {id(c) for c in deletions}
+            for contact in deletions:
+                del self.by_id[contact.id]
+            self.contacts = [c for c in self.contacts if id(c) not in removed]
+            self._write_file()
+        for contact, old in changed:
+            self._emit(UPDATED, contact, old)
+        for contact in deletions:
+            self._emit(DELETED, contact)
+
+    def _delete_where(self, predicate):
+        kept = []
+        removed = []
+        for c in self.contacts:
+            if predicate(c):
+                del self.by_id[c.id]
+                removed.append(c)
+            else:
+                kept.append(c)
+        if removed:
+            self.contacts = kept
+            self._write_file()
+        return removed
+
+    def _emit(self, kind, contact, old=None):
+        """发出一条联系人变化事件；删除时 old 就是联系人当前的内容"""
+        if kind == DELETED:
+            self.changes.publish(kind, contact.id, dict(vars(contact)), None, contact)
+        else:
+            self.changes.publish(kind, contact.id, old, dict(vars(contact)), contact)
+
+    def _on_change(self, event):
+        if event.kind == INSERTED:
+            self._index_add(event.item)
+        elif event.kind == UPDATED:
+            self._index_update(event.item, event.old)
+        else:
+            self._unindex(event.item)
+
+    def _index_key(self, contact):
+        """索引里登记的键：JSON 模式下是联系人本身，快照模式下是记录位置"""
+        return contact if self.table is None else self.contacts.positions[contact]
+
+    def _from_index(self, keys):
+        """索引返回的键换回联系人；快照模式下经 SnapshotContacts.contact，照样用弱引用缓存"""
+        if self.table is None:
+            return list(keys)
+        return [self.contacts.contact(pos) for pos in keys]
+
+    def _index_add(self, contact):
+        key = self._index_key(contact)
+        self.phone_index.add(key, contact.phone)
+        self.name_index.add(key, contact.name)
+        if self.text_index is not None:
+            if self.table is None:
+                doc_id = self.next_text_id
+                self.next_text_id += 1
+                self.text_ids[contact] = doc_id
+                self.text_docs[doc_id] = contact
+            else:
+                doc_id = key
+            self.text_index.add(doc_id, vars(contact))
+
+    def _index_update(self, contact, old):
+        key = self._index_key(contact)
+        self.phone_index.update(key, contact.phone)
+        self.name_index.update(key, contact.name)
+        if self.text_index is not None:
+            doc_id = self.text_ids[contact] if self.table is None else key
+            self.text_index.update(doc_id, old, vars(contact))
+
+    def _unindex(self, contact):
+        key = self._index_key(contact)
+        self.phone_index.remove(key)
+        self.name_index.remove(key)
+        if self.text_index is not None:
+            if self.table is None:
+                doc_id = self.text_ids.pop(contact)
+                del self.text_docs[doc_id]
+            else:
+                doc_id = key
+            self.text_index.remove(doc_id, vars(contact))
+
+    def search_phone(self, query, mode='contains'):
+        """按规范化号码查询，mode 为 prefix / suffix / contains"""
+        return self._from_index(self.phone_index.search(query, mode))
+
+    def search_ranked(self, keyword, limit=20):
+        """按相关度排序的姓名搜索，支持拼音、首字母和一个字的输入错误
+
+        号码类查询先列姓名命中的（联系人可能就叫 "1"），再列号码命中的。
+        """
+        if any(field for field, _ in fulltext.parse_query(keyword, TEXT_FIELDS)):
+            # 带字段过滤的查询只走全文检索
+            return self.search_text(keyword)[:limit]
+        results = self._from_index(self.name_index.search(keyword, limit))
+        if is_phone_query(keyword):
+            seen = set(results)
+            return results + [c for c in self.search_phone(keyword) if c not in seen][:limit - len(results)]
+        if len(results) < limit:
+            # 姓名不够时用邮箱、地址等字段的全文命中补足
+            seen = set(results)
+            results += [c for c in self.search_text(keyword) if c not in seen][:limit - len(results)]
+        return results
+
+    def search_text(self, query):
+        """全文检索姓名、电话、邮箱和地址，支持 address:广州 这样的字段过滤"""
+        index = self.ensure_text_index()
+        if self.table is not None:
+            hits = index.search(query, self.table.get)
+            return self._from_index(sorted(hits))
+        hits = index.search(query, lambda doc_id: vars(self.text_docs[doc_id]))
+        return [self.text_docs[doc_id] for doc_id in sorted(hits)]
+
+    def search_contacts(self, keyword):
+        """姓名包含 keyword 的联系人；号码类查询还包括号码包含它的，按通讯录顺序返回"""
+        cached = self.search_cache.get(keyword)
+        if cached is not None:
+            return list(cached)
+        query = ContactQuery(keyword)
+        # 接着上一次输入继续打字时，只需在上次的结果里再筛一遍
+        candidates = self.search_cache.narrowest(query)
+        if candidates is not None:
+            results = [c for c in candidates if query.match(c.name, c.phone)]
+        elif query.digits:
+            # 没有可用的缓存时号码部分查号码索引，不用逐条规范化全部号码
+            matched = set(self.search_phone(keyword))
+            results = [c for c in self.contacts if c in matched or query.lower in c.name.lower()]
+        else:
+            results = [c for c in self.contacts if query.lower in c.name.lower()]
+        self.search_cache.put(query, results)
+        return list(results)
+
+
+class SnapshotContacts:
+    """快照模式下的联系人序列，按下标或迭代访问时才生成 Contact 对象
+
+    生成过的对象用弱引用缓存，同一位置在被引用期间总是同一个对象，
+    不再被引用时随即释放，内存只随正在查看的联系人增长。
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.live = weakref.WeakValueDictionary()
+        self.positions = weakref.WeakKeyDictionary()
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.contact(self.table.position(index))
+
+    def __iter__(self):
+        for pos in self.table.positions():
+            yield self.contact(pos)
+
+    def contact(self, pos):
+        contact = self.live.get(pos)
+        if contact is None:
+            record = self.table.get(pos)
+            # 快照里的字段都是文字，增量日志里的版本号是整数
+            contact = Contact(**dict(record, version=int(record.get('version') or 0)))
+            self.live[pos] = contact
+            self.positions[contact] = pos
+        return contact
+
+    def find(self, field, value):
+        """只读一个字段做扫描，找出该字段等于 value 的联系人"""
+        for pos in self.table.positions():
+            if self.table.get_field(pos, field) == value:
+                yield self.contact(pos)
+
+    def append(self, contact):
+        pos = self.table.add(dict(vars(contact)))
+        self.live[pos] = contact
+        self.positions[contact] = pos
+
+    def update(self, contact):
+        self.table.put(self.positions[contact], dict(vars(contact)))
+
+    def remove(self, contact):
+        # 不从 positions 里去掉：随后的 DELETED 事件还要按位置把它移出索引，
+        # 联系人对象不再被引用时这一项自动消失
+        pos = self.positions[contact]
+        self.live.pop(pos, None)
+        self.table.delete(pos)
+
+
+def new_contact_id():
+    import uuid
+
+    return uuid.uuid4().hex
+
+
+def snapshot_record(record):
+    """写进快照的记录：按 SNAPSHOT_FIELDS 取值，缺编号的补上"""
+    result = {field: record.get(field) or '' for field in FIELDS}
+    result['id'] = record.get('id') or new_contact_id()
+    result['version'] = int(record.get('version') or 0)
+    return result
+
+
+class Contact:
+    def __init__(self, name, phone, email, address, id=None, version=0):
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.address = address
+        # 跨进程合并用的编号，以及每次修改递增的版本号
+        self.id = id
+        self.version = version
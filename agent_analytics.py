@@ -0,0 +1,235 @@
+"""特工数据库的统计分析（不依赖 tkinter）
+
+AgentTable 把档案按列装进数组：status / clearance / location 按取值编成整数代码，
+age 和 last_contact 是整数列；删除留下的空行给后来新增的档案复用。
+- 交叉表（状态 × 位置、状态 × 密级）和年龄分布对整列做一次 numpy.bincount；
+- 联络时间分布和当前时间有关，每次取用时用 numpy.searchsorted 对整列重算；
+- 档案修改时只改这一行的列值，交叉表和年龄分布按新旧值各加减一，不重新统计，
+  同时记下哪些统计变了（dirty），界面只重画这几张图。
+没有安装 NumPy 时退回 array 模块的列和普通循环，结果相同，只是慢一些。
+"""
+import array
+import bisect
+
+from change_feed import DELETED, INSERTED, UPDATED
+from numpy_support import load_numpy
+
+CATEGORY_FIELDS = ("status", "clearance", "location")
+CROSSTABS = (("status", "location"), ("status", "clearance"))
+AGE = "age"
+RECENCY = "recency"
+# 影响统计结果的字段，只改了别的字段（如任务记录）时不用动数组
+COLUMN_FIELDS = frozenset(CATEGORY_FIELDS + ("age", "last_contact"))
+
+AGE_BIN = 10
+AGE_BINS = 8
+AGE_LABELS = tuple(f"{i * AGE_BIN}-{i * AGE_BIN + AGE_BIN - 1}" for i in range(AGE_BINS - 1)) + (
+    f"{(AGE_BINS - 1) * AGE_BIN}+",)
+RECENCY_DAYS = (1, 7, 30, 90, 365)
+RECENCY_EDGES = tuple(days * 86400 for days in RECENCY_DAYS)
+RECENCY_LABELS = ("1天内", "1周内", "1月内", "3月内", "1年内", "更早", "无记录")
+
+MISSING = -1
+NO_TIME = -(2 ** 62)
+
+
+class Codes:
+    """分类字段的取值与整数代码的对照，新取值按出现顺序编号"""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        if value is None:
+            return MISSING
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class AgentTable:
+    def __init__(self, store, use_numpy=True):
+        self.store = store
+        self.np = load_numpy() if use_numpy else False
+        self.rebuild()
+        self.unsubscribe = store.changes.subscribe(self.on_change)
+
+    def close(self):
+        self.unsubscribe()
+
+    def rebuild(self):
+        """从 store 整体装载并重新统计（打开另一个数据库之后调用）"""
+        agents = list(self.store.agents.values())
+        self.codes = {field: Codes() for field in CATEGORY_FIELDS}
+        self.columns = {}
+        for field in CATEGORY_FIELDS:
+            code = self.codes[field].code
+            self.columns[field] = self._column([code(agent.get(field)) for agent in agents], "i")
+        self.columns["age"] = self._column(
+            [MISSING if agent.age is None else agent.age for agent in agents], "i")
+        self.columns["last_contact"] = self._column(
+            [NO_TIME if agent.last_contact is None else agent.last_contact for agent in agents], "q")
+        self.rows = dict(zip(self.store.agents, range(len(agents))))
+        self.size = len(agents)
+        self.free = []
+        self.crosstabs = {pair: self._crosstab(*pair) for pair in CROSSTABS}
+        self.ages = self._age_histogram()
+        self.dirty = set(CROSSTABS) | {AGE, RECENCY}
+
+    def _column(self, values, typecode):
+        if self.np:
+            return self.np.array(values, dtype=self.np.int32 if typecode == "i" else self.np.int64)
+        return array.array(typecode, values)
+
+    def _crosstab(self, first, second):
+        """行是 first 的代码，列是 second 的代码，值为人数"""
+        rows, cols = len(self.codes[first]), len(self.codes[second])
+        a, b = self.columns[first], self.columns[second]
+        if self.np:
+            np = self.np
+            mask = (a >= 0) & (b >= 0)
+            cells = a[mask].astype(np.int64) * cols + b[mask]
+            return np.bincount(cells, minlength=rows * cols).reshape(rows, cols)
+        matrix = [array.array("q", [0] * cols) for _ in range(rows)]
+        for x, y in zip(a, b):
+            if x >= 0 and y >= 0:
+                matrix[x][y] += 1
+        return matrix
+
+    def _age_histogram(self):
+        ages = self.columns["age"]
+        if self.np:
+            np = self.np
+            bins = np.minimum(ages[ages >= 0] // AGE_BIN, AGE_BINS - 1)
+            return np.bincount(bins, minlength=AGE_BINS)
+        histogram = array.array("q", [0] * AGE_BINS)
+        for age in ages:
+            if age >= 0:
+                histogram[min(age // AGE_BIN, AGE_BINS - 1)] += 1
+        return histogram
+
+    def on_change(self, event):
+        if event.kind == UPDATED and not event.changed_fields() & COLUMN_FIELDS:
+            return
+        row = self._allocate(event.key) if event.kind == INSERTED else self.rows[event.key]
+        if event.old is not None:
+            self._count(row, -1)
+        if event.kind == DELETED:
+            self._clear_row(row)
+            del self.rows[event.key]
+            self.free.append(row)
+        else:
+            self._store_row(row, event.new)
+            self._count(row, 1)
+        self.dirty.add(RECENCY)
+
+    def _allocate(self, agent_id):
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == len(self.columns["age"]):
+                self._grow(max(16, self.size))
+            row = self.size
+            self.size += 1
+        self.rows[agent_id] = row
+        return row
+
+    def _grow(self, extra):
+        """列的容量成倍增加，新行都是空行"""
+        for field, column in self.columns.items():
+            fill = NO_TIME if field == "last_contact" else MISSING
+            if self.np:
+                self.columns[field] = self.np.concatenate(
+                    [column, self.np.full(extra, fill, dtype=column.dtype)])
+            else:
+                column.extend([fill] * extra)
+
+    def _clear_row(self, row):
+        for field, column in self.columns.items():
+            column[row] = NO_TIME if field == "last_contact" else MISSING
+
+    def _store_row(self, row, agent):
+        for field in CATEGORY_FIELDS:
+            self.columns[field][row] = self.codes[field].code(agent.get(field))
+        self.columns["age"][row] = MISSING if agent.age is None else agent.age
+        self.columns["last_contact"][row] = NO_TIME if agent.last_contact is None else agent.last_contact
+
+    def _count(self, row, delta):
+        """把一行计入（delta=1）或移出（delta=-1）交叉表和年龄分布"""
+        for pair in CROSSTABS:
+            a = self.columns[pair[0]][row]
+            b = self.columns[pair[1]][row]
+            if a >= 0 and b >= 0:
+                self._fit(pair)[a][b] += delta
+                self.dirty.add(pair)
+        age = self.columns["age"][row]
+        if age >= 0:
+            self.ages[min(age // AGE_BIN, AGE_BINS - 1)] += delta
+            self.dirty.add(AGE)
+
+    def _fit(self, pair):
+        """出现新的分类取值时把交叉表补齐到新的行列数"""
+        rows, cols = len(self.codes[pair[0]]), len(self.codes[pair[1]])
+        matrix = self.crosstabs[pair]
+        if self.np:
+            if matrix.shape != (rows, cols):
+                matrix = self.crosstabs[pair] = self.np.pad(
+                    matrix, ((0, rows - matrix.shape[0]), (0, cols - matrix.shape[1])))
+            return matrix
+        for line in matrix:
+            line.extend([0] * (cols - len(line)))
+        while len(matrix) < rows:
+            matrix.append(array.array("q", [0] * cols))
+        return matrix
+
+    def take_dirty(self):
+        """取走上次以来变过的统计：交叉表的字段对、AGE 或 RECENCY"""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def crosstab(self, pair, top=None):
+        """返回 (行标签, 列标签, 人数矩阵)；去掉人数为 0 的行列，
+        列按总人数从多到少排列，给出 top 时其余的列合并成"其他"""
+        matrix = self._fit(pair)
+        rows = matrix.tolist() if self.np else [list(line) for line in matrix]
+        row_codes = [i for i, line in enumerate(rows) if any(line)]
+        totals = [sum(column) for column in zip(*rows)]
+        col_codes = sorted((j for j, total in enumerate(totals) if total), key=lambda j: -totals[j])
+        rest = col_codes[top:] if top else []
+        col_codes = col_codes[:top] if top else col_codes
+        first, second = (self.codes[field].values for field in pair)
+        row_labels = [first[i] or "(未填写)" for i in row_codes]
+        col_labels = [second[j] or "(未填写)" for j in col_codes]
+        cells = [[rows[i][j] for j in col_codes] for i in row_codes]
+        if rest:
+            col_labels.append("其他")
+            for line, i in zip(cells, row_codes):
+                line.append(sum(rows[i][j] for j in rest))
+        return row_labels, col_labels, cells
+
+    def age_histogram(self):
+        return list(AGE_LABELS), [int(count) for count in self.ages]
+
+    def recency(self, now):
+        """按距 now（时间戳）的天数分段的人数，最后一段是没有联络记录的"""
+        times = self.columns["last_contact"]
+        if self.np:
+            np = self.np
+            elapsed = now - times[times != NO_TIME]
+            counts = np.bincount(np.searchsorted(RECENCY_EDGES, elapsed, side="right"),
+                                 minlength=len(RECENCY_EDGES) + 1).tolist()
+            recorded = len(elapsed)
+        else:
+            counts = [0] * (len(RECENCY_EDGES) + 1)
+            recorded = 0
+            for stamp in times:
+                if stamp != NO_TIME:
+                    counts[bisect.bisect_right(RECENCY_EDGES, now - stamp)] += 1
+                    recorded += 1
+        return list(RECENCY_LABELS), counts + [len(self.rows) - recorded]
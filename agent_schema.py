@@ -0,0 +1,267 @@
+"""特工档案的类型定义与校验（不依赖 tkinter）
+
+载入或导入时统一转换成 Agent，之后内存里不再解析：age 为 int，last_contact / created /
+modified 为整数时间戳（秒），其余字段为字符串，缺少的字段为 None。
+界面录入和导入用 coerce，值不合法时抛出 SchemaError；载入已有的数据库用
+coerce_all(strict=False)，解析不了的值按原文保留并发出 SchemaWarning。
+"""
+import datetime
+import warnings
+
+TEXT = 'text'
+AGE = 'age'
+TIMESTAMP = 'timestamp'
+
+FIELDS = (
+    ('codename', TEXT),
+    ('age', AGE),
+    ('status', TEXT),
+    ('clearance', TEXT),
+    ('location', TEXT),
+    ('last_contact', TIMESTAMP),
+    ('missions', TEXT),
+    ('created', TIMESTAMP),
+    ('modified', TIMESTAMP),
+)
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+KNOWN = frozenset(FIELD_NAMES)
+MAX_AGE = 150
+# 1970-01-01 的序数
+EPOCH_ORDINAL = 719163
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class SchemaWarning(UserWarning):
+    pass
+
+
+class SchemaError(ValueError):
+    def __init__(self, field, value, reason):
+        super().__init__(f'{field}: {value!r} {reason}')
+        self.field = field
+        self.value = value
+        self.reason = reason
+
+
+def to_text(value, field):
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def to_age(value, field):
+    if value is None or type(value) is int:
+        if value is not None and not 0 <= value <= MAX_AGE:
+            raise SchemaError(field, value, '超出范围')
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return to_age(int(value), field)
+    raise SchemaError(field, value, '不是有效的年龄')
+
+
+def to_timestamp(value, field):
+    """接受 YYYY-MM-DD、YYYY-MM-DD HH:MM、YYYY-MM-DD HH:MM:SS 或已转换的整数"""
+    if value is None or type(value) is int:
+        return value
+    if not isinstance(value, str):
+        raise SchemaError(field, value, '不是有效的时间')
+    text = value.strip()
+    if not text:
+        return None
+    epoch = parse_timestamp(text)
+    if epoch is None:
+        raise SchemaError(field, value, '不是 YYYY-MM-DD HH:MM 格式的有效时间')
+    return epoch
+
+
+def parse_timestamp(text):
+    """datetime.fromisoformat 在 C 里解析，比 strptime 快一个数量级；先按长度排除它额外接受的写法"""
+    if len(text) not in (10, 16, 19) or text[4] != '-':
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return wall_clock_timestamp(moment)
+
+
+def wall_clock_timestamp(moment):
+    """datetime 按字面的年月日时分秒换算成时间戳，不做时区转换"""
+    days = moment.toordinal() - EPOCH_ORDINAL
+    return days * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def current_timestamp():
+    """现在的本地时间，可以直接和档案里的时间戳比较"""
+    return wall_clock_timestamp(datetime.datetime.now())
+
+
+def format_timestamp(epoch):
+    """还原成 YYYY-MM-DD HH:MM，秒不为 0 时带秒，所以只有日期的 "2024-01-02" 写回为
+    "2024-01-02 00:00"；用 datetime 计算，Windows 上 1970 年以前的时间也能还原
+    （time.gmtime 遇到负数会抛出 OSError）"""
+    moment = EPOCH + datetime.timedelta(seconds=epoch)
+    # 不用 strftime：%Y 在有的平台上不给 1000 年以前的年份补零
+    text = f'{moment.year:04d}-{moment.month:02d}-{moment.day:02d} {moment.hour:02d}:{moment.minute:02d}'
+    return text if moment.second == 0 else f'{text}:{moment.second:02d}'
+
+
+CONVERTERS = {TEXT: to_text, AGE: to_age, TIMESTAMP: to_timestamp}
+COERCERS = {name: CONVERTERS[kind] for name, kind in FIELDS}
+TIMESTAMP_FIELDS = frozenset(name for name, kind in FIELDS if kind == TIMESTAMP)
+
+
+class Agent:
+    """一条档案；未知字段原样放在 extra 里，保存时写回
+
+    支持 agent["status"]、get()、in 和迭代字段名，全文索引、统计等原来按字典读档案的
+    代码不用修改。档案只整体替换（replace），不要原地修改。
+    """
+    __slots__ = FIELD_NAMES + ('extra',)
+
+    def __getitem__(self, field):
+        # 已知字段解析不了时为 None，原文在 extra 里
+        if field in KNOWN:
+            value = getattr(self, field)
+            if value is not None or not self.extra or field not in self.extra:
+                return value
+        if self.extra and field in self.extra:
+            return self.extra[field]
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        value = getattr(self, field) if field in KNOWN else None
+        if value is None and self.extra:
+            value = self.extra.get(field)
+        return default if value is None else value
+
+    def __contains__(self, field):
+        return self.get(field) is not None
+
+    def __iter__(self):
+        for name in FIELD_NAMES:
+            if getattr(self, name) is not None:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def keys(self):
+        return list(self)
+
+    def text(self, field):
+        """界面显示用的文本，空值为 ''"""
+        value = self.get(field)
+        if value is None:
+            return ''
+        if field in TIMESTAMP_FIELDS and type(value) is int:
+            return format_timestamp(value)
+        return str(value)
+
+    def replace(self, **fields):
+        """返回修改了几个字段的新档案，只转换给出的字段"""
+        agent = Agent.__new__(Agent)
+        for name in self.__slots__:
+            setattr(agent, name, getattr(self, name))
+        for field, value in fields.items():
+            if field in KNOWN:
+                setattr(agent, field, COERCERS[field](value, field))
+                if agent.extra and field in agent.extra:
+                    # 重新填写过，不再保留载入时解析不了的原文
+                    agent.extra = {k: v for k, v in agent.extra.items() if k != field} or None
+            else:
+                agent.extra = dict(agent.extra or {}, **{field: value})
+        return agent
+
+    def to_dict(self):
+        """写文件、发给同步客户端用的字典，时间还原成文本"""
+        return {field: self.text(field) if field in TIMESTAMP_FIELDS else self[field] for field in self}
+
+    def __repr__(self):
+        return f'Agent({self.to_dict()!r})'
+
+
+def compile_coercer():
+    """生成 coerce(raw)：raw 是字典或 Agent，返回新的 Agent，字段值不合法时抛出 SchemaError
+
+    按 FIELDS 生成代码后编译，每个字段一行，没有逐字段的循环和分支判断
+    （和 collections.namedtuple 的做法相同）。
+    """
+    lines = [
+        'def coerce(raw):',
+        '    if type(raw) is Agent:',
+        '        return raw',
+        '    get = raw.get',
+        '    agent = new(Agent)',
+    ]
+    for name, kind in FIELDS:
+        lines.append(f'    agent.{name} = {kind}(get({name!r}), {name!r})')
+    lines += [
+        '    unknown = raw.keys() - KNOWN',
+        '    agent.extra = {field: raw[field] for field in unknown} if unknown else None',
+        '    return agent',
+    ]
+    namespace = dict(CONVERTERS, Agent=Agent, new=object.__new__, KNOWN=KNOWN)
+    exec(compile('\n'.join(lines), '<agent_schema.coerce>', 'exec'), namespace)
+    return namespace['coerce']
+
+
+coerce = compile_coercer()
+
+
+def coerce_saved(raw):
+    """载入已保存的档案：返回 (Agent, 解析不了的字段名列表)，不抛出 SchemaError；
+    解析不了的字段（如旧文件里的 "35岁"、"2024/01/02"）为 None，原文放进 extra，照样显示和写回"""
+    try:
+        return coerce(raw), []
+    except SchemaError:
+        pass
+    valid, unparsed = {}, {}
+    for field, value in raw.items():
+        if field in KNOWN:
+            try:
+                COERCERS[field](value, field)
+            except SchemaError:
+                unparsed[field] = value
+                continue
+        valid[field] = value
+    agent = coerce(valid)
+    agent.extra = dict(agent.extra or {}, **unparsed)
+    return agent, list(unparsed)
+
+
+def coerce_all(agents, strict=True):
+    """批量转换 {特工编号: 档案}；strict 时出错在异常里带上特工编号，
+    否则按 coerce_saved 保留原文，最后对全部解析不了的字段发出一次 SchemaWarning"""
+    result = {}
+    unparsed = []
+    for agent_id, raw in agents.items():
+        if not strict:
+            result[agent_id], fields = coerce_saved(raw)
+            unparsed.extend((agent_id, field, raw[field]) for field in fields)
+            continue
+        try:
+            result[agent_id] = coerce(raw)
+        except SchemaError as e:
+            raise SchemaError(f'{agent_id}.{e.field}', e.value, e.reason) from e
+    warn_unparsed(unparsed)
+    return result
+
+
+def warn_unparsed(unparsed, shown=5):
+    """unparsed 为 [(特工编号, 字段, 原文)]"""
+    if not unparsed:
+        return
+    listed = '，'.join(f'{agent_id}.{field}: {value!r}' for agent_id, field, value in unparsed[:shown])
+    more = '……' if len(unparsed) > shown else ''
+    warnings.warn(f'{len(unparsed)} 个字段值无法解析，已按原文保留: {listed}{more}', SchemaWarning, stacklevel=3)
+
+
+def to_json(value):
+    """json.dumps 的 default 参数，遇到 Agent 时转成字典"""
+    if isinstance(value, Agent):
+        return value.to_dict()
+    raise TypeError(f'{type(value).__name__} 不能转换为 JSON')
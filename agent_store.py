@@ -0,0 +1,227 @@
+"""特工数据库的读写与统计（不依赖 tkinter，可在无界面环境使用）
+
+.ciadb 文件有两种写法：4.py 保存 base64 编码后的 JSON，33.py 保存明文 JSON，
+load_db 会自动识别。
+
+AgentStore 把档案字典、全文索引和状态统计放在一起：所有修改都经过它并发出
+ChangeEvent（见 change_feed.py），索引和统计订阅事件增量更新，界面也可以订阅。
+存进 AgentStore 的档案都先经 agent_schema.coerce 转换成 Agent（年龄为整数、时间为时间戳）。
+"""
+import json
+import os
+
+import agent_schema
+import fulltext
+import time_index
+from change_feed import DELETED, INSERTED, UPDATED, ChangeFeed
+
+# 全文检索的字段，33.py 的档案没有 clearance，缺少的字段会被跳过
+TEXT_FIELDS = ("codename", "status", "clearance", "location", "missions")
+
+
+def load_db(path):
+    """读取 .ciadb 文件，返回 {特工编号: 档案} 字典"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    if raw.lstrip().startswith("{"):
+        return json.loads(raw)
+    import base64
+
+    return json.loads(base64.b64decode(raw).decode())
+
+
+def dump_db(agents, path, encoded=True):
+    """保存 .ciadb 文件，encoded 为 True 时写成 base64 编码"""
+    data = json.dumps(agents, indent=2, default=agent_schema.to_json)
+    if encoded:
+        import base64
+
+        data = base64.b64encode(data.encode()).decode()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def status_counts(agents):
+    """按状态统计特工人数"""
+    counts = {}
+    for agent in agents.values():
+        status = agent["status"]
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def risk_summary(agents):
+    """风险评估：活跃、被捕、叛逃及高风险人数"""
+    return risk_from_counts(status_counts(agents))
+
+
+def risk_from_counts(counts):
+    analysis = {
+        "active": counts.get("活跃", 0),
+        "captured": counts.get("被捕", 0),
+        "compromised": counts.get("叛逃", 0),
+    }
+    analysis["high_risk"] = analysis["captured"] + analysis["compromised"]
+    return analysis
+
+
+def build_text_index(agents):
+    """为全部特工档案建立全文索引"""
+    index = fulltext.FullTextIndex(TEXT_FIELDS)
+    for agent_id, agent in agents.items():
+        index.add(agent_id, agent)
+    return index
+
+
+def load_text_index(agents, path):
+    """读取数据库旁边的索引文件；不存在或已过期时重建并写回"""
+    index = fulltext.FullTextIndex(TEXT_FIELDS)
+    signature = fulltext.file_signature(path)
+    if not index.load(fulltext.index_path(path), signature):
+        index = build_text_index(agents)
+        save_text_index(index, path)
+    return index
+
+
+def save_text_index(index, path):
+    """数据库保存之后调用，让索引与数据文件的签名一致"""
+    if os.path.exists(path):
+        index.save(fulltext.index_path(path), fulltext.file_signature(path))
+
+
+def search_agents(agents, index, query):
+    """全文检索，按数据库中的顺序返回命中的特工编号"""
+    hits = index.search(query, agents.get)
+    return [agent_id for agent_id in agents if agent_id in hits]
+
+
+def build_contact_index(agents):
+    """按最后联络时间排序的索引"""
+    return time_index.TimeIndex((agent_id, agent.last_contact) for agent_id, agent in agents.items())
+
+
+class AgentStore:
+    """特工档案集合；档案字典只整体替换、不原地修改，事件里的旧档案不会被改掉"""
+
+    def __init__(self, agents=None):
+        self.agents = agent_schema.coerce_all(agents) if agents else {}
+        self.text_index = build_text_index(self.agents)
+        self.counts = status_counts(self.agents)
+        # 字段 -> {取值: {特工编号: None}}，第一次按该字段分组时才建立
+        self.groups = {}
+        self.contact_index = build_contact_index(self.agents)
+        self.changes = ChangeFeed()
+        self.changes.subscribe(self._on_change)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __contains__(self, agent_id):
+        return agent_id in self.agents
+
+    def __getitem__(self, agent_id):
+        return self.agents[agent_id]
+
+    def get(self, agent_id, default=None):
+        return self.agents.get(agent_id, default)
+
+    def items(self):
+        return self.agents.items()
+
+    def _on_change(self, event):
+        if event.old is not None:
+            self._count(event.old["status"], -1)
+        if event.new is not None:
+            self._count(event.new["status"], 1)
+        for field, buckets in self.groups.items():
+            self._regroup(buckets, field, event)
+        old_contact = event.old.last_contact if event.old is not None else None
+        new_contact = event.new.last_contact if event.new is not None else None
+        if old_contact != new_contact:
+            self.contact_index.remove(event.key, old_contact)
+            self.contact_index.add(event.key, new_contact)
+        if event.kind == INSERTED:
+            self.text_index.add(event.key, event.new)
+        elif event.kind == UPDATED:
+            self.text_index.update(event.key, event.old, event.new)
+        else:
+            self.text_index.remove(event.key, event.old)
+
+    def _count(self, status, delta):
+        count = self.counts.get(status, 0) + delta
+        if count:
+            self.counts[status] = count
+        else:
+            self.counts.pop(status, None)
+
+    @staticmethod
+    def _regroup(buckets, field, event):
+        old = event.old.get(field, "") if event.old is not None else None
+        new = event.new.get(field, "") if event.new is not None else None
+        if old == new:
+            return
+        if old is not None:
+            members = buckets[old]
+            del members[event.key]
+            if not members:
+                del buckets[old]
+        if new is not None:
+            buckets.setdefault(new, {})[event.key] = None
+
+    def group(self, field):
+        """按字段取值分组的特工编号，随修改增量维护；组内按加入的先后排列"""
+        buckets = self.groups.get(field)
+        if buckets is None:
+            buckets = self.groups[field] = {}
+            for agent_id, agent in self.agents.items():
+                buckets.setdefault(agent.get(field, ""), {})[agent_id] = None
+        return buckets
+
+    def put(self, agent_id, data):
+        """新增或整体替换一份档案"""
+        data = agent_schema.coerce(data)
+        old = self.agents.get(agent_id)
+        self.agents[agent_id] = data
+        self.changes.publish(INSERTED if old is None else UPDATED, agent_id, old, data, data)
+
+    def update(self, agent_id, **fields):
+        """只修改几个字段，例如 update("007", status="被捕")"""
+        old = self.agents[agent_id]
+        new = self.agents[agent_id] = old.replace(**fields)
+        self.changes.publish(UPDATED, agent_id, old, new, new)
+
+    def delete(self, agent_id):
+        old = self.agents.pop(agent_id)
+        self.changes.publish(DELETED, agent_id, old, None, old)
+
+    def clear(self):
+        """逐条删除，订阅者同样按条收到 DELETED 事件"""
+        for agent_id in list(self.agents):
+            self.delete(agent_id)
+
+    def load(self, path):
+        """整体换成 path 中的数据库；这不是增量变化，调用方自行刷新界面"""
+        agents = agent_schema.coerce_all(load_db(path), strict=False)
+        self.agents = agents
+        self.text_index = load_text_index(agents, path)
+        self.counts = status_counts(agents)
+        self.groups = {}
+        self.contact_index = build_contact_index(agents)
+
+    def save(self, path, encoded=True):
+        dump_db(self.agents, path, encoded=encoded)
+        save_text_index(self.text_index, path)
+
+    def search(self, query):
+        return search_agents(self.agents, self.text_index, query)
+
+    def stale(self, cutoff):
+        """最后联络早于 cutoff（时间戳）的特工编号，失联最久的在前；没有联络记录的不算"""
+        return self.contact_index.before(cutoff)
+
+    def stale_count(self, cutoff):
+        return self.contact_index.count_before(cutoff)
+
+    def risk_summary(self):
+        """直接用增量维护的状态统计，不必遍历全部档案"""
+        return risk_from_counts(self.counts)
@@ -0,0 +1,168 @@
+"""特工数据库的态势分析窗口：Canvas 柱状图，数据来自 agent_analytics.AgentTable
+
+档案修改后合并成一次重画，只重画统计结果变了的那几张图；
+同一张图的柱子和分层不变时只用 coords 移动已有的矩形、改数字，不删除重建。
+"""
+import tkinter as tk
+from tkinter import ttk
+
+import agent_analytics
+import agent_schema
+
+BACKGROUND = "#0A1A2F"
+FOREGROUND = "#C0C0C0"
+GRID = "#1E3A5F"
+STATUS_COLORS = {"活跃": "#2E8B57", "休眠": "#708090", "被捕": "#D2691E", "阵亡": "#8B0000", "叛逃": "#DC143C"}
+PALETTE = ("#4682B4", "#DAA520", "#6A5ACD", "#20B2AA", "#CD5C5C", "#9ACD32")
+CHART_WIDTH = 560
+CHART_HEIGHT = 280
+MARGIN = (50, 30, 20, 45)  # 左、上、右、下
+TOP_LOCATIONS = 8
+# 联络时间分布随时间推移变化，窗口打开期间定时重算
+RECENCY_REFRESH_MS = 60 * 1000
+
+
+def series_color(name, index):
+    return STATUS_COLORS.get(name, PALETTE[index % len(PALETTE)])
+
+
+class BarChart:
+    """堆叠柱状图：labels 为横轴分类，series 为 [(分层名, 颜色, 各分类的数值)]"""
+
+    def __init__(self, canvas, title):
+        self.canvas = canvas
+        self.title = title
+        self.layout = None
+        self.bars = {}
+        self.totals = []
+        self.coords = {}
+
+    def draw(self, labels, series):
+        layout = (tuple(labels), tuple(name for name, _, _ in series))
+        if layout != self.layout:
+            self.relayout(labels, series)
+            self.layout = layout
+        left, top, right, bottom = self.plot_area()
+        stacks = [sum(values[i] for _, _, values in series) for i in range(len(labels))]
+        scale = (bottom - top) / max(stacks or [1]) if any(stacks) else 0
+        slot = (right - left) / max(len(labels), 1)
+        for i, stack in enumerate(stacks):
+            x0, x1 = left + slot * (i + 0.15), left + slot * (i + 0.85)
+            y = bottom
+            for j, (_, _, values) in enumerate(series):
+                height = values[i] * scale
+                self.move(self.bars[i, j], (x0, y - height, x1, y))
+                y -= height
+            self.move(self.totals[i], ((x0 + x1) / 2, y - 8))
+            self.canvas.itemconfig(self.totals[i], text=str(stack) if stack else "")
+
+    def move(self, item, coords):
+        """只移动位置变了的图元"""
+        if self.coords.get(item) != coords:
+            self.canvas.coords(item, *coords)
+            self.coords[item] = coords
+
+    def plot_area(self):
+        left, top, right, bottom = MARGIN
+        return left, top, CHART_WIDTH - right, CHART_HEIGHT - bottom
+
+    def relayout(self, labels, series):
+        """分类或分层变了：重建整张图的图元"""
+        canvas = self.canvas
+        canvas.delete("all")
+        self.bars, self.coords = {}, {}
+        left, top, right, bottom = self.plot_area()
+        canvas.create_text(left, 12, text=self.title, anchor=tk.W, fill=FOREGROUND, font=("Consolas", 10, "bold"))
+        canvas.create_line(left, bottom, right, bottom, fill=GRID)
+        slot = (right - left) / max(len(labels), 1)
+        for i, label in enumerate(labels):
+            canvas.create_text(left + slot * (i + 0.5), bottom + 12, text=label, fill=FOREGROUND,
+                               font=("Consolas", 8))
+            for j, (_, color, _) in enumerate(series):
+                self.bars[i, j] = canvas.create_rectangle(0, 0, 0, 0, fill=color, outline="")
+        self.totals = [canvas.create_text(0, 0, text="", fill=FOREGROUND, font=("Consolas", 8))
+                       for _ in labels]
+        # 图例
+        x = right
+        for name, color, _ in reversed(series) if len(series) > 1 else ():
+            item = canvas.create_text(x, 12, text=name, anchor=tk.E, fill=FOREGROUND, font=("Consolas", 8))
+            x = canvas.bbox(item)[0] - 4
+            canvas.create_rectangle(x - 10, 7, x, 17, fill=color, outline="")
+            x -= 16
+
+
+class AnalyticsWindow(tk.Toplevel):
+    """态势分析：状态 × 位置、状态 × 密级、年龄分布、联络时间分布"""
+
+    def __init__(self, master, store, on_close=None):
+        super().__init__(master)
+        self.title("态势分析")
+        self.configure(bg="#001933")
+        self.on_close = on_close
+        self.table = agent_analytics.AgentTable(store)
+        self.refresh_id = None
+        self.recency_id = None
+
+        titles = {
+            ("status", "location"): "状态 × 位置",
+            ("status", "clearance"): "状态 × 密级",
+            agent_analytics.AGE: "年龄分布",
+            agent_analytics.RECENCY: "最后联络距今",
+        }
+        self.charts = {}
+        for i, (key, title) in enumerate(titles.items()):
+            canvas = tk.Canvas(self, width=CHART_WIDTH, height=CHART_HEIGHT, bg=BACKGROUND,
+                               highlightthickness=0)
+            canvas.grid(row=i // 2, column=i % 2, padx=5, pady=5)
+            self.charts[key] = BarChart(canvas, title)
+        backend = "NumPy" if self.table.np else "array"
+        ttk.Label(self, text=f"统计引擎: {backend} | 档案修改后自动更新").grid(row=2, column=0, columnspan=2,
+                                                                      sticky=tk.W, padx=5)
+
+        # 订阅在 table 之后，收到事件时统计已经更新
+        self.unsubscribe = store.changes.subscribe(self.on_change)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.redraw()
+        self.recency_id = self.after(RECENCY_REFRESH_MS, self.tick)
+
+    def on_change(self, event):
+        if self.refresh_id is None:
+            self.refresh_id = self.after_idle(self.redraw)
+
+    def redraw(self):
+        """只重画统计结果变了的图"""
+        self.refresh_id = None
+        for key in self.table.take_dirty():
+            self.draw(key)
+
+    def draw(self, key):
+        if key == agent_analytics.AGE:
+            labels, counts = self.table.age_histogram()
+            series = [("人数", PALETTE[0], counts)]
+        elif key == agent_analytics.RECENCY:
+            labels, counts = self.table.recency(agent_schema.current_timestamp())
+            series = [("人数", PALETTE[1], counts)]
+        else:
+            top = TOP_LOCATIONS if key[1] == "location" else None
+            names, labels, cells = self.table.crosstab(key, top)
+            series = [(name, series_color(name, i), line) for i, (name, line) in enumerate(zip(names, cells))]
+        self.charts[key].draw(labels, series)
+
+    def tick(self):
+        self.draw(agent_analytics.RECENCY)
+        self.recency_id = self.after(RECENCY_REFRESH_MS, self.tick)
+
+    def reload(self):
+        """store 整体换了数据（打开另一个数据库）之后重新装载"""
+        self.table.rebuild()
+        self.redraw()
+
+    def close(self):
+        self.unsubscribe()
+        self.table.close()
+        for pending in (self.refresh_id, self.recency_id):
+            if pending is not None:
+                self.after_cancel(pending)
+        self.destroy()
+        if self.on_close:
+            self.on_close()
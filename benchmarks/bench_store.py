@@ -0,0 +1,155 @@
+"""通讯录与特工数据库热点路径的基准测试（无界面）
+
+用法:
+    python benchmarks/bench_store.py                          # 默认规模 1万、10万
+    python benchmarks/bench_store.py --sizes 10000 1000000 5000000
+    python benchmarks/bench_store.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import benchutil
+import datagen
+import agent_schema
+import agent_store
+import dedupe
+import parallel_ingest
+import snapshot
+from addressbook import SNAPSHOT_FIELDS, AddressBook, Contact, snapshot_record
+
+SEARCH_QUERIES = {"name": "张", "phone": "138", "miss": "zzzz"}
+PHONE_QUERIES = {"prefix": "+86 139", "suffix": "8888", "contains": "0013"}
+RANKED_QUERIES = {"name": "张伟", "initials": "zw", "typo": "Alcie12", "miss": "zzzz"}
+TEXT_QUERIES = {"address": "广州", "field": "address:广东广州", "email": "example.com user42"}
+
+
+def bench_addressbook(n, workdir, repeat):
+    results = {}
+    path = os.path.join(workdir, f"contacts_{n}.json")
+    datagen.write_contacts(path, n)
+
+    book = AddressBook(path)
+    results["load_contacts"] = benchutil.measure(book.load_contacts, repeat)
+    results["save_contacts"] = benchutil.measure(book.save_contacts, repeat)
+    for label, keyword in SEARCH_QUERIES.items():
+        results[f"search_contacts.{label}"] = benchutil.measure(
+            lambda: book.search_contacts(keyword), repeat, setup=book.search_cache.clear)
+    # 逐字输入再退格：第一个字扫描全表，之后在缓存结果里筛选或直接命中
+    typing = ["1", "13", "138", "1380", "138", "13"]
+    results["search_contacts.typing"] = benchutil.measure(
+        lambda: [book.search_contacts(keyword) for keyword in typing], repeat,
+        setup=book.search_cache.clear)
+    for mode, query in PHONE_QUERIES.items():
+        results[f"search_phone.{mode}"] = benchutil.measure(
+            lambda: book.search_phone(query, mode), repeat)
+    for label, keyword in RANKED_QUERIES.items():
+        results[f"search_ranked.{label}"] = benchutil.measure(
+            lambda: book.search_ranked(keyword), repeat)
+    book.ensure_text_index()
+    for label, query in TEXT_QUERIES.items():
+        results[f"search_text.{label}"] = benchutil.measure(
+            lambda: book.search_text(query), repeat)
+    rows = [(c.name, c.phone, c.email, c.address) for c in book.contacts]
+    results["find_duplicates"] = benchutil.measure(lambda: dedupe.find_duplicates(rows), repeat)
+
+    original = list(book.contacts)
+    victims = iter([c.name for c in original[::max(1, n // repeat)]])
+
+    def restore():
+        book.contacts = list(original)
+        book.rebuild_index()
+
+    results["delete_contact"] = benchutil.measure(
+        lambda: book.delete_contact(next(victims)), repeat, setup=restore)
+    results["add_contact"] = benchutil.measure(
+        lambda: book.add_contact(Contact("基准", "13800000000", "bench@example.com", "广东")),
+        repeat, setup=restore)
+    return results
+
+
+def bench_snapshot(n, workdir, repeat):
+    results = {}
+    path = os.path.join(workdir, f"contacts_{n}.snap")
+    results["write_snapshot"] = benchutil.measure(
+        lambda: snapshot.write_snapshot(path, map(snapshot_record, datagen.contacts(n)), SNAPSHOT_FIELDS), 1)
+    books = []
+    results["open"] = benchutil.measure(lambda: books.append(AddressBook(path)), repeat)
+    for opened in books[:-1]:
+        opened.close()
+    book = books[-1]
+    step = max(1, n // 1000)
+    results["read_1000_scattered"] = benchutil.measure(
+        lambda: [book.contacts[i] for i in range(0, n, step)], repeat)
+    results["update_contact"] = benchutil.measure(
+        lambda: book.update_contact(book.contacts[n // 2], {"address": "基准"}), repeat)
+    results["compact"] = benchutil.measure(book.compact, 1)
+    book.close()
+    return results
+
+
+def bench_agents(n, workdir, repeat):
+    results = {}
+    agents = datagen.agents(n)
+    for label, encoded in (("ciadb_base64", True), ("ciadb_plain", False)):
+        path = os.path.join(workdir, f"agents_{n}_{label}.ciadb")
+
+        def round_trip():
+            agent_store.dump_db(agents, path, encoded=encoded)
+            agent_store.load_db(path)
+
+        results[f"save_open_db.{label}"] = benchutil.measure(round_trip, repeat)
+    # 载入时的类型转换：年龄转整数、时间转时间戳
+    results["coerce_all"] = benchutil.measure(lambda: agent_schema.coerce_all(agents), repeat)
+    results["risk_summary"] = benchutil.measure(lambda: agent_store.risk_summary(agents), repeat)
+    results["status_counts"] = benchutil.measure(lambda: agent_store.status_counts(agents), repeat)
+    store = agent_store.AgentStore(dict(agents))
+    agent_id = next(iter(agents))
+    statuses = itertools.cycle(("被捕", "活跃"))
+    # 单条修改经事件总线增量更新全文索引和状态统计
+    results["store_update"] = benchutil.measure(lambda: store.update(agent_id, status=next(statuses)), repeat)
+    results["store_risk_summary"] = benchutil.measure(store.risk_summary, repeat)
+    # 失联检查：最后联络时间索引上的一次二分查找
+    cutoff = agent_schema.to_timestamp("2022-06-01", "last_contact")
+    results["store_stale_count"] = benchutil.measure(lambda: store.stale_count(cutoff), repeat)
+    # 导入 JSON Lines：分片解析校验，单进程与 CPU 核数个进程
+    jsonl_path = os.path.join(workdir, f"agents_{n}.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for agent_id, agent in agents.items():
+            f.write(json.dumps(dict(agent, agent_id=agent_id), ensure_ascii=False) + "\n")
+    for jobs in sorted({1, os.cpu_count() or 1}):
+        results[f"ingest_jsonl.jobs{jobs}"] = benchutil.measure(
+            lambda: parallel_ingest.ingest(jsonl_path, parallel_ingest.AGENTS, jobs=jobs), 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通讯录与特工数据库基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="数据规模，可用到 5000000")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数")
+    benchutil.add_common_arguments(parser, "bench_store_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="txl_bench_")
+    try:
+        for n in args.sizes:
+            print(f"规模 {n} ...")
+            for group, bench in (("addressbook", bench_addressbook), ("snapshot", bench_snapshot),
+                                 ("agents", bench_agents)):
+                for name, stats in bench(n, workdir, args.repeat).items():
+                    key = f"{group}.{name}[n={n}]"
+                    results[key] = stats
+                    print(f"  {key:<55}{stats['median'] * 1000:>10.2f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(benchutil.finish(args, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Tk 绘制路径的帧耗时基准测试
+
+在 Xvfb（或 --withdrawn 模式下隐藏的 Tk 根窗口）里运行各程序，注入合成数据和
+事件，记录每次刷新/每帧的耗时分位数（p50/p95/p99）。
+
+用法:
+    python benchmarks/bench_ui.py                        # 没有 DISPLAY 时自动启动 Xvfb
+    python benchmarks/bench_ui.py --withdrawn            # 不显示窗口，按固定尺寸绘制
+    python benchmarks/bench_ui.py --contacts 50000 --frames 300
+    python benchmarks/bench_ui.py --baseline ui_baseline.json
+"""
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchutil
+import datagen
+import tkinter as tk
+
+WIDTH, HEIGHT = 1000, 700
+SEARCH_KEYSTROKES = ["", "张", "王", "1", "13", "138", "Alice", "zz", ""]
+
+
+class SyntheticEvent:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def ensure_display():
+    """没有图形环境时尝试启动 Xvfb，返回需要在结束时关闭的进程"""
+    if os.name == "nt" or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("没有 DISPLAY 也找不到 Xvfb，请安装 Xvfb 或使用 --withdrawn 并在图形环境中运行")
+    display = ":%d" % (90 + os.getpid() % 100)
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", f"{WIDTH + 200}x{HEIGHT + 200}x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    return proc
+
+
+def load_script(filename):
+    """按文件加载 4.py / 33.py / 11.py 这类不能直接 import 的程序"""
+    name = "app_" + os.path.splitext(filename)[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(benchutil.ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_root(withdrawn):
+    root = tk.Tk()
+    root.geometry(f"{WIDTH}x{HEIGHT}+0+0")
+    if withdrawn:
+        # 隐藏的窗口没有实际尺寸，特效按固定尺寸绘制
+        root.withdraw()
+        root.winfo_width = lambda: WIDTH
+        root.winfo_height = lambda: HEIGHT
+    root.update()
+    return root
+
+
+def timed_frames(root, frame, count):
+    """逐帧调用 frame 并处理 Tk 的重绘任务，返回每帧耗时"""
+    times = []
+    for i in range(count):
+        start = time.perf_counter()
+        frame(i)
+        root.update_idletasks()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_contacts(args):
+    import txl
+
+    datagen.write_contacts("contacts.json", args.contacts)
+    root = make_root(args.withdrawn)
+    app = txl.CyberpunkContactApp(root)
+
+    # 由基准测试自己驱动每一帧，停止程序的动画调度器
+    app.scheduler.stop()
+    results = {}
+    keystrokes = SEARCH_KEYSTROKES * max(1, args.refreshes // len(SEARCH_KEYSTROKES))
+    results["update_contact_list"] = timed_frames(
+        root, lambda i: app.update_contact_list(keystrokes[i]), len(keystrokes))
+
+    results["draw_scan_lines"] = timed_frames(root, lambda i: app.draw_scan_lines(), args.frames)
+    results["draw_scan_lines.redraw"] = timed_frames(
+        root, lambda i: app.draw_scan_lines(force=True), args.frames)
+    random.seed(0)
+    results["draw_binary_rain"] = timed_frames(root, lambda i: app.draw_binary_rain(), args.frames)
+    results["scheduler.tick"] = timed_frames(
+        root, lambda i: (app.scheduler.tick(), app.scheduler.stop()), args.frames)
+    root.destroy()
+    return results
+
+
+def bench_agents(args, filename):
+    module = load_script(filename)
+    root = make_root(args.withdrawn)
+    app = module.CIASurveillanceSystem(root)
+    # 界面从 app.store 读档案；逐条 put，界面按事件同步，之后按当前排序整体重建
+    app.store.clear()
+    for agent_id, data in datagen.agents(args.agents).items():
+        app.store.put(agent_id, data)
+    app.sorter.reset()
+    results = {"update_treeview": timed_frames(root, lambda i: app.update_treeview(), args.refreshes)}
+    root.destroy()
+    return results
+
+
+def bench_drawing(args):
+    module = load_script("11.py")
+    root = make_root(args.withdrawn)
+    app = module.DrawingApp(root)
+    rng = random.Random(0)
+    results = {}
+
+    # 先画出大量已完成的图形，再测拖动过程中每一帧的耗时
+    shapes = ["line", "rectangle", "oval"]
+    for i in range(args.strokes):
+        app.shape_var.set(shapes[i % 3])
+        app.start_drawing(SyntheticEvent(rng.randint(1, WIDTH), rng.randint(1, HEIGHT)))
+        app.stop_drawing(SyntheticEvent(rng.randint(1, WIDTH), rng.randint(1, HEIGHT)))
+    root.update_idletasks()
+
+    app.shape_var.set("line")
+    app.start_drawing(SyntheticEvent(10, 10))
+    results["DrawingApp.drawing"] = timed_frames(
+        root, lambda i: app.drawing(SyntheticEvent(10 + i % WIDTH, 10 + i % HEIGHT)), args.frames)
+    app.stop_drawing(SyntheticEvent(WIDTH // 2, HEIGHT // 2))
+    app.document.close()
+    root.destroy()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tk 绘制路径帧耗时基准测试")
+    parser.add_argument("--withdrawn", action="store_true", help="使用隐藏的根窗口，不需要 Xvfb")
+    parser.add_argument("--contacts", type=int, default=10000, help="联系人数量")
+    parser.add_argument("--agents", type=int, default=10000, help="特工数量")
+    parser.add_argument("--strokes", type=int, default=2000, help="画板中预先绘制的图形数量")
+    parser.add_argument("--frames", type=int, default=200, help="动画/拖动帧数")
+    parser.add_argument("--refreshes", type=int, default=20, help="列表刷新次数")
+    benchutil.add_common_arguments(parser, "bench_ui_results.json")
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output)
+
+    xvfb = None if args.withdrawn else ensure_display()
+    workdir = tempfile.mkdtemp(prefix="txl_ui_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # 各程序都在当前目录读写数据文件
+    results = {}
+    try:
+        suites = [
+            ("txl", bench_contacts),
+            ("4.py", lambda a: bench_agents(a, "4.py")),
+            ("33.py", lambda a: bench_agents(a, "33.py")),
+            ("11.py", bench_drawing),
+        ]
+        for app_name, bench in suites:
+            for name, times in bench(args).items():
+                key = f"{app_name}.{name}"
+                results[key] = benchutil.summarize(times)
+                stats = results[key]
+                print(f"  {key:<40}p50 {stats['median'] * 1000:8.2f} ms  "
+                      f"p95 {stats['p95'] * 1000:8.2f} ms  p99 {stats['p99'] * 1000:8.2f} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if xvfb is not None:
+            xvfb.terminate()
+    sys.exit(benchutil.finish(args, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""基准测试公共工具：计时、结果输出和与基线对比"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def measure(fn, repeat=5, setup=None):
+    """运行 repeat 次，返回耗时统计（秒）"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "runs": len(times),
+        "min": times[0],
+        # 次数为偶数时取中间两次的平均，不是较慢的那次
+        "median": statistics.median(times),
+        "p95": percentile(times, 0.95),
+        "p99": percentile(times, 0.99),
+        "max": times[-1],
+    }
+
+
+def percentile(sorted_times, q):
+    return sorted_times[min(len(sorted_times) - 1, int(len(sorted_times) * q))]
+
+
+def write_results(results, path):
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def compare(results, baseline_path, tolerance):
+    """和基线比较中位数，返回 (回归项列表 [(名称, 基线, 当前, 比值)], 基线里没有的项)"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    missing = []
+    for name, current in sorted(results.items()):
+        if name not in baseline:
+            print(f"{name:<55}{'-':>10}{current['median'] * 1000:>10.2f} ms  <-- 没有基线")
+            missing.append(name)
+            continue
+        ratio = current["median"] / max(baseline[name]["median"], 1e-9)
+        mark = "  <-- 回归" if ratio > 1 + tolerance else ""
+        print(f"{name:<55}{baseline[name]['median'] * 1000:>10.2f}{current['median'] * 1000:>10.2f} ms"
+              f"{ratio:>8.2f}x{mark}")
+        if mark:
+            regressions.append((name, baseline[name]["median"], current["median"], ratio))
+    return regressions, missing
+
+
+def add_common_arguments(parser, default_output):
+    parser.add_argument("-o", "--output", default=default_output, help="结果 JSON 路径")
+    parser.add_argument("--baseline", help="与该基线 JSON 比较，有回归时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的变慢比例，默认 0.25")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把本次结果另存为基线")
+
+
+def finish(args, results):
+    write_results(results, args.output)
+    print(f"结果已写入 {args.output}")
+    if args.save_baseline:
+        write_results(results, args.save_baseline)
+        print(f"基线已保存到 {args.save_baseline}")
+    if args.baseline:
+        print(f"{'基准项':<55}{'基线':>10}{'当前':>10}{'比值':>11}")
+        regressions, missing = compare(results, args.baseline, args.tolerance)
+        if missing:
+            print(f"{len(missing)} 项没有基线，无法判断是否回归；请用 --save-baseline 更新基线")
+        if regressions:
+            print(f"{len(regressions)} 项超过允许范围")
+            return 1
+    return 0
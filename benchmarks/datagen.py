@@ -0,0 +1,82 @@
+"""基准测试用的合成数据生成器
+
+同一个 seed 总是生成完全相同的数据，便于不同版本之间对比。
+"""
+import json
+import random
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾萧田董潘袁蔡蒋余于杜叶程魏苏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬燕彬鹏辉斌宇浩凯健俊帆帅旭宁龙林欣怡佳琪晨阳思雨梓涵子轩浩然一诺"
+LATIN_NAMES = ["Leemabi", "Alice", "Bob", "Carol", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan"]
+PROVINCES = ["广东", "北京", "上海", "浙江", "江苏", "四川", "湖北", "湖南", "福建", "山东"]
+CITIES = ["广州", "深圳", "杭州", "南京", "成都", "武汉", "长沙", "厦门", "青岛", "苏州"]
+PHONE_PREFIXES = ["130", "131", "132", "135", "136", "137", "138", "139", "150", "158", "186", "188"]
+
+STATUSES = ["活跃", "休眠", "被捕", "阵亡", "叛逃"]
+CLEARANCES = ["绝密", "机密", "秘密", "公开"]
+LOCATIONS = ["莫斯科", "柏林", "伦敦", "巴黎", "东京", "开罗", "哈瓦那", "伊斯坦布尔", "维也纳", "布拉格"]
+CODEWORDS = ["幽灵", "Ghost", "Viper", "猎鹰", "Echo", "Raven", "夜莺", "Cobra", "Falcon", "Shadow"]
+
+
+def _phone(rng):
+    digits = rng.choice(PHONE_PREFIXES) + "".join(rng.choice("0123456789") for _ in range(8))
+    style = rng.random()
+    # 同样的号码混用几种常见写法
+    if style < 0.6:
+        return digits
+    if style < 0.8:
+        return f"{digits[:3]} {digits[3:7]} {digits[7:]}"
+    return f"+86 {digits[:3]}-{digits[3:7]}-{digits[7:]}"
+
+
+def contacts(n, seed=0):
+    """生成 n 条联系人记录（dict）"""
+    rng = random.Random(seed)
+    for i in range(n):
+        if rng.random() < 0.1:
+            name = f"{rng.choice(LATIN_NAMES)}{i}"
+        else:
+            name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+        yield {
+            "name": name,
+            "phone": _phone(rng),
+            "email": f"user{i}@example.com",
+            "address": f"{rng.choice(PROVINCES)}{rng.choice(CITIES)}{rng.randint(1, 999)}号",
+        }
+
+
+def agents(n, seed=0):
+    """生成 n 条特工档案，返回 {特工编号: 档案} 字典"""
+    rng = random.Random(seed)
+    result = {}
+    for i in range(n):
+        year, month, day = rng.randint(2021, 2023), rng.randint(1, 12), rng.randint(1, 28)
+        contact = f"{year}-{month:02d}-{day:02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+        age = rng.randint(22, 65)
+        result[f"{i:07d}"] = {
+            "codename": f"{rng.choice(CODEWORDS)}-{i}",
+            # 界面录入的年龄是字符串，演示数据是整数，两种都要覆盖
+            "age": age if rng.random() < 0.5 else str(age),
+            "status": rng.choice(STATUSES),
+            "clearance": rng.choice(CLEARANCES),
+            "location": rng.choice(LOCATIONS),
+            "last_contact": contact,
+            "missions": f"{contact[:10]}: 潜入{rng.choice(LOCATIONS)}\n{contact[:10]}: 获取情报",
+            "created": "2021-01-01 09:00:00",
+            "modified": contact + ":00",
+        }
+    return result
+
+
+def write_contacts(path, n, seed=0, chunk=10000):
+    """分块写出 contacts.json，生成几百万条时也不需要先全部放进内存"""
+    with open(path, "w") as f:
+        f.write("[")
+        buffer = []
+        for i, record in enumerate(contacts(n, seed)):
+            buffer.append(("," if i else "") + json.dumps(record))
+            if len(buffer) >= chunk:
+                f.write("".join(buffer))
+                buffer.clear()
+        f.write("".join(buffer))
+        f.write("]")
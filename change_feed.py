@@ -0,0 +1,55 @@
+"""数据修改的事件总线（不依赖 tkinter）
+
+通讯录和特工数据库的每一次增删改都发出一个 ChangeEvent：
+    kind  INSERTED / UPDATED / DELETED
+    key   记录编号（联系人的 id、特工编号）
+    old   修改前的记录（{字段: 值}），新增时为 None
+    new   修改后的记录，删除时为 None
+    item  被修改的对象本身（Contact 或特工档案字典）
+索引、界面列表、统计和保存等都订阅事件，只处理变化的那一条，
+不必在每个修改入口分别刷新全部数据。订阅者按订阅顺序同步调用，
+数据层自己的索引最先订阅，界面收到事件时索引已经是最新的。
+"""
+
+INSERTED = 'inserted'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+class ChangeEvent:
+    __slots__ = ('kind', 'key', 'old', 'new', 'item')
+
+    def __init__(self, kind, key, old=None, new=None, item=None):
+        self.kind = kind
+        self.key = key
+        self.old = old
+        self.new = new
+        self.item = item
+
+    def changed_fields(self):
+        """新旧记录中值不同的字段"""
+        old = self.old or {}
+        new = self.new or {}
+        return {field for field in {*old, *new} if old.get(field) != new.get(field)}
+
+    def __repr__(self):
+        return f'ChangeEvent({self.kind!r}, {self.key!r})'
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback, kinds=None):
+        """订阅事件，kinds 给出时只接收这几种；返回取消订阅的函数"""
+        entry = (callback, frozenset(kinds) if kinds else None)
+        self.subscribers.append(entry)
+        return lambda: self.subscribers.remove(entry) if entry in self.subscribers else None
+
+    def publish(self, kind, key, old=None, new=None, item=None):
+        event = ChangeEvent(kind, key, old, new, item)
+        # 订阅者在回调里取消订阅时不影响本轮分发
+        for callback, kinds in list(self.subscribers):
+            if kinds is None or kind in kinds:
+                callback(event)
+        return event
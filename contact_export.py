@@ -0,0 +1,141 @@
+"""通讯录导出为 vCard 4.0（.vcf）或 CSV（不依赖 tkinter）
+
+records 是联系人记录（{字段: 值}）的可迭代对象，一边读一边写：
+chunks() 每 WRITE_BATCH 条拼成一段文本产出，export() 把各段写进带大缓冲区的文件，
+内存占用与联系人数无关，几百万条也一样。快照通讯录配合 AddressBook.iter_records()
+直接从表里读记录，不生成 Contact 对象。
+export() 可以放在后台线程里执行：progress 收到已写出的条数，cancel（threading.Event）
+被设置时停止并删掉写了一半的文件。先写临时文件，完成后才替换目标文件。
+
+    count = contact_export.export(book.iter_records(), "contacts.vcf")
+"""
+import csv
+import io
+import os
+
+from addressbook import FIELDS
+
+VCF = "vcf"
+CSV = "csv"
+FORMATS = {".vcf": VCF, ".vcard": VCF, ".csv": CSV}
+WRITE_BATCH = 1000
+BUFFER_BYTES = 1024 * 1024
+# vCard 每行最多 75 个字节（不含换行），超出的折行，续行以空格开头
+LINE_OCTETS = 75
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def export_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"不支持的导出格式: {path}（可以导出 .vcf 或 .csv）")
+    return fmt
+
+
+def escape(value):
+    """vCard 文字值的转义：反斜杠、逗号、分号和换行"""
+    return (value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold(line):
+    """按字节数折行，不拆开多字节字符"""
+    if len(line.encode("utf-8")) <= LINE_OCTETS:
+        return line + "\r\n"
+    parts, current, size = [], [], 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        # 续行开头的空格也占一个字节
+        if size + width > LINE_OCTETS - (1 if parts else 0):
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def uid(contact_id):
+    """32 位十六进制的联系人编号写成 urn:uuid，其他编号原样写出"""
+    if len(contact_id) == 32 and all(c in "0123456789abcdef" for c in contact_id):
+        i = contact_id
+        return f"urn:uuid:{i[:8]}-{i[8:12]}-{i[12:16]}-{i[16:20]}-{i[20:]}"
+    return escape(contact_id)
+
+
+def vcard(record):
+    """一条联系人的 vCard 4.0 文本；没有填写的字段不写"""
+    lines = ["BEGIN:VCARD", "VERSION:4.0"]
+    if record.get("id"):
+        lines.append(f"UID:{uid(record['id'])}")
+    # FN 是 vCard 4.0 唯一必需的属性，姓名为空时也要写
+    lines.append(f"FN:{escape(record.get('name') or '')}")
+    if record.get("phone"):
+        # 号码是手填的文字（可能带空格、横线），不是 tel: URI
+        lines.append(f"TEL;VALUE=text:{escape(record['phone'])}")
+    if record.get("email"):
+        lines.append(f"EMAIL:{escape(record['email'])}")
+    if record.get("address"):
+        # 地址没有拆分，整条放在街道一项：邮政信箱;附加地址;街道;城市;省份;邮编;国家
+        lines.append(f"ADR:;;{escape(record['address'])};;;;")
+    lines.append("END:VCARD")
+    return "".join(fold(line) for line in lines)
+
+
+def chunks(records, fmt):
+    """把 records 转成文本，每 WRITE_BATCH 条产出一次 (条数, 文本)；CSV 的表头在第一段里"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == CSV:
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+    count = 0
+    for record in records:
+        if writer is None:
+            buffer.write(vcard(record))
+        else:
+            writer.writerow([record.get(field) or "" for field in FIELDS])
+        count += 1
+        if count == WRITE_BATCH:
+            yield count, buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    if count or buffer.tell():
+        yield count, buffer.getvalue()
+
+
+def write(f, records, fmt, progress=None, cancel=None):
+    """写到已经打开的文本文件，返回写出的条数"""
+    done = 0
+    for count, text in chunks(records, fmt):
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+        f.write(text)
+        done += count
+        if progress:
+            progress(done)
+    f.flush()
+    return done
+
+
+def export(records, path, fmt=None, progress=None, cancel=None):
+    """导出到 path，返回导出的条数；取消时抛出 ExportCancelled，目标文件不变
+
+    CSV 带 UTF-8 BOM，Excel 直接打开时中文不会乱码。
+    """
+    fmt = fmt or export_format(path)
+    tmp_path = path + ".tmp"
+    encoding = "utf-8-sig" if fmt == CSV else "utf-8"
+    try:
+        with open(tmp_path, "w", encoding=encoding, newline="", buffering=BUFFER_BYTES) as f:
+            count = write(f, records, fmt, progress, cancel)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
@@ -0,0 +1,311 @@
+"""通讯录查重（不依赖 tkinter）
+
+两两比较是 O(N²)，十万条就是五十亿对。这里先分块找出候选对，只给候选对打分：
+- 规范化后的号码相同的、邮箱相同的各成一块；
+- 姓名和地址的字符二元组（两个字段分开计哈希）合在一起做 MinHash 签名（NUM_HASHES 个
+  哈希），签名切成 BANDS 段做局部敏感哈希（LSH），有一段完全相同的落进同一块。只是同名
+  而地址不同的两条很少落进同一块，常见姓名不会产生大量候选对。Jaccard 相似度为 s 的两条至少有一段
+  相同的概率是 1 - (1 - s^ROWS)^BANDS：s = 0.9 时约 0.98，s = 0.8 时约 0.77，
+  s = 0.5 时只有 0.03。号码和邮箱都不同的两条要姓名、地址都很接近才算重复，
+  所以 LSH 只需要找出高相似度的对；落进同一块的再用签名估计一次相似度，
+  明显不像的不做精确比较；
+- 超过 MAX_BLOCK 条的块（比如大家都只填了 "广东"）不产生候选对，每块的候选对有上限，
+  总的比较次数与联系人数成正比。
+候选对的分数取两者中高的：号码或邮箱相同时为 0.5 + 0.5 × 姓名相似度（同一个座机的家人
+姓名不同，不算重复）；否则取姓名和地址相似度中低的一个，两者都接近才算。两条都填了号码
+（或邮箱）而且不同的是两个人，分数为 0。达到 THRESHOLD 的对用并查集连成连通块，块内再以
+填得最完整的一条为中心分组，组里每一条都要和中心直接达到 THRESHOLD，不会 A 像 B、B 像 C
+就把 A、C 合到一起。
+另外，姓名里没有字母和汉字、或号码不足 MIN_PHONE_DIGITS 位的列为疑似无效
+（如 "1"/"23"、"3212"/"132" 这样的测试数据）。
+
+输入是 (姓名, 电话, 邮箱, 地址) 的列表，可以在界面线程里取好再交给后台线程计算；
+结果用列表下标表示。有 NumPy 时签名和分段哈希整批向量化计算，没有时逐条计算，
+结果相同，只是慢很多。
+"""
+import itertools
+import operator
+import random
+import re
+import unicodedata
+import zlib
+
+from addressbook import FIELDS
+from numpy_support import load_numpy
+from phone_index import normalize_phone
+
+NUM_HASHES = 96
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+MAX_BLOCK = 50
+THRESHOLD = 0.7
+# 签名估计的姓名加地址相似度低于这个值的 LSH 候选对不再精确打分。
+# 只靠姓名和地址判为重复的两条，估计值应在 THRESHOLD 左右，比这里高出四倍标准差以上
+ESTIMATE_FLOOR = 0.5
+MIN_PHONE_DIGITS = 5
+# 大于 2^32 的素数；乘数小于 2^31，a * x + b 不会超出 64 位
+PRIME = 4294967311
+MASK = (1 << 64) - 1
+BAND_MULTIPLIER = 1000003
+# 向量化计算签名时每批的联系人数，控制中间矩阵的大小
+CHUNK = 4096
+
+NOT_WORD = re.compile(r"[\W_]+")
+LETTER = re.compile(r"[^\W\d_]")
+
+
+def normalize_text(text):
+    """全角转半角、转小写，去掉空白和标点"""
+    return NOT_WORD.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def normalize_email(email):
+    email = (email or "").strip().lower()
+    return email if "@" in email else ""
+
+
+def shingles(text, salt=0):
+    """字符二元组的哈希值，只有一个字时就是这个字；不同字段用不同的 salt"""
+    if len(text) < 2:
+        grams = [text] if text else []
+    else:
+        grams = [text[i:i + 2] for i in range(len(text) - 1)]
+    return frozenset(zlib.crc32(gram.encode("utf-8"), salt) for gram in grams)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+class MinHasher:
+    def __init__(self, num_hashes=NUM_HASHES, seed=1, use_numpy=True):
+        rng = random.Random(seed)
+        self.a = [rng.randrange(1, 1 << 31) for _ in range(num_hashes)]
+        self.b = [rng.randrange(0, PRIME) for _ in range(num_hashes)]
+        self.np = load_numpy() if use_numpy else False
+
+    def signatures(self, sets):
+        """每个（非空）集合的签名；有 NumPy 时是 (集合数, 哈希个数) 的矩阵"""
+        if not self.np:
+            return [[min((a * x + b) % PRIME for x in values) for a, b in zip(self.a, self.b)]
+                    for values in sets]
+        np = self.np
+        a = np.array(self.a, dtype=np.uint64)[:, None]
+        b = np.array(self.b, dtype=np.uint64)[:, None]
+        parts = [np.zeros((0, len(self.a)), dtype=np.uint64)]
+        for start in range(0, len(sets), CHUNK):
+            chunk = sets[start:start + CHUNK]
+            lengths = np.fromiter(map(len, chunk), dtype=np.int64, count=len(chunk))
+            values = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.uint64, count=int(lengths.sum()))
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            # (哈希个数, 二元组个数) 的矩阵，按集合分段取最小值就是签名
+            parts.append(np.minimum.reduceat((a * values + b) % np.uint64(PRIME), starts, axis=1).T)
+        return np.concatenate(parts)
+
+    def blocks(self, signatures):
+        """每一段签名完全相同的行号组成的块（只给出两行以上的）"""
+        if not self.np:
+            for band in range(BANDS):
+                buckets = {}
+                for row, signature in enumerate(signatures):
+                    buckets.setdefault(band_key(signature[band * ROWS:(band + 1) * ROWS]), []).append(row)
+                yield from (block for block in buckets.values() if len(block) > 1)
+            return
+        np = self.np
+        for band in range(BANDS):
+            keys = np.zeros(len(signatures), dtype=np.uint64)
+            for column in range(band * ROWS, (band + 1) * ROWS):
+                keys = keys * np.uint64(BAND_MULTIPLIER) + signatures[:, column]
+            order = np.argsort(keys, kind="stable")
+            ordered = keys[order]
+            starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+            sizes = np.diff(np.concatenate((starts, [len(ordered)])))
+            # 只有两行以上的块才回到 Python 里展开
+            for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+                yield order[start:start + size].tolist()
+
+    def similar(self, signatures, pairs, floor):
+        """签名相同位置的比例（Jaccard 相似度的估计）不低于 floor 的行号对"""
+        need = floor * len(self.a)
+        if not self.np:
+            return [(i, j) for i, j in pairs
+                    if sum(map(operator.eq, signatures[i], signatures[j])) >= need]
+        np = self.np
+        pairs = np.fromiter(itertools.chain.from_iterable(pairs), dtype=np.int64, count=2 * len(pairs))
+        pairs = pairs.reshape(-1, 2)
+        kept = [pairs[:0]]
+        for start in range(0, len(pairs), CHUNK * 16):
+            chunk = pairs[start:start + CHUNK * 16]
+            equal = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).sum(axis=1)
+            kept.append(chunk[equal >= need])
+        kept = np.concatenate(kept)
+        return list(zip(kept[:, 0].tolist(), kept[:, 1].tolist()))
+
+
+def band_key(values):
+    """与 NumPy 版本相同的算法：按 64 位无符号整数溢出回绕"""
+    key = 0
+    for value in values:
+        key = (key * BAND_MULTIPLIER + value) & MASK
+    return key
+
+
+def block_pairs(blocks):
+    pairs = set()
+    for block in blocks:
+        if 1 < len(block) <= MAX_BLOCK:
+            pairs.update(itertools.combinations(sorted(block), 2))
+    return pairs
+
+
+def lsh_pairs(sets, use_numpy=True):
+    """MinHash/LSH 找出的候选对（集合的下标），已按签名估计的相似度筛掉明显不像的"""
+    hasher = MinHasher(use_numpy=use_numpy)
+    present = [i for i, values in enumerate(sets) if values]
+    signatures = hasher.signatures([sets[i] for i in present])
+    pairs = block_pairs(hasher.blocks(signatures))
+    return {(present[i], present[j]) for i, j in hasher.similar(signatures, pairs, ESTIMATE_FLOOR)}
+
+
+def exact_blocks(values):
+    buckets = {}
+    for i, value in enumerate(values):
+        if value:
+            buckets.setdefault(value, []).append(i)
+    return buckets.values()
+
+
+class Profile:
+    """一条联系人规范化后的比较用数据"""
+    __slots__ = ("phone", "email", "name", "address", "words")
+
+    def __init__(self, row):
+        name, phone, email, address = row
+        phone = normalize_phone(phone)
+        self.phone = phone if len(phone) >= MIN_PHONE_DIGITS else ""
+        self.email = normalize_email(email)
+        self.name = shingles(normalize_text(name))
+        self.address = shingles(normalize_text(address), salt=1)
+        self.words = self.name | self.address
+
+
+def score(first, second):
+    """两条联系人的相似度，0 到 1；号码或邮箱两边都有而不同时为 0"""
+    if (first.phone and second.phone and first.phone != second.phone) or (
+            first.email and second.email and first.email != second.email):
+        return 0.0
+    name = jaccard(first.name, second.name)
+    content = min(name, jaccard(first.address, second.address))
+    if (first.phone and first.phone == second.phone) or (first.email and first.email == second.email):
+        return max(0.5 + name / 2, content)
+    return content
+
+
+def candidate_pairs(profiles, use_numpy=True):
+    pairs = block_pairs(itertools.chain(exact_blocks([p.phone for p in profiles]),
+                                        exact_blocks([p.email for p in profiles])))
+    return pairs | lsh_pairs([p.words for p in profiles], use_numpy)
+
+
+def filled(values):
+    return sum(1 for value in values if (value or "").strip())
+
+
+def find_duplicates(rows, threshold=THRESHOLD, use_numpy=True):
+    """rows 为 (姓名, 电话, 邮箱, 地址) 的列表，返回 [(下标列表, 组内最低分)]，
+    组按分数从高到低排列，组内下标按原来的顺序
+
+    每组的中心是组里填得最完整的一条（一样完整时取下标小的），与 DuplicateGroup 默认保留的
+    是同一条，组里其他各条与它的分数都达到 threshold。
+    """
+    profiles = [Profile(row) for row in rows]
+    parent = list(range(len(rows)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    neighbors = {}
+    for i, j in candidate_pairs(profiles, use_numpy):
+        value = score(profiles[i], profiles[j])
+        if value >= threshold:
+            neighbors.setdefault(i, {})[j] = value
+            neighbors.setdefault(j, {})[i] = value
+            parent[root(i)] = root(j)
+    components = {}
+    for i in neighbors:
+        components.setdefault(root(i), []).append(i)
+    found = []
+    for members in components.values():
+        members.sort(key=lambda i: (-filled(rows[i]), i))
+        grouped = set()
+        for center in members:
+            if center in grouped:
+                continue
+            matched = {j: value for j, value in neighbors[center].items() if j not in grouped}
+            if matched:
+                grouped.add(center)
+                grouped.update(matched)
+                found.append((sorted([center, *matched]), min(matched.values())))
+    found.sort(key=lambda item: (-item[1], item[0][0]))
+    return found
+
+
+def is_junk(row):
+    name, phone = row[0], row[1]
+    return not LETTER.search(name or "") or len(normalize_phone(phone)) < MIN_PHONE_DIGITS
+
+
+def find_junk(rows):
+    """疑似无效的联系人下标"""
+    return [i for i, row in enumerate(rows) if is_junk(row)]
+
+
+def completeness(contact):
+    return filled(getattr(contact, field) for field in FIELDS)
+
+
+class DuplicateGroup:
+    """一组重复的联系人；keep 为合并后保留的一条，默认取填得最完整的"""
+
+    def __init__(self, members, score):
+        self.members = members
+        self.score = score
+        self.keep = max(members, key=completeness)
+
+    def duplicates(self):
+        return [contact for contact in self.members if contact is not self.keep]
+
+    def merged(self):
+        """保留的联系人的字段，空着的用其他成员的补上"""
+        data = {}
+        for field in FIELDS:
+            value = getattr(self.keep, field)
+            if not value.strip():
+                value = next((getattr(c, field) for c in self.members if getattr(c, field).strip()), value)
+            data[field] = value
+        return data
+
+    def changes(self):
+        """合并时保留的联系人要修改的字段"""
+        return {field: value for field, value in self.merged().items() if value != getattr(self.keep, field)}
+
+
+def merge_plan(groups, junk=()):
+    """生成 AddressBook.apply_batch 的参数：(修改列表, 删除列表)；
+    同时出现在重复组里的疑似无效联系人按重复组处理"""
+    updates, deletions = [], []
+    grouped = set()
+    for group in groups:
+        grouped.update(group.members)
+        changes = group.changes()
+        if changes:
+            updates.append((group.keep, changes))
+        deletions.extend(group.duplicates())
+    deletions.extend(contact for contact in junk if contact not in grouped)
+    return updates, deletions
@@ -0,0 +1,203 @@
+"""通讯录查重窗口：列出疑似重复的联系人组和疑似无效的联系人，勾选后一次合并
+
+查找在后台线程里进行（十万条要几秒），界面线程先取好联系人快照，完成后用 after 轮询取回结果。
+合并时所有修改和删除交给 AddressBook.apply_batch，JSON 模式下只写一次文件；
+期间有其他终端改过其中的联系人时什么也不写入，提示后重新查找。
+"""
+import threading
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+import dedupe
+from addressbook import ConflictError
+
+CHECKED = "☑"
+UNCHECKED = "☐"
+KEEP = "★"
+POLL_MS = 100
+# 分数达到这个值的重复组默认勾选，低一些的要逐组确认
+AUTO_CHECK = 0.9
+
+
+class DedupeWindow(tk.Toplevel):
+    def __init__(self, master, book, colors, font, on_close=None):
+        super().__init__(master)
+        self.title(">_ 通讯录查重")
+        self.configure(bg=colors['panel'])
+        self.geometry("900x560")
+        self.book = book
+        self.on_close = on_close
+        # 行号 -> DuplicateGroup / 联系人
+        self.groups = {}
+        self.members = {}
+        self.junk = {}
+        self.checked = set()
+        self.result = None
+        self.poll_id = None
+        self.merging = False
+
+        self.status = tk.StringVar()
+        tk.Label(self, textvariable=self.status, font=font, anchor=tk.W,
+                 bg=colors['panel'], fg=colors['primary']).pack(fill=tk.X, padx=10, pady=(10, 0))
+
+        frame = tk.Frame(self, bg=colors['panel'])
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree = ttk.Treeview(frame, columns=('phone', 'email', 'address', 'match'),
+                                 show='tree headings', style="Treeview")
+        for column, title, width in (('#0', '姓名', 200), ('phone', '电话', 150), ('email', '邮箱', 200),
+                                     ('address', '地址', 220), ('match', '相似度', 80)):
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=width, stretch=column != 'match')
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind('<Double-1>', lambda e: self.toggle(self.tree.identify_row(e.y)))
+        self.tree.bind('<space>', lambda e: self.toggle(self.tree.focus()))
+
+        buttons = tk.Frame(self, bg=colors['panel'])
+        buttons.pack(fill=tk.X, padx=10, pady=(0, 10))
+        style = {'font': font, 'bg': colors['bg'], 'fg': colors['primary'],
+                 'activebackground': colors['secondary'], 'activeforeground': 'white',
+                 'bd': 0, 'padx': 12, 'pady': 4, 'highlightthickness': 0}
+        for text, command in (("[↻] 重新查找", self.scan), ("[☑] 全选", lambda: self.set_all(True)),
+                              ("[☐] 全不选", lambda: self.set_all(False)), ("[★] 设为保留", self.set_keep)):
+            tk.Button(buttons, text=text, command=command, **style).pack(side=tk.LEFT, padx=(0, 5))
+        self.merge_button = tk.Button(buttons, text="[≡] 合并选中", command=self.merge, **style)
+        self.merge_button.pack(side=tk.RIGHT)
+
+        self.unsubscribe = book.changes.subscribe(self.on_change)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.scan()
+
+    # ---- 查找 ----
+
+    def scan(self):
+        """在后台线程里查找；界面线程只取联系人的快照"""
+        if self.poll_id is not None:
+            return
+        contacts = list(self.book.contacts)
+        rows = [(c.name, c.phone, c.email, c.address) for c in contacts]
+        self.status.set(f"正在查找 {len(rows)} 条联系人中的重复……")
+        self.merge_button.configure(state=tk.DISABLED)
+        self.result = None
+
+        def work():
+            # 出错时把异常当作结果交给界面线程，否则 poll 会一直等下去
+            try:
+                self.result = (contacts, dedupe.find_duplicates(rows), dedupe.find_junk(rows))
+            except Exception as e:
+                self.result = e
+
+        threading.Thread(target=work, daemon=True).start()
+        self.poll_id = self.after(POLL_MS, self.poll)
+
+    def poll(self):
+        if self.result is None:
+            self.poll_id = self.after(POLL_MS, self.poll)
+            return
+        self.poll_id = None
+        if isinstance(self.result, Exception):
+            self.status.set(f"查找失败: {self.result}")
+            return
+        contacts, found, junk = self.result
+        self.show([dedupe.DuplicateGroup([contacts[i] for i in members], score) for members, score in found],
+                  [contacts[i] for i in junk])
+        self.merge_button.configure(state=tk.NORMAL)
+
+    def show(self, groups, junk):
+        self.tree.delete(*self.tree.get_children())
+        self.groups, self.members, self.junk = {}, {}, {}
+        # 高分的重复组默认勾选，其余重复组和疑似无效的要逐条确认
+        self.checked = set()
+        for group in groups:
+            iid = self.tree.insert('', 'end', open=True)
+            self.groups[iid] = group
+            if group.score >= AUTO_CHECK:
+                self.checked.add(iid)
+            for contact in group.members:
+                self.members[self.tree.insert(iid, 'end')] = (group, contact)
+            self.draw_group(iid)
+        if junk:
+            parent = self.tree.insert('', 'end', text=f"疑似无效（{len(junk)} 条）", open=True)
+            for contact in junk:
+                iid = self.tree.insert(parent, 'end', values=(contact.phone, contact.email, contact.address, ''))
+                self.junk[iid] = contact
+                self.draw_junk(iid)
+        self.status.set(f"找到 {len(groups)} 组重复、{len(junk)} 条疑似无效 | 双击或空格勾选，合并保留 {KEEP} 标记的一条")
+
+    def draw_group(self, iid):
+        group = self.groups[iid]
+        merged = group.merged()
+        mark = CHECKED if iid in self.checked else UNCHECKED
+        self.tree.item(iid, text=f"{mark} {merged['name']}",
+                       values=(merged['phone'], merged['email'], merged['address'], f"{group.score:.2f}"))
+        for child in self.tree.get_children(iid):
+            contact = self.members[child][1]
+            mark = KEEP if contact is group.keep else "  "
+            self.tree.item(child, text=f"{mark} {contact.name}",
+                           values=(contact.phone, contact.email, contact.address, ''))
+
+    def draw_junk(self, iid):
+        mark = CHECKED if iid in self.checked else UNCHECKED
+        self.tree.item(iid, text=f"{mark} {self.junk[iid].name}")
+
+    # ---- 勾选 ----
+
+    def toggle(self, iid):
+        if iid in self.members:
+            iid = self.tree.parent(iid)
+        if iid not in self.groups and iid not in self.junk:
+            return
+        self.checked ^= {iid}
+        self.draw_group(iid) if iid in self.groups else self.draw_junk(iid)
+
+    def set_all(self, checked):
+        self.checked = set(self.groups) | set(self.junk) if checked else set()
+        for iid in self.groups:
+            self.draw_group(iid)
+        for iid in self.junk:
+            self.draw_junk(iid)
+
+    def set_keep(self):
+        """把选中的成员设为合并后保留的一条"""
+        iid = self.tree.focus()
+        if iid not in self.members:
+            messagebox.showinfo("提示", "请先选中重复组里的一条联系人", parent=self)
+            return
+        group, contact = self.members[iid]
+        group.keep = contact
+        self.draw_group(self.tree.parent(iid))
+
+    # ---- 合并 ----
+
+    def merge(self):
+        groups = [group for iid, group in self.groups.items() if iid in self.checked]
+        junk = [contact for iid, contact in self.junk.items() if iid in self.checked]
+        updates, deletions = dedupe.merge_plan(groups, junk)
+        if not updates and not deletions:
+            messagebox.showinfo("提示", "没有勾选任何一项", parent=self)
+            return
+        if not messagebox.askyesno("确认合并", f"将修改 {len(updates)} 条、删除 {len(deletions)} 条联系人，是否继续？",
+                                   parent=self):
+            return
+        self.merging = True
+        try:
+            self.book.apply_batch(updates, deletions)
+        except ConflictError as e:
+            messagebox.showerror("冲突", str(e), parent=self)
+        finally:
+            self.merging = False
+        self.scan()
+
+    def on_change(self, event):
+        if not self.merging and self.poll_id is None and (self.groups or self.junk):
+            self.status.set("通讯录已有变化，建议重新查找")
+
+    def close(self):
+        self.unsubscribe()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+        self.destroy()
+        if self.on_close:
+            self.on_close()
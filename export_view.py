@@ -0,0 +1,76 @@
+"""通讯录导出的进度窗口：在后台线程里执行 contact_export.export，用 after 轮询进度
+
+后台线程只更新 done / result 两个属性，所有界面操作都在界面线程里做。
+关闭窗口或点取消时设置 cancel，导出在下一段写出前停止，目标文件保持原样。
+"""
+import os
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+import contact_export
+
+POLL_MS = 100
+
+
+class ExportWindow(tk.Toplevel):
+    def __init__(self, master, records, total, path, colors, font, on_close=None):
+        super().__init__(master)
+        self.title(">_ 导出通讯录")
+        self.configure(bg=colors['panel'])
+        self.resizable(False, False)
+        self.total = total
+        self.on_close = on_close
+        self.done = 0
+        self.result = None
+        self.cancel = threading.Event()
+
+        label = {'font': font, 'bg': colors['panel'], 'fg': colors['primary'], 'anchor': tk.W}
+        tk.Label(self, text=f"导出到 {os.path.basename(path)}", **label).pack(fill=tk.X, padx=15, pady=(15, 5))
+        self.progress = ttk.Progressbar(self, length=360, maximum=max(total, 1))
+        self.progress.pack(padx=15)
+        self.status = tk.StringVar(value=f"0 / {total}")
+        tk.Label(self, textvariable=self.status, **label).pack(fill=tk.X, padx=15, pady=5)
+        self.button = tk.Button(self, text="[×] 取消", command=self.close, font=font, bg=colors['bg'],
+                                fg=colors['primary'], activebackground=colors['secondary'],
+                                activeforeground='white', bd=0, padx=12, pady=4)
+        self.button.pack(pady=(0, 15))
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        def work():
+            try:
+                count = contact_export.export(records, path, progress=self.set_done, cancel=self.cancel)
+                self.result = (True, f"已导出 {count} 条联系人")
+            except contact_export.ExportCancelled:
+                self.result = (False, "已取消")
+            except Exception as e:
+                # 任何异常都要交回结果，否则 poll 会一直等下去
+                self.result = (False, f"导出失败: {e}")
+
+        threading.Thread(target=work, daemon=True).start()
+        self.poll_id = self.after(POLL_MS, self.poll)
+
+    def set_done(self, done):
+        self.done = done
+
+    def poll(self):
+        self.progress['value'] = self.done
+        self.status.set(f"{self.done} / {self.total}")
+        if self.result is None:
+            self.poll_id = self.after(POLL_MS, self.poll)
+            return
+        self.poll_id = None
+        ok, message = self.result
+        if ok:
+            self.progress['value'] = self.progress['maximum']
+        self.status.set(message)
+        self.button.configure(text="[√] 关闭")
+
+    def close(self):
+        # 导出还在进行时先通知后台线程停下，写了一半的临时文件由它删掉
+        self.cancel.set()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+        self.destroy()
+        if self.on_close:
+            self.on_close()
@@ -0,0 +1,67 @@
+"""跨进程的建议性文件锁（不依赖 tkinter）
+
+POSIX 上用 fcntl.flock，Windows 上用 msvcrt.locking。锁加在单独的
+`<数据文件>.lock` 上，数据文件本身总是先写临时文件再整体替换。
+
+    with FileLock('contacts.json.lock'):
+        ...  # 读取、合并、写回
+"""
+import os
+import time
+
+LOCK_SUFFIX = '.lock'
+# Windows 上 msvcrt.locking 每次最多重试 10 秒，这里再多等几轮
+WINDOWS_RETRIES = 6
+
+
+def lock_path(data_path):
+    return data_path + LOCK_SUFFIX
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self):
+        self.file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+
+            self.file.seek(0)
+            for attempt in range(WINDOWS_RETRIES):
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    return
+                except OSError:
+                    if attempt == WINDOWS_RETRIES - 1:
+                        self.file.close()
+                        self.file = None
+                        raise
+                    time.sleep(0.1)
+        else:
+            import fcntl
+
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def release(self):
+        if self.file is None:
+            return
+        if os.name == 'nt':
+            import msvcrt
+
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
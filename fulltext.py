@@ -0,0 +1,196 @@
+"""多字段全文检索：倒排索引（不依赖 tkinter）
+
+通讯录联系人和特工档案共用这一个引擎。分词规则：
+- 中日韩文字按单字和相邻两字（bigram）建索引，查询时两个字以上的词只查 bigram；
+- 其余文字按连续的字母数字切成小写单词。
+查询由空格分隔的若干条件组成，条件之间是"与"的关系；`字段:值` 只在该字段里找，
+例如 `location:莫斯科 status:活跃 核武`。bigram 求交后再用原文核对一遍，
+避免 "莫斯…斯科" 这种不相邻的误命中。
+
+索引可以保存到数据文件旁边的 `<数据文件>.idx`，里面记录了数据文件的大小和
+修改时间，数据文件变化后旧索引自动作废。
+"""
+import json
+import os
+import re
+
+INDEX_SUFFIX = '.idx'
+INDEX_FORMAT = 'fulltext-index'
+# 2：快照通讯录的文档编号改为快照表里的记录位置，旧索引作废
+INDEX_VERSION = 2
+CJK = '\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN_PATTERN = re.compile(f'([{CJK}]+)|([^\\W_{CJK}]+)')
+
+
+def index_tokens(text):
+    """建索引用的词：中文单字加 bigram，其他按单词"""
+    tokens = set()
+    for cjk, word in TOKEN_PATTERN.findall(str(text).lower()):
+        if word:
+            tokens.add(word)
+        else:
+            tokens.update(cjk)
+            tokens.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def query_tokens(text):
+    """查询用的词：两个字以上的中文只用 bigram"""
+    tokens = set()
+    for cjk, word in TOKEN_PATTERN.findall(text.lower()):
+        if word:
+            tokens.add(word)
+        elif len(cjk) == 1:
+            tokens.add(cjk)
+        else:
+            tokens.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def index_path(data_path):
+    return data_path + INDEX_SUFFIX
+
+
+def file_signature(path):
+    """数据文件的 (大小, 修改时间)，用来判断索引是否过期"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_query(query, fields):
+    """拆成 [(字段或 None, 文本)]，不在 fields 里的字段名按普通文本处理；不需要建好索引"""
+    terms = []
+    for part in query.split():
+        field, sep, value = part.partition(':')
+        if sep and field in fields and value:
+            terms.append((field, value))
+        else:
+            terms.append((None, part))
+    return terms
+
+
+class FullTextIndex:
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        # 字段 -> 词 -> {文档编号}
+        self.postings = {field: {} for field in self.fields}
+
+    def parse_query(self, query):
+        return parse_query(query, self.postings)
+
+    def add(self, doc_id, record):
+        """record 是 {字段: 文本}，缺少的字段跳过"""
+        for field in self.fields:
+            if field in record:
+                postings = self.postings[field]
+                for token in index_tokens(record[field]):
+                    postings.setdefault(token, set()).add(doc_id)
+
+    def remove(self, doc_id, record):
+        """record 必须是建索引时的旧内容，按它找到要删的词"""
+        for field in self.fields:
+            if field in record:
+                postings = self.postings[field]
+                for token in index_tokens(record[field]):
+                    ids = postings.get(token)
+                    if ids is not None:
+                        ids.discard(doc_id)
+                        if not ids:
+                            del postings[token]
+
+    def update(self, doc_id, old_record, new_record):
+        """只改动新旧内容不同的字段"""
+        for field in self.fields:
+            old = old_record.get(field)
+            new = new_record.get(field)
+            if old == new:
+                continue
+            postings = self.postings[field]
+            old_tokens = index_tokens(old) if old is not None else set()
+            new_tokens = index_tokens(new) if new is not None else set()
+            for token in old_tokens - new_tokens:
+                ids = postings.get(token)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del postings[token]
+            for token in new_tokens - old_tokens:
+                postings.setdefault(token, set()).add(doc_id)
+
+    def clear(self):
+        self.postings = {field: {} for field in self.fields}
+
+    def search(self, query, lookup=None):
+        """返回满足全部条件的文档编号集合
+
+        lookup(doc_id) 返回文档的 {字段: 文本}，给出时用原文核对命中结果。
+        """
+        candidates = []
+        for field, text in self.parse_query(query):
+            tokens = query_tokens(text)
+            if not tokens:
+                continue
+            fields = (field,) if field else self.fields
+            matched = set()
+            for name in fields:
+                postings = self.postings[name]
+                sets = [postings.get(token) for token in tokens]
+                if all(sets):
+                    sets.sort(key=len)
+                    matched |= sets[0].intersection(*sets[1:])
+            candidates.append((matched, fields, text.lower()))
+        if not candidates:
+            return set()
+        # 从命中最少的条件开始求交，再只对最终结果核对原文
+        candidates.sort(key=lambda item: len(item[0]))
+        result = set(candidates[0][0])
+        for matched, _, _ in candidates[1:]:
+            if not result:
+                break
+            result &= matched
+        if lookup is not None:
+            result = {doc_id for doc_id in result
+                      if all(self._contains(lookup(doc_id), fields, needle)
+                             for _, fields, needle in candidates)}
+        return result
+
+    @staticmethod
+    def _contains(record, fields, needle):
+        return any(needle in str(record.get(field, '')).lower() for field in fields)
+
+    def save(self, path, signature, doc_ids=None):
+        """写入索引文件；doc_ids 给出时按 {旧编号: 新编号} 重新编号"""
+        postings = {}
+        for field, tokens in self.postings.items():
+            saved = postings[field] = {}
+            for token, ids in tokens.items():
+                if doc_ids is not None:
+                    ids = [doc_ids[i] for i in ids]
+                # 邮箱、号码这类词大多只属于一条记录，直接存编号，读写都快不少
+                saved[token] = next(iter(ids)) if len(ids) == 1 else list(ids)
+        data = {
+            'format': INDEX_FORMAT,
+            'version': INDEX_VERSION,
+            'signature': signature,
+            'fields': list(self.fields),
+            'postings': postings,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def load(self, path, signature):
+        """读取索引文件；文件不存在、格式不对或已过期时返回 False"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (data.get('format') != INDEX_FORMAT or data.get('version') != INDEX_VERSION
+                or data.get('signature') != signature or data.get('fields') != list(self.fields)):
+            return False
+        self.postings = {field: {token: set(ids) if isinstance(ids, list) else {ids}
+                                 for token, ids in tokens.items()}
+                         for field, tokens in data['postings'].items()}
+        return True
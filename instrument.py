@@ -0,0 +1,201 @@
+"""事件循环耗时统计（可选开启）
+
+加 --instrument 参数或设置环境变量 TXL_INSTRUMENT=1 启动时生效：
+
+  * 统计每个 after 回调、事件绑定和按钮命令的调用次数、耗时和调度延迟
+  * 用心跳定时器测量事件循环延迟（卡顿）
+  * Ctrl+Shift+D 打开隐藏的诊断面板
+  * 定期把统计结果写入 diagnostics.json
+
+未开启时不做任何修改，没有额外开销。
+"""
+import functools
+import json
+import os
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+FLAG = '--instrument'
+ENV = 'TXL_INSTRUMENT'
+DUMP_FILE = 'diagnostics.json'
+DUMP_INTERVAL_MS = 10000
+HEARTBEAT_MS = 100
+PANEL_REFRESH_MS = 1000
+
+
+def enabled():
+    return FLAG in sys.argv or os.environ.get(ENV, '') not in ('', '0')
+
+
+def handler_name(func):
+    return getattr(func, '__qualname__', None) or repr(func)
+
+
+class HandlerStats:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.max_lag = 0.0
+
+    def add(self, elapsed, lag=0.0):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.max_lag = max(self.max_lag, lag)
+
+
+class Instrumentation:
+    def __init__(self, root, dump_file=DUMP_FILE):
+        self.root = root
+        self.dump_file = dump_file
+        self.started = time.time()
+        self.handlers = {}
+        self.loop_lag = HandlerStats()
+        self.panel = None
+        self.panel_tree = None
+        self.panel_label = None
+
+        # 保存未修改的方法，诊断功能自身的定时器不计入统计
+        self._after = tk.Misc.after
+        self._bind = tk.Misc._bind
+        self._register = tk.Misc._register
+
+    def record(self, name, elapsed, lag=0.0):
+        stats = self.handlers.get(name)
+        if stats is None:
+            stats = self.handlers[name] = HandlerStats()
+        stats.add(elapsed, lag)
+
+    def wrap(self, name, func, due=None):
+        """包装回调，记录耗时；due 为 after 回调的预定执行时刻，用于计算延迟"""
+        @functools.wraps(func)
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                end = time.perf_counter()
+                self.record(name, end - start, max(0.0, start - due) if due else 0.0)
+        timed._instrumented = True
+        return timed
+
+    def install(self):
+        instr = self
+
+        def after(widget, ms, func=None, *args):
+            if func is None:
+                return instr._after(widget, ms)
+            delay = 0 if ms == 'idle' else int(ms) / 1000
+            func = instr.wrap('after ' + handler_name(func), func, time.perf_counter() + delay)
+            return instr._after(widget, ms, func, *args)
+
+        def _bind(widget, what, sequence, func, add, needcleanup=1):
+            if callable(func) and not getattr(func, '_instrumented', False):
+                func = instr.wrap(f'bind {sequence} {handler_name(func)}', func)
+            return instr._bind(widget, what, sequence, func, add, needcleanup)
+
+        def _register(widget, func, subst=None, needcleanup=1):
+            # after 内部的 callit 和已包装过的事件处理函数不重复计时
+            internal = getattr(func, '__qualname__', '').endswith('after.<locals>.callit')
+            if not internal and not getattr(func, '_instrumented', False):
+                func = instr.wrap('command ' + handler_name(func), func)
+            return instr._register(widget, func, subst, needcleanup)
+
+        tk.Misc.after = after
+        tk.Misc._bind = _bind
+        tk.Misc._register = _register
+
+        def on_toggle(event):
+            self.toggle_panel()
+
+        on_toggle._instrumented = True
+        self._bind(self.root, ('bind', 'all'), '<Control-Shift-KeyPress-D>', on_toggle, None)
+        self._after(self.root, HEARTBEAT_MS, self.heartbeat, time.perf_counter())
+        self._after(self.root, DUMP_INTERVAL_MS, self.periodic_dump)
+
+    def heartbeat(self, scheduled):
+        now = time.perf_counter()
+        self.loop_lag.add(max(0.0, now - scheduled - HEARTBEAT_MS / 1000))
+        self._after(self.root, HEARTBEAT_MS, self.heartbeat, now)
+
+    def snapshot(self):
+        handlers = sorted(self.handlers.items(), key=lambda item: item[1].total, reverse=True)
+        lag = self.loop_lag
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "loop_lag_ms": {
+                "samples": lag.calls,
+                "avg": round(lag.total / lag.calls * 1000, 3) if lag.calls else 0,
+                "max": round(lag.max * 1000, 3),
+            },
+            "handlers": [{
+                "name": name,
+                "calls": stats.calls,
+                "total_ms": round(stats.total * 1000, 3),
+                "avg_ms": round(stats.total / stats.calls * 1000, 3),
+                "max_ms": round(stats.max * 1000, 3),
+                "max_lag_ms": round(stats.max_lag * 1000, 3),
+            } for name, stats in handlers],
+        }
+
+    def dump(self):
+        tmp_path = self.dump_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.dump_file)
+
+    def periodic_dump(self):
+        try:
+            self.dump()
+        except OSError:
+            pass  # 写不了诊断文件不影响程序运行
+        self._after(self.root, DUMP_INTERVAL_MS, self.periodic_dump)
+
+    def toggle_panel(self):
+        """显示/关闭诊断面板"""
+        if self.panel is not None:
+            self.panel.destroy()
+            self.panel = None
+            return
+
+        self.panel = tk.Toplevel(self.root)
+        self.panel.title("诊断面板")
+        self.panel.geometry("900x400")
+        self.panel.protocol("WM_DELETE_WINDOW", self.toggle_panel)
+
+        self.panel_label = ttk.Label(self.panel, anchor=tk.W)
+        self.panel_label.pack(fill=tk.X, padx=5, pady=5)
+
+        columns = [("name", "处理函数", 420), ("calls", "次数", 70), ("total_ms", "总耗时ms", 90),
+                   ("avg_ms", "平均ms", 80), ("max_ms", "最大ms", 80), ("max_lag_ms", "最大延迟ms", 90)]
+        self.panel_tree = ttk.Treeview(self.panel, columns=[c[0] for c in columns], show='headings')
+        for col_id, text, width in columns:
+            self.panel_tree.heading(col_id, text=text)
+            self.panel_tree.column(col_id, width=width, anchor=tk.W if col_id == 'name' else tk.E)
+        self.panel_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.refresh_panel()
+
+    def refresh_panel(self):
+        if self.panel is None:
+            return
+        data = self.snapshot()
+        lag = data["loop_lag_ms"]
+        self.panel_label.config(text=f"运行 {data['uptime_s']:.0f} s | 事件循环延迟 平均 {lag['avg']:.1f} ms"
+                                     f" / 最大 {lag['max']:.1f} ms | Ctrl+Shift+D 关闭")
+        self.panel_tree.delete(*self.panel_tree.get_children())
+        for row in data["handlers"]:
+            self.panel_tree.insert('', 'end', values=(row["name"], row["calls"], row["total_ms"],
+                                                      row["avg_ms"], row["max_ms"], row["max_lag_ms"]))
+        self._after(self.root, PANEL_REFRESH_MS, self.refresh_panel)
+
+
+def install_if_enabled(root):
+    """开启了诊断时为 root 安装统计，返回 Instrumentation，否则返回 None"""
+    if not enabled():
+        return None
+    instr = Instrumentation(root)
+    instr.install()
+    return instr
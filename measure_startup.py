@@ -0,0 +1,49 @@
+"""测量通讯录从启动进程到主窗口绘制完成的耗时
+
+用法:
+    python measure_startup.py                                   # 源码版: python txl.py
+    python measure_startup.py dist/txl.exe dist/txl_fast/txl.exe -n 5
+
+每个命令运行 n 次，第一次视为冷启动单独列出。程序通过环境变量
+TXL_STARTUP_PROBE 得知要写入的探测文件，主窗口绘制完成后写入时间并自动退出。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def measure_once(command, timeout):
+    fd, probe = tempfile.mkstemp(suffix='.probe')
+    os.close(fd)
+    os.remove(probe)
+    env = dict(os.environ, TXL_STARTUP_PROBE=probe)
+    try:
+        start = time.time()
+        subprocess.run(command, env=env, timeout=timeout, check=True)
+        with open(probe) as f:
+            return float(f.read()) - start
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量通讯录启动耗时")
+    parser.add_argument('targets', nargs='*', help="可执行文件路径，默认测源码版 txl.py")
+    parser.add_argument('-n', '--runs', type=int, default=5, help="每个目标运行次数")
+    parser.add_argument('--timeout', type=float, default=60, help="单次运行超时（秒）")
+    args = parser.parse_args()
+
+    commands = [[t] for t in args.targets] or [[sys.executable, 'txl.py']]
+    print(f"{'目标':<40}{'冷启动':>10}{'最快':>10}{'中位数':>10}")
+    for command in commands:
+        times = [measure_once(command, args.timeout) for _ in range(args.runs)]
+        warm = sorted(times[1:]) or times
+        print(f"{' '.join(command):<40}{times[0]:>10.3f}{warm[0]:>10.3f}{warm[len(warm) // 2]:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""姓名排序搜索：拼音、首字母与容错匹配（不依赖 tkinter）
+
+每条记录在载入时预先算好三个键：小写姓名、全拼（如 "zhangwei"）和首字母（"zw"）。
+查询时按得分从高到低分层匹配，前面的层凑够 k 条就不再往下算：
+1. 完全相等；
+2. 前缀 —— 三个键各有一个有序数组，用 bisect 取区间；
+3. 包含 —— 逐条扫描预先算好的键；
+4. 容错 —— 对称删除索引（symmetric delete），找编辑距离为 1 的姓名或全拼；
+   删除变体第一次容错查询时才建立（十万人约 0.7 秒）。
+同一层内用 heapq 取前 k 条，短名字和先录入的排在前面。
+
+全拼依赖可选的 pypinyin；没有安装时按 GB2312 一级汉字的拼音顺序推算首字母，
+此时只有首字母键，没有全拼键。
+"""
+import bisect
+import heapq
+
+MAX_EDITS = 1
+# 太短的查询做容错匹配只会得到一堆噪音
+MIN_FUZZY_LENGTH = 3
+DEFAULT_LIMIT = 20
+
+SCORE_EXACT = 100
+SCORE_PINYIN_EXACT = 95
+SCORE_PREFIX = {'name': 90, 'pinyin': 85, 'initials': 80}
+SCORE_NAME_CONTAINS = 70
+SCORE_PINYIN_CONTAINS = 60
+SCORE_FUZZY = 40
+
+# GB2312 一级汉字按拼音排序，每个声母的第一个字的区位码
+GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+GB2312_LEVEL1_END = 0xD7F9
+GB2312_CODES = [code for code, _ in GB2312_INITIALS]
+
+_pinyin_func = None
+_char_cache = {}
+
+
+def _load_pinyin():
+    """按需导入 pypinyin，未安装时返回 False"""
+    global _pinyin_func
+    if _pinyin_func is None:
+        try:
+            from pypinyin import lazy_pinyin
+            _pinyin_func = lazy_pinyin
+        except ImportError:
+            _pinyin_func = False
+    return _pinyin_func
+
+
+def gb2312_initial(char):
+    """用 GB2312 区位码推算一级汉字的声母，推算不了返回空串"""
+    try:
+        raw = char.encode('gb2312')
+    except UnicodeEncodeError:
+        return ''
+    if len(raw) != 2:
+        return ''
+    code = raw[0] << 8 | raw[1]
+    if code < GB2312_CODES[0] or code >= GB2312_LEVEL1_END:
+        return ''
+    return GB2312_INITIALS[bisect.bisect_right(GB2312_CODES, code) - 1][1]
+
+
+def char_keys(char):
+    """返回单个字符的 (拼音, 首字母)，结果按字符缓存"""
+    keys = _char_cache.get(char)
+    if keys is None:
+        if char.isascii():
+            keys = (char.lower(), char.lower()) if char.isalnum() else ('', '')
+        else:
+            lazy_pinyin = _load_pinyin()
+            if lazy_pinyin:
+                syllable = lazy_pinyin(char)[0].lower()
+                # pypinyin 对不认识的字符原样返回
+                keys = (syllable, syllable[0]) if syllable != char else ('', '')
+            else:
+                keys = ('', gb2312_initial(char))
+        _char_cache[char] = keys
+    return keys
+
+
+def name_keys(name):
+    """计算 (小写姓名, 全拼, 首字母)；没有 pypinyin 时全拼为空串"""
+    pinyin = []
+    initials = []
+    for char in name:
+        syllable, initial = char_keys(char)
+        pinyin.append(syllable)
+        initials.append(initial)
+    return name.lower(), ''.join(pinyin) if _load_pinyin() else '', ''.join(initials)
+
+
+def normalize_query(query):
+    return ''.join(query.lower().split())
+
+
+def deletes(word, edits=MAX_EDITS):
+    """word 删去至多 edits 个字符得到的全部变体（含 word 本身）"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a, b, limit=MAX_EDITS):
+    """限定上界的编辑距离（相邻换位算一次），超过 limit 时返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class NameIndex:
+    KEYS = ('name', 'pinyin', 'initials')
+
+    def __init__(self):
+        self.keys = {}
+        self.records = {}
+        self.next_serial = 0
+        # 每种键一个有序数组 [(键, 序号)]
+        self.sorted = {field: [] for field in self.KEYS}
+        # 容错用的键 -> {序号}；同名的人很多，删除变体只对不同的键计算一次
+        self.owners = {}
+        # 删除变体 -> {键}，第一次容错查询时才建立
+        self.variants = None
+        # (取记录列表的函数, 取姓名的函数)，非空表示还没有预计算
+        self.pending = None
+
+    def build(self, records, name_of):
+        """载入时批量预计算所有键"""
+        self.__init__()
+        for record in records:
+            self._register(record, name_of(record))
+        for entries in self.sorted.values():
+            entries.sort()
+
+    def reset(self, get_records, name_of):
+        """推迟到第一次查询时才预计算，用于百万级的快照通讯录"""
+        self.__init__()
+        self.pending = (get_records, name_of)
+
+    def ensure_built(self):
+        if self.pending:
+            get_records, name_of = self.pending
+            self.build(get_records(), name_of)
+
+    def add(self, record, name):
+        if self.pending:
+            return
+        self._register(record, name, keep_sorted=True)
+
+    def remove(self, record):
+        if self.pending:
+            return
+        entry = self.keys.pop(record, None)
+        if entry is None:
+            return
+        serial, keys = entry
+        del self.records[serial]
+        for field, key in zip(self.KEYS, keys):
+            if key:
+                entries = self.sorted[field]
+                pos = bisect.bisect_left(entries, (key, serial))
+                if pos < len(entries) and entries[pos] == (key, serial):
+                    del entries[pos]
+        for key in self._fuzzy_keys(keys):
+            serials = self.owners[key]
+            serials.discard(serial)
+            if not serials:
+                del self.owners[key]
+                if self.variants is not None:
+                    for variant in deletes(key):
+                        self.variants[variant].discard(key)
+
+    def update(self, record, name):
+        """姓名变化时重新计算键，保留原来的序号"""
+        if self.pending:
+            return
+        entry = self.keys.get(record)
+        if entry is None:
+            self.add(record, name)
+        elif name_keys(name) != entry[1]:
+            serial = entry[0]
+            self.remove(record)
+            self._register(record, name, keep_sorted=True, serial=serial)
+
+    def _register(self, record, name, keep_sorted=False, serial=None):
+        if serial is None:
+            serial = self.next_serial
+            self.next_serial += 1
+        keys = name_keys(name)
+        self.keys[record] = (serial, keys)
+        self.records[serial] = record
+        for field, key in zip(self.KEYS, keys):
+            if not key:
+                continue
+            if keep_sorted:
+                bisect.insort(self.sorted[field], (key, serial))
+            else:
+                self.sorted[field].append((key, serial))
+        for key in self._fuzzy_keys(keys):
+            serials = self.owners.get(key)
+            if serials is None:
+                serials = self.owners[key] = set()
+                if self.variants is not None:
+                    self._add_variants(key)
+            serials.add(serial)
+
+    def _add_variants(self, key):
+        for variant in deletes(key):
+            self.variants.setdefault(variant, set()).add(key)
+
+    def ensure_variants(self):
+        if self.variants is None:
+            self.variants = {}
+            for key in self.owners:
+                self._add_variants(key)
+
+    @staticmethod
+    def _fuzzy_keys(keys):
+        name, pinyin, _ = keys
+        return {key for key in (name, pinyin) if len(key) >= MIN_FUZZY_LENGTH - MAX_EDITS}
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """返回按相关度排序的前 limit 条记录"""
+        query = normalize_query(query)
+        if not query:
+            return []
+        self.ensure_built()
+        scored = {}
+        tiers = (self._exact, self._prefix, self._contains, self._fuzzy)
+        for tier in tiers:
+            for serial, score in tier(query):
+                if serial not in scored:
+                    scored[serial] = score
+            # 后面各层的得分都更低，已经凑够就不必再算
+            if len(scored) >= limit:
+                break
+        best = heapq.nsmallest(limit, scored.items(), key=self._rank_key)
+        return [self.records[serial] for serial, _ in best]
+
+    def _rank_key(self, item):
+        serial, score = item
+        record_keys = self.keys[self.records[serial]][1]
+        return -score, len(record_keys[0]), serial
+
+    def _range(self, field, low, high):
+        entries = self.sorted[field]
+        start = bisect.bisect_left(entries, (low,))
+        end = bisect.bisect_left(entries, (high,), start)
+        return entries[start:end]
+
+    def _exact(self, query):
+        for field, score in (('name', SCORE_EXACT), ('pinyin', SCORE_PINYIN_EXACT),
+                             ('initials', SCORE_PINYIN_EXACT)):
+            for _, serial in self._range(field, query, query + '\0'):
+                yield serial, score
+
+    def _prefix(self, query):
+        for field in self.KEYS:
+            for _, serial in self._range(field, query, query + '\U0010ffff'):
+                yield serial, SCORE_PREFIX[field]
+
+    def _contains(self, query):
+        for serial, (name, pinyin, _) in self.keys.values():
+            if query in name:
+                yield serial, SCORE_NAME_CONTAINS
+            elif pinyin and query in pinyin:
+                yield serial, SCORE_PINYIN_CONTAINS
+
+    def _fuzzy(self, query):
+        if len(query) < MIN_FUZZY_LENGTH:
+            return
+        self.ensure_variants()
+        candidates = set()
+        for variant in deletes(query):
+            candidates |= self.variants.get(variant, set())
+        for key in candidates:
+            distance = edit_distance(query, key)
+            if distance <= MAX_EDITS:
+                for serial in self.owners[key]:
+                    yield serial, SCORE_FUZZY - distance
@@ -0,0 +1,14 @@
+"""按需导入 NumPy：统计分析、查重等模块共用，未安装时各自退回纯 Python 的实现"""
+_numpy = None
+
+
+def load_numpy():
+    """按需导入 NumPy，未安装时返回 False"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
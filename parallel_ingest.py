@@ -0,0 +1,278 @@
+"""JSON Lines / CSV 大文件的多进程导入（不依赖 tkinter）
+
+文件按字节切成分片，每片的起止都对齐到换行处；工作进程各读一片，解析并校验后
+返回 (去重键, 记录)。主进程按分片顺序收结果，放进一个字典完成去重：同一个键后出现的
+覆盖先出现的，位置仍是第一次出现的位置，结果与单进程逐行导入相同。
+- 分片大小固定（SHARD_BYTES），与文件大小和进程数无关，工作进程的内存只与分片大小有关；
+  同时在处理中的分片最多 2 × 进程数，结果不会在队列里堆积；
+- CSV 的字段里可以有换行（特工的任务记录就有），分片边界只放在引号个数为偶数的换行处，
+  即不在引号里的换行；为此主进程要顺序读一遍文件数引号，这比解析快得多；
+- 有记录不合法时抛出 IngestError，列出前几条错误的位置，调用方什么也不写入。
+
+去重键：联系人有编号的用编号，没有的用 (姓名, 规范化后的号码)；特工用特工编号。
+
+    records = parallel_ingest.ingest("dump.jsonl", parallel_ingest.CONTACTS, jobs=8)
+"""
+import gc
+import itertools
+import json
+import os
+
+import agent_schema
+from addressbook import FIELDS
+from phone_index import normalize_phone
+
+CONTACTS = "contacts"
+AGENTS = "agents"
+SHARD_BYTES = 8 * 1024 * 1024
+# 从标准输入导入时每批解析的行数
+STREAM_LINES = 50000
+# 异常里最多列出的错误条数
+MAX_ERRORS = 10
+
+
+class IngestError(ValueError):
+    def __init__(self, errors, total):
+        lines = "\n".join(f"  {where}: {message}" for where, message in errors)
+        more = f"\n  ……共 {total} 条" if total > len(errors) else ""
+        super().__init__(f"{total} 条记录不合法:\n{lines}{more}")
+        self.errors = errors
+        self.total = total
+
+
+def input_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def contact_record(record):
+    """{id, name, phone, email, address, version}，缺少的文字字段为 ''"""
+    result = {field: str(record.get(field) or "") for field in FIELDS}
+    result["id"] = record.get("id") or None
+    result["version"] = int(record.get("version") or 0)
+    return result
+
+
+def contact_key(record):
+    return record["id"] or ("", record["name"].strip(), normalize_phone(record["phone"]))
+
+
+def validate_contact(raw):
+    """返回 (去重键, 联系人记录)；和界面一样要求姓名和电话"""
+    record = contact_record(raw)
+    if not record["name"].strip() or not record["phone"].strip():
+        raise ValueError("姓名和电话是必填字段")
+    return contact_key(record), record
+
+
+def validate_agent(raw):
+    """返回 (特工编号, (特工编号, Agent))；字段值不合法时抛出 SchemaError"""
+    raw = dict(raw)
+    agent_id = str(raw.pop("agent_id", "") or "").strip()
+    if not agent_id:
+        raise ValueError("缺少特工编号 agent_id")
+    agent = agent_schema.coerce(raw)
+    if not agent.codename:
+        raise ValueError("缺少行动代号 codename")
+    return agent_id, (agent_id, agent)
+
+
+VALIDATORS = {CONTACTS: validate_contact, AGENTS: validate_agent}
+
+
+def parse_lines(lines, fmt, kind, fieldnames=None):
+    """逐行解析校验，返回 (记录列表, 错误列表)；错误为 (行下标, 说明)，
+    空行跳过。CSV 的空字段视为没有填写。"""
+    validate = VALIDATORS[kind]
+    if fmt == "csv":
+        import csv
+
+        items = csv_rows(csv.reader(lines))
+    else:
+        items = enumerate(lines)
+    records, errors = [], []
+    for index, item in items:
+        if not item or (fmt != "csv" and not item.strip()):
+            continue
+        try:
+            raw = csv_record(item, fieldnames) if fmt == "csv" else json_record(item)
+            records.append(validate(raw))
+        except ValueError as e:
+            errors.append((index, str(e)))
+    return records, errors
+
+
+def csv_rows(rows):
+    """(记录第一行的下标, 记录)；line_num 是已经读过的行数，跨行的记录占好几行"""
+    start = 0
+    for row in rows:
+        yield start, row
+        start = rows.line_num
+
+
+def json_record(line):
+    raw = json.loads(line)
+    if not isinstance(raw, dict):
+        raise ValueError("不是 JSON 对象")
+    return raw
+
+
+def csv_record(row, fieldnames):
+    if len(row) != len(fieldnames):
+        raise ValueError(f"有 {len(row)} 个字段，表头有 {len(fieldnames)} 个")
+    return {name: value for name, value in zip(fieldnames, row) if value != ""}
+
+
+def read_header(path):
+    """CSV 表头 (字段名, 表头结束的字节位置)"""
+    import csv
+
+    with open(path, "rb") as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8-sig")]), []), len(line)
+
+
+def shard_ranges(path, start=0, shard_bytes=SHARD_BYTES, quoted=False):
+    """把 [start, 文件末尾) 切成约 shard_bytes 大的 (起, 止) 字节区间，边界都在换行之后；
+    quoted 为 True 时（CSV）边界前的引号个数还必须是偶数"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(start)
+            if quoted:
+                quotes = f.read(shard_bytes).count(b'"')
+                line = f.readline()
+                quotes += line.count(b'"')
+                while quotes % 2 and line:
+                    line = f.readline()
+                    quotes += line.count(b'"')
+            else:
+                f.seek(start + shard_bytes)
+                f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_shard(path, start, end, fmt, kind, fieldnames):
+    """工作进程里执行：读出一片并解析；错误位置换算成字节偏移"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b"\n")
+    try:
+        # 保留换行，CSV 引号里的换行才能原样还原
+        text = [line.decode("utf-8") + "\n" for line in lines]
+    except UnicodeDecodeError as e:
+        return [], [(f"字节 {start}", f"不是 UTF-8 文本: {e}")]
+    records, errors = parse_lines(text, fmt, kind, fieldnames)
+    if errors:
+        offsets = [start]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line) + 1)
+        errors = [(f"字节 {offsets[index]}", message) for index, message in errors]
+    return records, errors
+
+
+def shard_results(path, kind, fmt, jobs, shard_bytes):
+    """按分片顺序产出 (记录列表, 错误列表)；jobs 为 1 时在本进程里逐片解析"""
+    fieldnames, start = read_header(path) if fmt == "csv" else (None, 0)
+    ranges = shard_ranges(path, start, shard_bytes, quoted=fmt == "csv")
+    tasks = [(path, begin, end, fmt, kind, fieldnames) for begin, end in ranges]
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield parse_shard(*task)
+        return
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(parse_shard, *task))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def ingest(path, kind, fmt=None, jobs=None, shard_bytes=SHARD_BYTES):
+    """解析校验整个文件，返回去重后的 {去重键: 记录}（保持第一次出现的顺序）
+
+    jobs 缺省为 CPU 核数。联系人记录是字典，特工记录是 (特工编号, Agent)。
+    """
+    jobs = jobs or os.cpu_count() or 1
+    return collect(shard_results(path, kind, fmt or input_format(path), jobs, shard_bytes))
+
+
+def collect(results):
+    """合并各片结果并去重；有错误时看完全部分片再抛出 IngestError
+
+    新建的记录之间没有循环引用，合并期间暂停循环垃圾回收：否则每次回收都要扫描
+    越来越大的结果字典，几十万条时解析和反序列化的耗时会翻倍。
+    """
+    merged = {}
+    errors, total = [], 0
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for records, shard_errors in results:
+            merged.update(records)
+            total += len(shard_errors)
+            errors.extend(shard_errors[:MAX_ERRORS - len(errors)])
+    finally:
+        if enabled:
+            gc.enable()
+    if total:
+        raise IngestError(errors, total)
+    return merged
+
+
+def ingest_stream(lines, kind, fmt="jsonl"):
+    """从标准输入等不能分片的来源导入，结果与 ingest 相同；错误位置为行号
+
+    每 STREAM_LINES 行解析一批，内存里只保留去重后的结果字典，不缓存整个输入。
+    """
+    return collect(stream_results(lines, kind, fmt))
+
+
+def stream_results(lines, kind, fmt, batch_lines=STREAM_LINES):
+    lines = iter(lines)
+    fieldnames = None
+    first = 1
+    if fmt == "csv":
+        import csv
+
+        header = next(lines, None)
+        if header is None:
+            return
+        fieldnames = next(csv.reader([header]), [])
+        first = 2
+    while True:
+        batch = list(itertools.islice(lines, batch_lines))
+        if not batch:
+            return
+        if fmt == "csv":
+            # 和分片一样，批次只在引号之外的换行处结束，跨行的字段不会被切开
+            quotes = sum(line.count('"') for line in batch)
+            while quotes % 2:
+                line = next(lines, None)
+                if line is None:
+                    break
+                batch.append(line)
+                quotes += line.count('"')
+        records, errors = parse_lines(batch, fmt, kind, fieldnames)
+        yield records, [(f"第 {index + first} 行", message) for index, message in errors]
+        first += len(batch)
+
+
+def new_contacts(records, existing):
+    """去掉 existing（已有的联系人记录）里已经有的：编号相同，或姓名和号码相同"""
+    known = set()
+    for record in existing:
+        if record["id"]:
+            known.add(record["id"])
+        known.add(contact_key(dict(record, id=None)))
+    return [record for record in records if record["id"] not in known
+            and contact_key(dict(record, id=None)) not in known]
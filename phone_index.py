@@ -0,0 +1,154 @@
+"""电话号码规范化与号码索引（不依赖 tkinter）
+
+号码在入库时规范化为纯数字：去掉空格、横线、括号，以及 +86 / 0086 国家码，
+这样 "138 0013 8000"、"+86 138-0013-8000" 和 "13800138000" 视为同一个号码。
+
+索引是两个有序数组：
+- numbers: 全部 (号码, 序号)，前缀查询用 bisect 取区间；
+- suffixes: 每个号码的所有后缀 (后缀, 序号)，即后缀数组。包含查询就是
+  "以查询串开头的后缀" 的区间，后缀查询就是 "等于查询串的后缀" 的区间。
+三种查询都是 O(log n + 命中数)，不再逐条扫描。
+十万条号码建索引约需两秒，所以载入时只登记数据来源，第一次查询时才真正建立。
+"""
+import bisect
+import re
+
+NON_DIGITS = re.compile(r'\D')
+# 看起来像电话号码的查询：只含数字和常见分隔符
+PHONE_QUERY = re.compile(r'^[\d\s+\-().]+$')
+COUNTRY_CODE = '86'
+# 数字之后的字符，用作区间上界
+AFTER_DIGITS = ':'
+
+
+def normalize_phone(phone):
+    """把号码规范化为纯数字，去掉 +86 / 0086 国家码"""
+    phone = (phone or '').strip()
+    digits = NON_DIGITS.sub('', phone)
+    if phone.startswith('+') and digits.startswith(COUNTRY_CODE):
+        return digits[len(COUNTRY_CODE):]
+    if digits.startswith('00' + COUNTRY_CODE):
+        return digits[len(COUNTRY_CODE) + 2:]
+    # 不带 + 号的 86 开头 13 位号码，视为省略了 + 的手机号
+    if digits.startswith(COUNTRY_CODE) and len(digits) == 13 and digits[2] == '1':
+        return digits[len(COUNTRY_CODE):]
+    return digits
+
+
+def is_phone_query(keyword):
+    """判断搜索词是否应该按号码查询"""
+    return bool(keyword) and PHONE_QUERY.match(keyword) is not None \
+        and NON_DIGITS.sub('', keyword) != ''
+
+
+class PhoneIndex:
+    def __init__(self):
+        self.numbers = []
+        self.suffixes = []
+        self.serials = {}
+        self.records = {}
+        self.next_serial = 0
+        # (取记录列表的函数, 取号码的函数)，非空表示索引尚未建立
+        self.pending = None
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, record, phone):
+        """为记录登记号码；序号按登记顺序递增，查询结果按它排序"""
+        if self.pending:
+            # 延迟建立时会从数据来源读到这条记录
+            return
+        serial = self.next_serial
+        self.next_serial += 1
+        number = normalize_phone(phone)
+        self.serials[record] = (serial, number)
+        self.records[serial] = record
+        bisect.insort(self.numbers, (number, serial))
+        for start in range(len(number)):
+            bisect.insort(self.suffixes, (number[start:], serial))
+
+    def remove(self, record):
+        if self.pending:
+            return
+        entry = self.serials.pop(record, None)
+        if entry is None:
+            return
+        serial, number = entry
+        del self.records[serial]
+        self._discard(self.numbers, (number, serial))
+        for start in range(len(number)):
+            self._discard(self.suffixes, (number[start:], serial))
+
+    def update(self, record, phone):
+        """号码变化时重新登记，保留原来的序号以维持顺序"""
+        if self.pending:
+            return
+        entry = self.serials.get(record)
+        if entry is None:
+            self.add(record, phone)
+            return
+        serial, number = entry
+        new_number = normalize_phone(phone)
+        if new_number == number:
+            return
+        self.remove(record)
+        self.serials[record] = (serial, new_number)
+        self.records[serial] = record
+        bisect.insort(self.numbers, (new_number, serial))
+        for start in range(len(new_number)):
+            bisect.insort(self.suffixes, (new_number[start:], serial))
+
+    def reset(self, get_records, phone_of):
+        """丢弃现有索引，等第一次查询时再从 get_records() 批量建立"""
+        self.clear()
+        self.pending = (get_records, phone_of)
+
+    def ensure_built(self):
+        if self.pending:
+            get_records, phone_of = self.pending
+            self.build(get_records(), phone_of)
+
+    def build(self, records, phone_of):
+        """批量建立索引，比逐条 insort 快得多"""
+        self.clear()
+        for serial, record in enumerate(records):
+            number = normalize_phone(phone_of(record))
+            self.serials[record] = (serial, number)
+            self.records[serial] = record
+            self.numbers.append((number, serial))
+            self.suffixes.extend((number[start:], serial) for start in range(len(number)))
+        self.next_serial = len(self.records)
+        self.numbers.sort()
+        self.suffixes.sort()
+
+    def prefix(self, query):
+        return self._collect(self.numbers, query, query + AFTER_DIGITS)
+
+    def suffix(self, query):
+        # (query, 序号) 都落在 [(query,), (query + '\0',)) 之间
+        return self._collect(self.suffixes, query, query + '\0')
+
+    def contains(self, query):
+        return self._collect(self.suffixes, query, query + AFTER_DIGITS)
+
+    def search(self, query, mode='contains'):
+        """按 prefix / suffix / contains 查询，query 会先规范化"""
+        number = normalize_phone(query)
+        if not number:
+            return []
+        self.ensure_built()
+        return getattr(self, mode)(number)
+
+    def _collect(self, entries, low, high):
+        start = bisect.bisect_left(entries, (low,))
+        end = bisect.bisect_left(entries, (high,), start)
+        # 同一号码可能多次包含查询串，去重后按登记顺序返回
+        serials = sorted({serial for _, serial in entries[start:end]})
+        return [self.records[serial] for serial in serials]
+
+    @staticmethod
+    def _discard(entries, item):
+        pos = bisect.bisect_left(entries, item)
+        if pos < len(entries) and entries[pos] == item:
+            del entries[pos]
@@ -0,0 +1,90 @@
+"""联系人搜索结果缓存（不依赖 tkinter）
+
+按查询词缓存 search_contacts 的结果，最近最少使用的先淘汰。
+输入 "zhan" → "zhang" → "zhangs" 时，新查询包含旧查询，结果一定是旧结果的子集，
+只需在缓存的结果里再筛一遍，不必扫描整个通讯录；退格回到输入过的词时直接命中。
+
+缓存订阅通讯录的变化事件，逐条判断变化会不会影响某个查询的结果：
+修改前后都命中或都不命中的不受影响；原来命中、现在不命中（删除或改掉）的从结果中去掉；
+新增命中的只作废这一个查询，下次重新筛选时它会排到通讯录中的正确位置。
+"""
+from collections import OrderedDict
+
+from phone_index import is_phone_query, normalize_phone
+
+DEFAULT_SIZE = 64
+
+
+class ContactQuery:
+    """一个查询词的匹配规则，与 AddressBook.search_contacts 一致：
+    姓名包含查询词（不分大小写），号码类查询还匹配规范化后包含该串的号码"""
+
+    __slots__ = ('keyword', 'lower', 'digits')
+
+    def __init__(self, keyword):
+        self.keyword = keyword
+        self.lower = keyword.lower()
+        self.digits = normalize_phone(keyword) if is_phone_query(keyword) else None
+
+    def match(self, name, phone):
+        if self.lower in name.lower():
+            return True
+        return bool(self.digits) and self.digits in normalize_phone(phone)
+
+    def match_record(self, record):
+        return record is not None and self.match(record['name'], record['phone'])
+
+    def narrows(self, other):
+        """本查询的结果是否一定是 other 的结果的子集"""
+        if other.lower not in self.lower:
+            return False
+        if not self.digits:
+            return True
+        # 本查询还会按号码命中，旧查询的数字必须包含在新查询的数字里
+        return bool(other.digits) and other.digits in self.digits
+
+
+class SearchCache:
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        # 查询词 -> (ContactQuery, 结果列表)
+        self.entries = OrderedDict()
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, keyword):
+        entry = self.entries.get(keyword)
+        if entry is None:
+            return None
+        self.entries.move_to_end(keyword)
+        return entry[1]
+
+    def narrowest(self, query):
+        """缓存中能作为 query 候选集的最短结果，没有时返回 None"""
+        best = None
+        for cached, results in self.entries.values():
+            if query.narrows(cached) and (best is None or len(results) < len(best)):
+                best = results
+        return best
+
+    def put(self, query, results):
+        self.entries[query.keyword] = (query, results)
+        self.entries.move_to_end(query.keyword)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def on_change(self, event):
+        """按单条变化修补或作废受影响的查询"""
+        for keyword, (query, results) in list(self.entries.items()):
+            before = query.match_record(event.old)
+            after = query.match_record(event.new)
+            if before == after:
+                continue
+            if before:
+                try:
+                    results.remove(event.item)
+                    continue
+                except ValueError:
+                    pass
+            del self.entries[keyword]
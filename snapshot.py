@@ -0,0 +1,292 @@
+"""只读快照格式：定长偏移表 + 字符串堆，用 mmap 按需读取（不依赖 tkinter）
+
+文件布局（整数均为小端）：
+    文件头  magic(8) 版本(u32) 字段数 F(u32) 记录数 N(u64) 偏移表位置(u64) 字段名长度(u32)
+    字段名  UTF-8 编码的 JSON 数组
+    字符串堆 所有字段值的 UTF-8 字节依次相接
+    偏移表  N*F+1 个 u64 绝对偏移，第 r 条记录第 f 个字段是 [表[r*F+f], 表[r*F+f+1])
+打开时只读文件头，读第 r 条记录只碰偏移表里的 F+1 项和对应的字符串，
+所以五百万条的快照也能毫秒级打开，内存只随实际访问的记录增长。
+
+快照本身不修改。增删改追加到旁边的 `<快照>.delta`（JSON Lines），
+打开时回放；compact() 把快照和增量合并成新快照。
+
+用法:
+    python snapshot.py contacts.json contacts.snap    # 把 JSON 通讯录转成快照
+    python snapshot.py --compact contacts.snap        # 合并增量
+"""
+import bisect
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+
+MAGIC = b"TXLSNAP\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQI")
+OFFSET = struct.Struct("<Q")
+DELTA_SUFFIX = ".delta"
+# 写快照时偏移表先缓存到这么多项再落盘
+OFFSET_CHUNK = 65536
+
+
+def write_snapshot(path, records, fields):
+    """把 records（{字段: 值} 的可迭代对象）流式写成快照，内存占用与记录数无关"""
+    names = json.dumps(list(fields), ensure_ascii=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    table_path = path + ".table.tmp"
+    count = 0
+    with open(tmp_path, "wb") as out, open(table_path, "w+b") as table:
+        out.write(HEADER.pack(MAGIC, VERSION, len(fields), 0, 0, len(names)))
+        out.write(names)
+        offsets = array("Q")
+        position = out.tell()
+        for record in records:
+            for field in fields:
+                data = str(record.get(field, "")).encode("utf-8")
+                offsets.append(position)
+                out.write(data)
+                position += len(data)
+            count += 1
+            if len(offsets) >= OFFSET_CHUNK:
+                table.write(_little_endian(offsets))
+                offsets = array("Q")
+        offsets.append(position)
+        table.write(_little_endian(offsets))
+        table_offset = position
+        table.seek(0)
+        shutil.copyfileobj(table, out)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, len(fields), count, table_offset, len(names)))
+    os.remove(table_path)
+    os.replace(tmp_path, path)
+    return count
+
+
+def _little_endian(offsets):
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return offsets.tobytes()
+
+
+class Snapshot:
+    """打开快照文件，按下标读取记录"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, field_count, count, table_offset, names_len = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("不是有效的通讯录快照")
+        self.fields = tuple(json.loads(self.map[HEADER.size:HEADER.size + names_len].decode("utf-8")))
+        self.count = count
+        self.table_offset = table_offset
+        self.record_offsets = struct.Struct(f"<{field_count + 1}Q")
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        """读取第 index 条记录，返回 {字段: 值}"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        width = len(self.fields)
+        bounds = self.record_offsets.unpack_from(self.map, self.table_offset + index * width * OFFSET.size)
+        data = self.map
+        return {field: data[bounds[i]:bounds[i + 1]].decode("utf-8")
+                for i, field in enumerate(self.fields)}
+
+    def field(self, index, field):
+        """只读取一个字段，扫描时比 record 省得多"""
+        column = self.fields.index(field)
+        start, end = struct.unpack_from(
+            "<2Q", self.map, self.table_offset + (index * len(self.fields) + column) * OFFSET.size)
+        return self.map[start:end].decode("utf-8")
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def live_positions(next_pos, deleted):
+    """0..next_pos-1 中没有删除的位置；deleted 为有序列表"""
+    deleted = iter(deleted)
+    next_deleted = next(deleted, None)
+    for pos in range(next_pos):
+        if pos == next_deleted:
+            next_deleted = next(deleted, None)
+            continue
+        yield pos
+
+
+class SnapshotTable:
+    """快照加增量日志
+
+    记录用位置编号：快照里的记录是 0..N-1，新增的记录接着往后编。
+    逻辑顺序就是位置顺序去掉已删除的，deleted 是有序列表，按下标定位时用 bisect。
+    """
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.delta_path = path + DELTA_SUFFIX
+        self.snapshot = Snapshot(path) if os.path.exists(path) else None
+        self.fields = self.snapshot.fields if self.snapshot else tuple(fields)
+        self.base_count = len(self.snapshot) if self.snapshot else 0
+        self.next_pos = self.base_count
+        self.changed = {}
+        self.deleted = []
+        self.delta = None
+        self.replay_delta()
+
+    def replay_delta(self):
+        if not os.path.exists(self.delta_path):
+            return
+        with open(self.delta_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 程序崩溃时最后一行可能只写了一半，跳过即可
+                    continue
+                self.apply(entry)
+
+    def apply(self, entry):
+        pos = entry["pos"]
+        if entry["op"] == "delete":
+            index = bisect.bisect_left(self.deleted, pos)
+            if index == len(self.deleted) or self.deleted[index] != pos:
+                self.deleted.insert(index, pos)
+            self.changed.pop(pos, None)
+        else:
+            self.changed[pos] = entry["record"]
+            self.next_pos = max(self.next_pos, pos + 1)
+
+    def log(self, entry):
+        if self.delta is None:
+            self.delta = open(self.delta_path, "a", encoding="utf-8")
+            if self.delta.tell() > 0:
+                # 上次崩溃留下半行时先换行，免得新记录接在残缺的行后面
+                with open(self.delta_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self.delta.write("\n")
+        self.delta.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.delta.flush()
+        self.apply(entry)
+
+    def __len__(self):
+        return self.next_pos - len(self.deleted)
+
+    def position(self, index):
+        """第 index 条（逻辑下标）记录的位置编号"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        pos = index
+        skipped = 0
+        while True:
+            # pos 之前（含）被删掉几条，就要再往后挪几位
+            now = bisect.bisect_right(self.deleted, pos)
+            if now == skipped:
+                return pos
+            pos += now - skipped
+            skipped = now
+
+    def positions(self):
+        return live_positions(self.next_pos, self.deleted)
+
+    def get(self, pos):
+        record = self.changed.get(pos)
+        if record is None:
+            record = self.snapshot.record(pos)
+        return record
+
+    def get_field(self, pos, field):
+        record = self.changed.get(pos)
+        if record is not None:
+            return record.get(field, "")
+        return self.snapshot.field(pos, field)
+
+    def put(self, pos, record):
+        self.log({"op": "put", "pos": pos, "record": record})
+
+    def add(self, record):
+        pos = self.next_pos
+        self.log({"op": "add", "pos": pos, "record": record})
+        return pos
+
+    def delete(self, pos):
+        self.log({"op": "delete", "pos": pos})
+
+    def records(self):
+        for pos in self.positions():
+            yield self.get(pos)
+
+    def frozen_records(self):
+        """调用时的全部记录，可以交给后台线程逐条读取
+
+        快照文件本身不变，只把增量部分（changed / deleted，只有改过的几条）复制一份，
+        之后的增删改不影响已经取出的视图，也不会让后台线程遇到字典在迭代中被修改。
+        """
+        changed = dict(self.changed)
+        deleted = list(self.deleted)
+        snapshot = self.snapshot
+
+        def read(pos):
+            record = changed.get(pos)
+            return snapshot.record(pos) if record is None else record
+
+        return map(read, live_positions(self.next_pos, deleted))
+
+    def compact(self, fields=None, convert=None):
+        """把快照和增量合并成新快照，之后位置编号重新从 0 连续编排
+
+        fields 给出时按新的字段列表重写，convert 把每条记录转换后再写（用来补上新增的字段）。
+        """
+        fields = tuple(fields or self.fields)
+        records = self.records() if convert is None else map(convert, self.records())
+        tmp_path = self.path + ".compact"
+        write_snapshot(tmp_path, records, fields)
+        self.close()
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.delta_path):
+            os.remove(self.delta_path)
+        self.__init__(self.path, fields)
+
+    def close(self):
+        if self.delta is not None:
+            self.delta.close()
+            self.delta = None
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == "--compact":
+        table = SnapshotTable(argv[1], ())
+        table.compact()
+        print(f"已合并 {argv[1]}，共 {len(table)} 条")
+        table.close()
+    elif len(argv) == 2:
+        from addressbook import SNAPSHOT_FIELDS, snapshot_record
+
+        with open(argv[0], "r", encoding="utf-8") as f:
+            records = json.load(f)
+        count = write_snapshot(argv[1], map(snapshot_record, records), SNAPSHOT_FIELDS)
+        print(f"已写入 {argv[1]}，共 {count} 条")
+    else:
+        sys.exit(__doc__)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,186 @@
+"""列表按列排序（不依赖 tkinter）
+
+每条记录每一列的排序键只算一次并缓存，记录修改时才作废：
+- 数字（含 "35" 这样的数字串）按数值比较；
+- 文字按拼音比较（没有 pypinyin 时按首字母），再按原文不分大小写比较，
+  所以 "张伟" 排在 "赵" 前面、"alice" 与 "Alice" 相邻；
+- 空值排在最后。
+排好的顺序保存为有序数组 [(组合键 + 序号, 记录)]，增删改一条记录用 bisect 找位置，
+不需要重新排序整个列表。组合键支持多列，每列可以单独降序，
+降序列的键把码位反转后仍是普通元组，比较全部在 C 里完成。
+"""
+import bisect
+import re
+import weakref
+
+from name_search import char_keys
+
+NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+ARROWS = {False: ' ▲', True: ' ▼'}
+TOP = 0x10FFFF
+# 空值的类别，升序降序都排在最后
+EMPTY = 2
+
+
+def collation_key(value):
+    """单个值的排序键：(类别, 主键, 次键)，同类别内主次键类型一致，可以直接比较"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0, float(value), str(value)
+    text = str(value or '').strip()
+    if not text:
+        return EMPTY, 0.0, ''
+    if NUMBER.match(text):
+        return 0, float(text), text
+    spelled = []
+    for char in text:
+        syllable, initial = char_keys(char)
+        spelled.append(syllable or initial or char.casefold())
+    return 1, ''.join(spelled), text.casefold()
+
+
+def invert_text(text):
+    """码位反转后的字符串按原生比较正好是原字符串的逆序；
+    末尾补最大码位，让 "ab" 排在 "abc" 后面"""
+    return ''.join([chr(TOP - 1 - min(ord(char), TOP - 1)) for char in text]) + chr(TOP)
+
+
+def descending_key(key):
+    """降序列的排序键：类别和数值取负，文字码位反转；空值的类别不取负，仍排在最后"""
+    rank, primary, secondary = key
+    primary = invert_text(primary) if isinstance(primary, str) else -primary
+    return rank if rank == EMPTY else -rank, primary, invert_text(secondary)
+
+
+class SortedView:
+    """按排序规则 spec = [(列, 是否降序), ...] 维护记录的顺序
+
+    value_of(记录, 列) 取显示的值；weak_keys 为 True 时排序键缓存不阻止记录被释放
+    （快照通讯录的联系人对象用完即释放）。
+    """
+
+    def __init__(self, value_of, weak_keys=False):
+        self.value_of = value_of
+        self.spec = []
+        self.collation = weakref.WeakKeyDictionary() if weak_keys else {}
+        self.entries = []
+        self.composites = {}
+        self.next_serial = 0
+
+    def reset(self):
+        """数据整体换掉（如打开另一个数据库）时清空排序键缓存，保留排序规则"""
+        self.collation.clear()
+        self.entries = []
+        self.composites = {}
+        self.next_serial = 0
+
+    def forget(self, record):
+        """记录内容变了但不在当前列表里时，只作废它缓存的排序键"""
+        self.collation.pop(record, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.spec)
+
+    def toggle(self, column, extend=False):
+        """点击列标题：升序 → 降序 → 取消；extend（按住 Shift）时追加为次要排序列"""
+        columns = [name for name, _ in self.spec]
+        if extend and column in columns:
+            i = columns.index(column)
+            self.spec[i] = (column, not self.spec[i][1])
+        elif extend:
+            self.spec.append((column, False))
+        elif self.spec == [(column, False)]:
+            self.spec = [(column, True)]
+        elif self.spec == [(column, True)]:
+            self.spec = []
+        else:
+            self.spec = [(column, False)]
+        return self.spec
+
+    def headings(self, titles):
+        """按当前排序规则给列标题加上箭头，多列排序时再标上次序"""
+        labels = dict(titles)
+        for rank, (column, descending) in enumerate(self.spec, 1):
+            suffix = str(rank) if len(self.spec) > 1 else ''
+            labels[column] = f'{labels[column]}{ARROWS[descending]}{suffix}'
+        return labels
+
+    def column_key(self, record, column, descending=False):
+        keys = self.collation.get(record)
+        if keys is None:
+            keys = self.collation[record] = {}
+        key = keys.get((column, descending))
+        if key is None:
+            key = collation_key(self.value_of(record, column)) if not descending \
+                else descending_key(self.column_key(record, column))
+            keys[column, descending] = key
+        return key
+
+    def composite(self, record, serial):
+        """各列排序键展平成一个元组再接上序号，比嵌套元组比较得快"""
+        key = []
+        for column, descending in self.spec:
+            key.extend(self.column_key(record, column, descending))
+        key.append(serial)
+        return tuple(key)
+
+    def rebuild(self, records):
+        """按当前规则整体排序；排序键相同的保持 records 中的原有顺序"""
+        composites = self.composites = {}
+        entries = []
+        for serial, record in enumerate(records):
+            key = composites[record] = self.composite(record, serial)
+            # 序号各不相同，比较不会比到记录本身
+            entries.append((key, record))
+        entries.sort()
+        self.entries = entries
+        self.next_serial = len(entries)
+
+    def ordered(self, records):
+        """按当前规则排好 records 返回，不改动维护中的顺序（分组视图每组单独排序）"""
+        keyed = [(self.composite(record, serial), record) for serial, record in enumerate(records)]
+        keyed.sort()
+        return [record for _, record in keyed]
+
+    def records(self, start=0, stop=None):
+        return [entry[1] for entry in self.entries[start:stop]]
+
+    def index(self, record):
+        key = self.composites.get(record)
+        if key is None:
+            return None
+        return bisect.bisect_left(self.entries, (key,))
+
+    def insert(self, record):
+        """插入一条记录，返回它的位置"""
+        key = self.composites[record] = self.composite(record, self.next_serial)
+        self.next_serial += 1
+        pos = bisect.bisect_left(self.entries, (key,))
+        self.entries.insert(pos, (key, record))
+        return pos
+
+    def remove(self, record):
+        """删除一条记录，返回它原来的位置；不在列表中时返回 None"""
+        self.forget(record)
+        pos = self.index(record)
+        if pos is None:
+            return None
+        del self.entries[pos]
+        del self.composites[record]
+        return pos
+
+    def update(self, record):
+        """记录内容变了：重新计算排序键并移动到新位置，返回 (原位置, 新位置)"""
+        self.forget(record)
+        key = self.composites.get(record)
+        if key is None:
+            return None, None
+        old = bisect.bisect_left(self.entries, (key,))
+        del self.entries[old]
+        # 保留原序号，排序键相同时位置不变
+        key = self.composites[record] = self.composite(record, key[-1])
+        new = bisect.bisect_left(self.entries, (key,))
+        self.entries.insert(new, (key, record))
+        return old, new
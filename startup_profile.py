@@ -0,0 +1,103 @@
+"""启动耗时分析
+
+各程序都支持 --profile-startup 参数，例如:
+
+    python txl.py --profile-startup
+
+程序会以 -X importtime 重新启动自身，汇总导入耗时最多的模块，
+并报告从进程启动到主窗口第一次绘制完成的时间，报告后自动退出。
+"""
+import os
+import subprocess
+import sys
+import time
+
+FLAG = '--profile-startup'
+CHILD_ENV = 'STARTUP_PROFILE_T0'  # 子进程通过它拿到父进程的启动时间
+REPORT_PREFIX = 'STARTUP-PROFILE '
+TOP_IMPORTS = 12
+
+_loaded_at = time.time()
+
+
+def run_if_requested():
+    """带 --profile-startup 启动时，以 -X importtime 重新运行当前程序，打印报告后退出"""
+    if FLAG not in sys.argv or CHILD_ENV in os.environ:
+        return
+    if getattr(sys, 'frozen', False):
+        # 打包后的程序无法传 -X 参数，只在本进程内统计首次绘制时间
+        os.environ[CHILD_ENV] = repr(_loaded_at)
+        return
+
+    env = dict(os.environ, **{CHILD_ENV: repr(time.time())})
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + sys.argv,
+                          env=env, capture_output=True,
+                          encoding='utf-8', errors='replace')
+    first_paint = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(REPORT_PREFIX):
+            first_paint = float(line[len(REPORT_PREFIX):])
+        else:
+            print(line)
+
+    imports, other = parse_importtime(proc.stderr)
+    if other:
+        sys.stderr.write(other)
+    print_report(os.path.basename(sys.argv[0]), imports, first_paint)
+    sys.exit(proc.returncode)
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 [(累计微秒, 模块名)] 顶层导入列表和其余的错误输出"""
+    imports = []
+    other = []
+    for line in stderr.splitlines(keepends=True):
+        if not line.startswith('import time:'):
+            other.append(line)
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # 表头
+        name = fields[2].rstrip()
+        # 名称前只有两个空格的是顶层导入，缩进更深的是被它间接导入的模块
+        if not name.startswith('   '):
+            imports.append((int(fields[1]), name.strip()))
+    return imports, ''.join(other)
+
+
+def print_report(name, imports, first_paint):
+    print(f"启动分析: {name}")
+    if imports:
+        total = sum(us for us, _ in imports)
+        print(f"  导入耗时合计: {total / 1000:.1f} ms")
+        print("  耗时最多的顶层导入:")
+        for us, module in sorted(imports, reverse=True)[:TOP_IMPORTS]:
+            print(f"    {us / 1000:8.1f} ms  {module}")
+    if first_paint is None:
+        print("  首次绘制主窗口: 未完成（程序在显示窗口前退出）")
+    else:
+        print(f"  首次绘制主窗口: {first_paint:.3f} s")
+
+
+def watch_first_paint(root):
+    """分析模式下，在主窗口第一次绘制完成时报告耗时并关闭程序"""
+    if CHILD_ENV not in os.environ:
+        return
+    started = float(os.environ[CHILD_ENV])
+    exposed = []
+
+    def on_expose(event):
+        if not exposed:
+            exposed.append(event)
+            # 等本轮绘制全部完成后再计时
+            root.after_idle(report)
+
+    def report():
+        elapsed = time.time() - started
+        if getattr(sys, 'frozen', False):
+            print_report(os.path.basename(sys.executable), [], elapsed)
+        else:
+            print(f"{REPORT_PREFIX}{elapsed:.6f}", flush=True)
+        root.destroy()
+
+    root.bind('<Expose>', on_expose, add='+')
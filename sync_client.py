@@ -0,0 +1,299 @@
+"""同步服务的客户端（不依赖 tkinter，也不导入 asyncio）
+
+SyncClient 连上 sync_server.py 后先取一次全量数据，之后只靠服务端推送的变化事件
+更新本地缓存 contacts（编号 -> 记录）和 agents（编号 -> 档案）。
+RemoteAddressBook 把缓存包装成 AddressBook，txl.py 设置环境变量
+TXL_SYNC_SERVER=127.0.0.1:8765 时用它代替本地 JSON 文件；界面仍然按 POLL_MS
+调用 poll_changes()，拿到的是自上次以来推送来的增量，不读文件。
+"""
+import hashlib
+import itertools
+import json
+import queue
+import socket
+import sys
+import threading
+
+from addressbook import FIELDS, AddressBook, ConflictError, Contact
+from change_feed import DELETED, INSERTED, UPDATED
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+TIMEOUT = 10
+
+
+class SyncError(Exception):
+    """服务端拒绝了请求或连接已断开"""
+
+
+class SyncClient:
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.sock = socket.create_connection((host, port), timeout=TIMEOUT)
+        self.sock.settimeout(None)
+        self.reader = self.sock.makefile('rb')
+        self.write_lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.contacts = {}
+        self.agents = {}
+        self.seq = 0
+        # 按数据种类排队的事件，界面线程用 take_events 取走
+        self.events = {'contacts': [], 'agents': []}
+        self.events_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+        snapshot = self.request('snapshot')
+        self.contacts = {record['id']: record for record in snapshot['contacts']}
+        self.agents = snapshot['agents']
+        self.seq = snapshot['seq']
+        if self.request('subscribe', since=self.seq)['resync']:
+            raise SyncError('同步服务的事件日志已滚动，请重新连接')
+
+    def request(self, op, **args):
+        """发送请求并等待应答；冲突时抛出 ConflictError，其他错误抛出 SyncError"""
+        if self.closed:
+            raise SyncError('连接已断开')
+        request_id = next(self.ids)
+        reply = self.pending[request_id] = queue.Queue(1)
+        args.update(id=request_id, op=op)
+        data = json.dumps(args, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self.write_lock:
+            self.sock.sendall(data)
+        try:
+            message = reply.get(timeout=TIMEOUT)
+        except queue.Empty:
+            raise SyncError(f'{op} 请求超时') from None
+        finally:
+            self.pending.pop(request_id, None)
+        if message is None:
+            raise SyncError('连接已断开')
+        if not message['ok']:
+            if message.get('conflict'):
+                raise ConflictError(message['error'])
+            raise SyncError(message['error'])
+        return message['result']
+
+    def _read_loop(self):
+        try:
+            for line in self.reader:
+                message = json.loads(line)
+                if message.get('event') == 'change':
+                    self._apply_event(message)
+                else:
+                    reply = self.pending.get(message.get('id'))
+                    if reply is not None:
+                        reply.put(message)
+        except (OSError, ValueError):
+            pass
+        self.closed = True
+        for reply in list(self.pending.values()):
+            reply.put(None)
+
+    def _apply_event(self, event):
+        cache = self.contacts if event['store'] == 'contacts' else self.agents
+        if event['kind'] == 'deleted':
+            cache.pop(event['key'], None)
+        else:
+            cache[event['key']] = event['new']
+        self.seq = event['seq']
+        with self.events_lock:
+            self.events[event['store']].append(event)
+
+    def take_events(self, store):
+        """取走 store（'contacts' 或 'agents'）积压的事件"""
+        with self.events_lock:
+            events = self.events[store]
+            self.events[store] = []
+        return events
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def connect(address=DEFAULT_ADDRESS):
+    host, _, port = address.rpartition(':')
+    return SyncClient(host or '127.0.0.1', int(port))
+
+
+class RemoteAddressBook(AddressBook):
+    """数据在同步服务上的通讯录，接口与 AddressBook 相同
+
+    增删改先发给服务端，成功后立即改本地对象；服务端随后推送的同一变化按版本号识别后跳过。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        host, port = client.sock.getpeername()[:2]
+        super().__init__(f'sync://{host}:{port}')
+
+    def load_contacts(self):
+        self.client.take_events('contacts')
+        self.contacts = [Contact(**record) for record in self.client.contacts.values()]
+        # 没有本地数据文件，text_from_file 保持 False，全文索引只在内存里建
+        self.rebuild_index()
+
+    def poll_changes(self):
+        changes = {'added': [], 'updated': [], 'removed': []}
+        removed = set()
+        for event in self.client.take_events('contacts'):
+            contact = self.by_id.get(event['key'])
+            if event['kind'] == DELETED:
+                if contact is not None:
+                    del self.by_id[contact.id]
+                    removed.add(contact)
+                    changes['removed'].append(contact)
+            elif contact is None:
+                contact = Contact(**event['new'])
+                self.contacts.append(contact)
+                self.by_id[contact.id] = contact
+                changes['added'].append(contact)
+                self._emit(INSERTED, contact)
+            elif contact.version < event['new']['version']:
+                old = dict(vars(contact))
+                for field, value in event['new'].items():
+                    setattr(contact, field, value)
+                changes['updated'].append(contact)
+                self._emit(UPDATED, contact, old)
+        if removed:
+            self.contacts = [c for c in self.contacts if c not in removed]
+            for contact in changes['removed']:
+                self._emit(DELETED, contact)
+        if not any(changes.values()):
+            return None
+        return changes
+
+    def save_contacts(self):
+        pass
+
+    def save_index(self):
+        pass
+
+    def compact(self):
+        pass
+
+    def close(self):
+        self.client.close()
+
+    def add_contact(self, contact):
+        record = {field: getattr(contact, field) for field in FIELDS}
+        result = self.client.request('contacts.add', record=record)
+        contact.id = result['id']
+        contact.version = result['version']
+        self.contacts.append(contact)
+        self.by_id[contact.id] = contact
+        self._emit(INSERTED, contact)
+
+    def update_contact(self, contact, data):
+        fields = {field: value for field, value in data.items() if field in FIELDS}
+        try:
+            result = self.client.request('contacts.update', key=contact.id,
+                                         version=contact.version, fields=fields)
+        except ConflictError:
+            # 引起冲突的事件一定先于应答到达，合并后内存中就是最新内容
+            self.poll_changes()
+            raise
+        old = dict(vars(contact))
+        for field, value in result.items():
+            setattr(contact, field, value)
+        self._emit(UPDATED, contact, old)
+
+    def apply_batch(self, updates=(), deletions=()):
+        """一次请求完成批量修改和删除；有冲突时服务端什么也不改"""
+        try:
+            results = self.client.request(
+                'contacts.batch',
+                updates=[{'key': c.id, 'version': c.version,
+                          'fields': {f: v for f, v in data.items() if f in FIELDS}} for c, data in updates],
+                deletions=[{'key': c.id, 'version': c.version} for c in deletions])
+        except ConflictError:
+            self.poll_changes()
+            raise
+        changed = []
+        for (contact, _), result in zip(updates, results):
+            changed.append((contact, dict(vars(contact))))
+            for field, value in result.items():
+                setattr(contact, field, value)
+        removed = set(deletions)
+        for contact in removed:
+            self.by_id.pop(contact.id, None)
+        self.contacts = [c for c in self.contacts if c not in removed]
+        for contact, old in changed:
+            self._emit(UPDATED, contact, old)
+        for contact in deletions:
+            self._emit(DELETED, contact)
+
+    def delete_contact(self, name):
+        """同名的一次请求全部删除；其中有被其他终端改过的时一个也不删，抛出 ConflictError"""
+        removed = [c for c in self.contacts if c.name == name]
+        if removed:
+            self.apply_batch(deletions=removed)
+        return removed
+
+    def delete_contact_by_id(self, contact_id):
+        contact = self.by_id.get(contact_id)
+        if contact is None:
+            return None
+        try:
+            self.client.request('contacts.delete', key=contact_id, version=contact.version)
+        except ConflictError:
+            self.poll_changes()
+            raise
+        del self.by_id[contact_id]
+        self.contacts = [c for c in self.contacts if c is not contact]
+        self._emit(DELETED, contact)
+        return contact
+
+
+def state_digest(contacts, agents):
+    """联系人（记录的可迭代对象）和特工档案的摘要，演示时用来核对各方是否一致"""
+    versions = sorted((record['id'], record['version']) for record in contacts)
+    data = json.dumps([versions, agents], sort_keys=True, ensure_ascii=False)
+    return f"{len(versions)} {hashlib.sha1(data.encode('utf-8')).hexdigest()[:12]}"
+
+
+def demo_worker(port, worker):
+    """sync_server.py --demo 启动的客户端进程：随机增删改，等服务端通知后报告本地缓存的摘要"""
+    import random
+
+    rng = random.Random(worker)
+    book = RemoteAddressBook(SyncClient(port=port))
+    client = book.client
+    conflicts = 0
+    for i in range(40):
+        book.add_contact(Contact(f'终端{worker}-{i}', f'138{worker:04d}{i:04d}', f'w{worker}.{i}@cia.gov', '兰利'))
+        client.request('agents.put', key=f'W{worker}-{i}',
+                       record={'codename': f'W{worker}-{i}', 'status': '活跃', 'clearance': 'SECRET'})
+        book.poll_changes()
+        if book.contacts and rng.random() < 0.5:
+            contact = rng.choice(book.contacts)
+            try:
+                book.update_contact(contact, {'address': f'由终端{worker}修改'})
+            except ConflictError:
+                conflicts += 1
+        if i % 10 == 9:
+            try:
+                book.delete_contact(f'终端{worker}-{i - 5}')
+            except ConflictError:
+                conflicts += 1
+            client.request('agents.set_status', keys=[f'W{worker}-{i}'], status='失联')
+    print(f'done {conflicts}', flush=True)
+    sys.stdin.readline()
+    # ping 的应答排在之前所有事件之后，收到应答时缓存已经是最新的
+    client.request('ping')
+    book.poll_changes()
+    cache = state_digest(client.contacts.values(), client.agents)
+    mirror = state_digest((vars(c) for c in book.contacts), client.agents)
+    print(cache if cache == mirror else f'{cache} != {mirror}', flush=True)
+    book.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--demo-worker':
+        demo_worker(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        sys.exit('用法: python sync_client.py --demo-worker <端口> <编号>')
@@ -0,0 +1,292 @@
+"""本机同步服务：多个客户端共享同一个通讯录和特工数据库
+
+协议是 localhost 上的 TCP，每行一个 JSON：
+    请求  {"id": 1, "op": "contacts.add", "record": {...}}
+    应答  {"id": 1, "ok": true, "result": ...}
+          {"id": 1, "ok": false, "error": "...", "conflict": true}
+    事件  {"event": "change", "seq": 42, "store": "contacts", "kind": "updated",
+           "key": "<编号>", "old": {...}, "new": {...}}
+客户端先用 snapshot 取全量数据和当前序号，再用 subscribe 从该序号起接收事件，
+本地缓存只按事件增量更新（见 sync_client.py）。服务端是数据文件唯一的常驻写入者；
+它也按修改时间检查通讯录文件，直接编辑文件的旧版程序的修改同样会推送出去。
+
+用法:
+    python sync_server.py --contacts contacts.json --agents agents.ciadb
+    python sync_server.py --demo 4        # 在临时目录里起服务和 4 个客户端进程，检查各方数据一致
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+
+import agent_schema
+import agent_store
+from addressbook import FIELDS, AddressBook, ConflictError, Contact
+
+DEFAULT_PORT = 8765
+# 保留最近这么多条事件，断线重连的客户端可以从中补齐
+LOG_LIMIT = 10000
+POLL_SECONDS = 1.0
+
+
+class Connection:
+    """一个客户端连接；应答和事件都经由同一个队列按顺序发出"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue()
+
+    def send(self, message):
+        self.queue.put_nowait(message)
+
+    async def pump(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                break
+            self.writer.write(json.dumps(message, ensure_ascii=False, default=agent_schema.to_json).encode("utf-8") + b"\n")
+            await self.writer.drain()
+
+
+class SyncServer:
+    def __init__(self, contacts_path, agents_path=None, encoded=True):
+        self.book = AddressBook(contacts_path)
+        self.agents_path = agents_path
+        self.encoded = encoded
+        self.agents = agent_store.AgentStore()
+        if agents_path and os.path.exists(agents_path):
+            self.agents.load(agents_path)
+        self.seq = 0
+        self.log = collections.deque(maxlen=LOG_LIMIT)
+        self.subscribers = set()
+        # 不论是客户端请求还是直接改文件的程序，通讯录的每个变化都经由事件总线推送
+        self.book.changes.subscribe(
+            lambda event: self.publish("contacts", event.kind, event.key, event.old, event.new))
+        self.agents.changes.subscribe(
+            lambda event: self.publish("agents", event.kind, event.key, event.old, event.new))
+
+    def publish(self, store, kind, key, old=None, new=None):
+        self.seq += 1
+        event = {"event": "change", "seq": self.seq, "store": store, "kind": kind,
+                 "key": key, "old": old, "new": new}
+        self.log.append(event)
+        for conn in self.subscribers:
+            conn.send(event)
+
+    def save_agents(self):
+        if self.agents_path:
+            self.agents.save(self.agents_path, encoded=self.encoded)
+
+    # ---- 请求处理，方法名是 op 中的点换成下划线 ----
+
+    def op_ping(self, conn, msg):
+        return "pong"
+
+    def op_snapshot(self, conn, msg):
+        return {"seq": self.seq,
+                "contacts": [vars(c) for c in self.book.contacts],
+                "agents": self.agents.agents}
+
+    def op_subscribe(self, conn, msg):
+        since = msg.get("since", 0)
+        if since > self.seq or (self.log and since < self.log[0]["seq"] - 1):
+            # 需要的事件已经被挤出日志，或者服务端重启过、序号重新计数，只能重新取全量
+            return {"resync": True}
+        for event in self.log:
+            if event["seq"] > since:
+                conn.send(event)
+        self.subscribers.add(conn)
+        return {"resync": False, "seq": self.seq}
+
+    def op_contacts_add(self, conn, msg):
+        record = {field: msg["record"].get(field, "") for field in FIELDS}
+        contact = Contact(**record)
+        self.book.add_contact(contact)
+        return vars(contact)
+
+    def checked_contact(self, key, version):
+        """客户端看到的版本与服务端一致的联系人，否则抛出 ConflictError"""
+        contact = self.book.contact_by_id(key)
+        if contact is None:
+            raise ConflictError("联系人已被其他终端删除")
+        if contact.version != version:
+            raise ConflictError(f"{contact.name} 已被其他终端修改，已载入最新内容，请重新编辑")
+        return contact
+
+    def op_contacts_update(self, conn, msg):
+        contact = self.checked_contact(msg["key"], msg["version"])
+        self.book.update_contact(contact, msg["fields"])
+        return vars(contact)
+
+    def op_contacts_batch(self, conn, msg):
+        """批量修改和删除，全部检查通过才执行；返回修改后的联系人"""
+        updates = [(self.checked_contact(item["key"], item["version"]), item["fields"]) for item in msg["updates"]]
+        deletions = [self.checked_contact(item["key"], item["version"]) for item in msg["deletions"]]
+        self.book.apply_batch(updates, deletions)
+        return [vars(contact) for contact, _ in updates]
+
+    def op_contacts_delete(self, conn, msg):
+        """删除一个联系人；和修改一样核对版本，不会悄悄删掉其他终端刚改过的内容"""
+        contact = self.checked_contact(msg["key"], msg["version"])
+        self.book.delete_contact_by_id(contact.id)
+        return vars(contact)
+
+    def op_contacts_search(self, conn, msg):
+        return [vars(c) for c in self.book.search_ranked(msg["keyword"], msg.get("limit", 20))]
+
+    def op_agents_put(self, conn, msg):
+        self.agents.put(msg["key"], dict(msg["record"]))
+        self.save_agents()
+        return msg["record"]
+
+    def op_agents_delete(self, conn, msg):
+        removed = [agent_id for agent_id in msg["keys"] if agent_id in self.agents]
+        for agent_id in removed:
+            self.agents.delete(agent_id)
+        if removed:
+            self.save_agents()
+        return removed
+
+    def op_agents_set_status(self, conn, msg):
+        """批量改状态；有不存在的编号时一个也不改"""
+        missing = [agent_id for agent_id in msg["keys"] if agent_id not in self.agents]
+        if missing:
+            raise KeyError(f"特工不存在: {', '.join(map(str, missing))}")
+        for agent_id in msg["keys"]:
+            self.agents.update(agent_id, status=msg["status"])
+        self.save_agents()
+        return len(msg["keys"])
+
+    def op_agents_wipe(self, conn, msg):
+        return self.op_agents_delete(conn, {"keys": list(self.agents.agents)})
+
+    def dispatch(self, conn, msg):
+        handler = getattr(self, "op_" + msg.get("op", "").replace(".", "_"), None)
+        if handler is None:
+            raise ValueError(f"未知操作: {msg.get('op')}")
+        return handler(conn, msg)
+
+    # ---- 网络 ----
+
+    async def handle(self, reader, writer):
+        conn = Connection(writer)
+        pump = asyncio.ensure_future(conn.pump())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict):
+                    # [] 或 1 这样的也是合法 JSON，但不是请求，和解析不了的一样跳过
+                    continue
+                try:
+                    reply = {"id": msg.get("id"), "ok": True, "result": self.dispatch(conn, msg)}
+                except ConflictError as e:
+                    reply = {"id": msg.get("id"), "ok": False, "error": str(e), "conflict": True}
+                except (KeyError, TypeError, ValueError) as e:
+                    reply = {"id": msg.get("id"), "ok": False, "error": f"请求无效: {e!r}"}
+                conn.send(reply)
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(conn)
+            conn.send(None)
+            await asyncio.gather(pump, return_exceptions=True)
+            writer.close()
+
+    async def watch_file(self):
+        """直接修改通讯录文件的程序（如旧版 2.py）所做的修改也推送给客户端"""
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            self.book.poll_changes()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.ensure_future(self.watch_file())
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def run_demo(clients):
+    """临时目录里起服务和若干客户端进程，各自增删改后核对所有缓存与服务端一致"""
+    import subprocess
+    import tempfile
+    import threading
+
+    from sync_client import state_digest
+
+    workdir = tempfile.mkdtemp(prefix="txl_sync_")
+    server = SyncServer(os.path.join(workdir, "contacts.json"), os.path.join(workdir, "agents.ciadb"))
+    loop = asyncio.new_event_loop()
+    ports = []
+    started = threading.Event()
+
+    def ready(port):
+        ports.append(port)
+        started.set()
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    serving = asyncio.run_coroutine_threadsafe(server.serve(port=0, ready=ready), loop)
+    started.wait(10)
+    client_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_client.py")
+    procs = [subprocess.Popen([sys.executable, client_script, "--demo-worker", str(ports[0]), str(k)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for k in range(clients)]
+    # 所有客户端都改完之后再让它们报告，否则先结束的客户端看不到别人后来的修改
+    conflicts = [proc.stdout.readline().split()[-1] for proc in procs]
+
+    async def server_digest():
+        return state_digest((vars(c) for c in server.book.contacts),
+                            {agent_id: agent.to_dict() for agent_id, agent in server.agents.items()})
+
+    expected = asyncio.run_coroutine_threadsafe(server_digest(), loop).result()
+    reports = [proc.communicate("report\n")[0].strip() for proc in procs]
+    print(f"服务端: {expected}")
+    for k, report in enumerate(reports):
+        print(f"客户端 {k}: {report}（编辑冲突 {conflicts[k]} 次）")
+    ok = all(report == expected for report in reports)
+    print("一致" if ok else "不一致")
+
+    async def drain():
+        others = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*others, return_exceptions=True)
+
+    serving.cancel()
+    asyncio.run_coroutine_threadsafe(drain(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通讯录与特工数据库的本机同步服务")
+    parser.add_argument("--contacts", default="contacts.json")
+    parser.add_argument("--agents", default=None, help=".ciadb 特工数据库")
+    parser.add_argument("--plain", action="store_true", help="特工数据库保存为明文 JSON（33.py 格式）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--demo", type=int, metavar="N", help="演示：起 N 个客户端进程并核对结果")
+    args = parser.parse_args()
+    if args.demo:
+        sys.exit(run_demo(args.demo))
+    server = SyncServer(args.contacts, args.agents, encoded=not args.plain)
+    print(f"同步服务已启动: 127.0.0.1:{args.port}")
+    try:
+        asyncio.run(server.serve(port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
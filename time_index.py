@@ -0,0 +1,36 @@
+"""按时间戳排序的索引（不依赖 tkinter）
+
+保存 (时间戳, 编号) 的有序数组，增删改一条用 bisect 定位；
+"某个时间之前有多少条" 只需一次二分查找，O(log N)，不必扫描全部记录。
+没有时间戳的记录不进索引。
+"""
+import bisect
+
+
+class TimeIndex:
+    def __init__(self, items=()):
+        """items 为 (编号, 时间戳) 序列"""
+        self.entries = sorted((stamp, key) for key, stamp in items if stamp is not None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, stamp):
+        if stamp is not None:
+            bisect.insort(self.entries, (stamp, key))
+
+    def remove(self, key, stamp):
+        if stamp is None:
+            return
+        pos = bisect.bisect_left(self.entries, (stamp, key))
+        if pos < len(self.entries) and self.entries[pos] == (stamp, key):
+            del self.entries[pos]
+
+    def count_before(self, cutoff):
+        """时间戳早于 cutoff 的记录数"""
+        # (cutoff,) 比任何 (cutoff, 编号) 都小
+        return bisect.bisect_left(self.entries, (cutoff,))
+
+    def before(self, cutoff):
+        """时间戳早于 cutoff 的编号，最早的在前"""
+        return [key for _, key in self.entries[:self.count_before(cutoff)]]
@@ -1,48 +1,117 @@
-import json
+import itertools
 import os
 import random
+import time
 import tkinter as tk
 from tkinter import font as tkfont
 from tkinter import ttk
 
+import instrument
+import startup_profile
+from addressbook import AddressBook, ConflictError, Contact
+from change_feed import DELETED, INSERTED, UPDATED
+from sorted_view import SortedView
 
-class AddressBook:
-    def __init__(self, filename='contacts.json'):
-        self.filename = filename
-        self.contacts = []
-        self.load_contacts()
+RANKED_LIMIT = 50  # 智能搜索最多列出的条数
+POLL_MS = 1000  # 检查其他程序是否修改了通讯录的间隔
+DISPLAY_LIMIT = 2000  # 列表最多显示的条数，大通讯录只读出这么多
+# 有快照文件（python snapshot.py contacts.json contacts.snap 生成）时优先使用
+CONTACTS_FILE = 'contacts.snap' if os.path.exists('contacts.snap') else 'contacts.json'
+# 设置为 host:port 时连接 sync_server.py，与其他终端实时共享通讯录
+SYNC_SERVER = os.environ.get('TXL_SYNC_SERVER')
 
-    def load_contacts(self):
-        if os.path.exists(self.filename):
-            with open(self.filename, 'r') as f:
-                data = json.load(f)
-                self.contacts = [Contact(**item) for item in data]
 
-    def save_contacts(self):
-        data = [vars(contact) for contact in self.contacts]
-        with open(self.filename, 'w') as f:
-            json.dump(data, f, indent=2)
+def open_address_book():
+    if SYNC_SERVER:
+        import sync_client
 
-    def add_contact(self, contact):
-        self.contacts.append(contact)
-        self.save_contacts()
+        return sync_client.RemoteAddressBook(sync_client.connect(SYNC_SERVER))
+    return AddressBook(CONTACTS_FILE)
 
-    def delete_contact(self, name):
-        self.contacts = [c for c in self.contacts if c.name != name]
-        self.save_contacts()
 
-    def search_contacts(self, keyword):
-        return [c for c in self.contacts
-                if keyword.lower() in c.name.lower() or
-                keyword in c.phone]
+class FrameScheduler:
+    """统一调度所有动画特效，每次 tick 依次绘制到期的特效
 
+    窗口最小化或失去焦点时暂停；用户正在输入或单帧耗时超出预算时逐步降低帧率，
+    恢复空闲后再逐步回到正常帧率。
+    """
+    BASE_INTERVAL = 50  # 正常帧间隔（毫秒）
+    MAX_INTERVAL = 400  # 降频后的最大帧间隔（毫秒）
+    FRAME_BUDGET = 0.010  # 单帧允许耗时（秒）
+    INPUT_QUIET = 0.3  # 最近一次按键后多少秒内视为正在输入
 
-class Contact:
-    def __init__(self, name, phone, email, address):
-        self.name = name
-        self.phone = phone
-        self.email = email
-        self.address = address
+    def __init__(self, root):
+        self.root = root
+        self.effects = []
+        self.interval = self.BASE_INTERVAL
+        self.after_id = None
+        self.pause_reasons = set()
+        self.last_input = 0.0
+
+        root.bind('<Unmap>', self.on_unmap, add='+')
+        root.bind('<Map>', self.on_map, add='+')
+        root.bind('<FocusOut>', lambda e: root.after_idle(self.check_focus), add='+')
+        root.bind('<FocusIn>', lambda e: self.set_paused('unfocused', False), add='+')
+        root.bind('<KeyPress>', self.on_input, add='+')
+
+    def add(self, name, func, period):
+        """注册特效，period 为该特效的刷新周期（毫秒）"""
+        self.effects.append({'name': name, 'func': func, 'period': period / 1000,
+                             'due': 0.0, 'enabled': True})
+
+    def set_enabled(self, name, enabled):
+        for effect in self.effects:
+            if effect['name'] == name:
+                effect['enabled'] = enabled
+                effect['due'] = 0.0
+
+    def start(self):
+        if self.after_id is None and not self.pause_reasons:
+            self.after_id = self.root.after(self.interval, self.tick)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def set_paused(self, reason, paused):
+        if paused:
+            self.pause_reasons.add(reason)
+            self.stop()
+        else:
+            self.pause_reasons.discard(reason)
+            self.start()
+
+    def on_unmap(self, event):
+        if event.widget is self.root:
+            self.set_paused('iconified', True)
+
+    def on_map(self, event):
+        if event.widget is self.root:
+            self.set_paused('iconified', False)
+
+    def check_focus(self):
+        # 焦点只是在本程序的控件之间移动时不暂停
+        if not self.root.tk.call('focus'):
+            self.set_paused('unfocused', True)
+
+    def on_input(self, event):
+        self.last_input = time.perf_counter()
+
+    def tick(self):
+        self.after_id = None
+        start = time.perf_counter()
+        for effect in self.effects:
+            if effect['enabled'] and start >= effect['due']:
+                effect['func']()
+                effect['due'] = start + effect['period']
+        elapsed = time.perf_counter() - start
+
+        if elapsed > self.FRAME_BUDGET or start - self.last_input < self.INPUT_QUIET:
+            self.interval = min(self.interval * 2, self.MAX_INTERVAL)
+        else:
+            self.interval = max(self.interval * 3 // 4, self.BASE_INTERVAL)
+        self.start()
 
 
 class CyberpunkContactApp:
@@ -52,9 +121,12 @@ class CyberpunkContactApp:
         self.root.geometry("1000x700")
         self.root.configure(bg='#0a0a12')
 
-        # 保存动画ID以便关闭时取消
-        self.scan_lines_id = None
-        self.binary_rain_id = None
+        # 所有动画特效由同一个调度器驱动
+        self.scheduler = FrameScheduler(self.root)
+        self.reduced_effects = tk.BooleanVar(value=False)
+        self.scan_lines_size = None  # 扫描线上次绘制时的窗口尺寸
+        # 智能搜索：按拼音、首字母和容错匹配排序，只列出最相关的若干条
+        self.ranked_search = tk.BooleanVar(value=True)
 
         # 设置窗口关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -72,16 +144,26 @@ class CyberpunkContactApp:
 
         self.setup_fonts()
         self.create_cyber_ui()
-        self.address_book = AddressBook()
+        self.address_book = open_address_book()
+        # 列表中显示的联系人 -> 行号，增删改事件据此只更新对应的行
+        self.rows = {}
+        self.refresh_id = None
+        self.dedupe = None
+        # 点击列标题排序，按住 Shift 点击追加次要排序列
+        self.sorter = SortedView(getattr, weak_keys=True)
+        self.address_book.changes.subscribe(self.on_contact_changed)
         self.update_contact_list()
+        # 同一个通讯录可能同时在别的窗口里编辑，定期检查并增量合并
+        self.poll_id = self.root.after(POLL_MS, self.poll_contacts)
 
     def on_close(self):
         """处理窗口关闭事件"""
         # 停止所有动画效果
-        if self.scan_lines_id:
-            self.root.after_cancel(self.scan_lines_id)
-        if self.binary_rain_id:
-            self.root.after_cancel(self.binary_rain_id)
+        self.scheduler.stop()
+        self.root.after_cancel(self.poll_id)
+        # 全文索引随数据文件保存，下次启动不必重建
+        self.address_book.save_index()
+        self.address_book.close()
         self.root.destroy()
 
     def setup_fonts(self):
@@ -163,6 +245,42 @@ class CyberpunkContactApp:
                   command=self.show_about,
                   **button_style).pack(side=tk.LEFT)
 
+        tk.Button(control_frame,
+                  text="[≈] 查重",
+                  command=self.show_dedupe,
+                  **button_style).pack(side=tk.LEFT)
+
+        tk.Button(control_frame,
+                  text="[⇩] 导出",
+                  command=self.export_contacts,
+                  **button_style).pack(side=tk.LEFT)
+
+        tk.Checkbutton(control_frame,
+                       text="智能搜索",
+                       variable=self.ranked_search,
+                       command=lambda: self.update_contact_list(self.search_var.get()),
+                       font=self.main_font,
+                       bg=self.colors['panel'],
+                       fg=self.colors['primary'],
+                       selectcolor=self.colors['bg'],
+                       activebackground=self.colors['panel'],
+                       activeforeground=self.colors['primary'],
+                       bd=0,
+                       highlightthickness=0).pack(side=tk.LEFT, padx=(10, 0))
+
+        tk.Checkbutton(control_frame,
+                       text="低特效",
+                       variable=self.reduced_effects,
+                       command=self.on_effects_changed,
+                       font=self.main_font,
+                       bg=self.colors['panel'],
+                       fg=self.colors['primary'],
+                       selectcolor=self.colors['bg'],
+                       activebackground=self.colors['panel'],
+                       activeforeground=self.colors['primary'],
+                       bd=0,
+                       highlightthickness=0).pack(side=tk.LEFT, padx=(10, 0))
+
         # 联系人列表
         list_frame = tk.Frame(self.root, bg=self.colors['panel'])
         list_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
@@ -190,9 +308,11 @@ class CyberpunkContactApp:
                                  show='headings',
                                  style="Treeview")
 
-        self.tree.heading('name', text='姓名')
-        self.tree.heading('phone', text='电话')
-        self.tree.heading('email', text='邮箱')
+        self.column_titles = {'name': '姓名', 'phone': '电话', 'email': '邮箱'}
+        for column, title in self.column_titles.items():
+            self.tree.heading(column, text=title)
+        self.tree.bind('<Button-1>', self.on_heading_click)
+        self.tree.bind('<Shift-Button-1>', lambda e: self.on_heading_click(e, extend=True))
 
         self.tree.column('name', width=200, anchor='w')
         self.tree.column('phone', width=150, anchor='center')
@@ -233,7 +353,6 @@ class CyberpunkContactApp:
                                     bg=self.colors['bg'],
                                     highlightthickness=0)
         self.scan_lines.place(x=0, y=0, relwidth=1, relheight=1)
-        self.draw_scan_lines()
 
         # 添加二进制雨效果
         self.binary_rain = tk.Canvas(self.root,
@@ -241,18 +360,26 @@ class CyberpunkContactApp:
                                      highlightthickness=0)
         self.binary_rain.place(x=0, y=0, relwidth=1, relheight=1)
         self.binary_streams = []
-        self.start_binary_rain()
+
+        self.scheduler.add('scan_lines', self.draw_scan_lines, 100)
+        self.scheduler.add('binary_rain', self.draw_binary_rain, 50)
+        self.scheduler.start()
 
         # 确保UI元素在最上层
         title_frame.lift()
         control_frame.lift()
         list_frame.lift()
 
-    def draw_scan_lines(self):
-        self.scan_lines.delete("all")
+    def draw_scan_lines(self, force=False):
         width = self.root.winfo_width()
         height = self.root.winfo_height()
 
+        # 扫描线是静态的，只有窗口尺寸变化时才需要重画
+        if not force and (width, height) == self.scan_lines_size:
+            return
+        self.scan_lines_size = (width, height)
+        self.scan_lines.delete("all")
+
         # 确保画布大小与窗口一致
         self.scan_lines.config(width=width, height=height)
 
@@ -261,9 +388,7 @@ class CyberpunkContactApp:
             color = self.blend_colors(self.colors['bg'], self.colors['primary'], alpha)
             self.scan_lines.create_line(0, i, width, i, fill=color, width=1)
 
-        self.scan_lines_id = self.root.after(100, self.draw_scan_lines)
-
-    def start_binary_rain(self):
+    def draw_binary_rain(self):
         width = self.root.winfo_width()
         height = self.root.winfo_height()
 
@@ -305,7 +430,13 @@ class CyberpunkContactApp:
             if stream['y'] - stream['length'] * 20 > height:
                 self.binary_streams.remove(stream)
 
-        self.binary_rain_id = self.root.after(50, self.start_binary_rain)
+    def on_effects_changed(self):
+        """切换低特效模式：关闭二进制雨，只保留静态扫描线"""
+        reduced = self.reduced_effects.get()
+        self.scheduler.set_enabled('binary_rain', not reduced)
+        if reduced:
+            self.binary_streams.clear()
+            self.binary_rain.delete("all")
 
     def blend_colors(self, color1, color2, alpha):
         """混合两种颜色"""
@@ -319,16 +450,99 @@ class CyberpunkContactApp:
         return f"#{r:02x}{g:02x}{b:02x}"
 
     def update_contact_list(self, keyword=None):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.refresh_id = None
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+
+        contacts = self.search_results(keyword)
+        if self.sorter:
+            # 排序键按联系人缓存，重新排序时不必再算；大通讯录要读出全部联系人才能排序
+            self.sorter.rebuild(contacts)
+            contacts = self.sorter.records(0, DISPLAY_LIMIT)
+        for contact in itertools.islice(contacts, DISPLAY_LIMIT):
+            self.rows[contact] = self.tree.insert('', 'end', values=self.row_values(contact))
+
+    def search_results(self, keyword):
+        if keyword and self.ranked_search.get():
+            return self.address_book.search_ranked(keyword, RANKED_LIMIT)
+        if keyword:
+            return self.address_book.search_contacts(keyword)
+        # 不搜索时只列出前面一部分，快照通讯录也就只读这些记录
+        return self.address_book.contacts
+
+    def on_heading_click(self, event, extend=False):
+        if self.tree.identify_region(event.x, event.y) != 'heading':
+            return
+        column = self.tree.column(self.tree.identify_column(event.x), 'id')
+        if column not in self.column_titles:
+            return
+        if not self.sorter.toggle(column, extend):
+            self.sorter.rebuild(())
+        for column, title in self.sorter.headings(self.column_titles).items():
+            self.tree.heading(column, text=title)
+        self.update_contact_list(self.search_var.get())
 
-        contacts = self.address_book.search_contacts(keyword or "")
-        for contact in contacts:
-            self.tree.insert('', 'end', values=(
-                contact.name,
-                contact.phone,
-                contact.email
-            ))
+    @staticmethod
+    def row_values(contact):
+        return contact.name, contact.phone, contact.email
+
+    def on_contact_changed(self, event):
+        """通讯录变化时只改动对应的行；正在搜索时合并成一次重新搜索"""
+        if event.kind == UPDATED:
+            self.sorter.forget(event.item)
+        keyword = self.search_var.get()
+        if keyword:
+            if self.refresh_id is None:
+                self.refresh_id = self.root.after_idle(lambda: self.update_contact_list(self.search_var.get()))
+            return
+        contact = event.item
+        if self.sorter:
+            self.apply_sorted_change(event.kind, contact)
+            return
+        row = self.rows.get(contact)
+        if event.kind == DELETED:
+            if row is not None:
+                self.tree.delete(row)
+                del self.rows[contact]
+        elif row is not None:
+            self.tree.item(row, values=self.row_values(contact))
+        elif event.kind == INSERTED and len(self.rows) < DISPLAY_LIMIT:
+            self.rows[contact] = self.tree.insert('', 'end', values=self.row_values(contact))
+
+    def apply_sorted_change(self, kind, contact):
+        """排序状态下列表总是排序结果的前 DISPLAY_LIMIT 条，用 bisect 找到变化的位置"""
+        row = self.rows.get(contact)
+        if kind == DELETED:
+            self.sorter.remove(contact)
+            if row is not None:
+                self.tree.delete(self.rows.pop(contact))
+        elif kind == INSERTED:
+            pos = self.sorter.insert(contact)
+            if pos < DISPLAY_LIMIT:
+                self.rows[contact] = self.tree.insert('', pos, values=self.row_values(contact))
+        else:
+            _, pos = self.sorter.update(contact)
+            if row is not None and pos < DISPLAY_LIMIT:
+                self.tree.item(row, values=self.row_values(contact))
+                # 先摘下再放回，move 的位置就是最终位置
+                self.tree.detach(row)
+                self.tree.move(row, '', pos)
+            elif row is not None:
+                self.tree.delete(self.rows.pop(contact))
+            elif pos is not None and pos < DISPLAY_LIMIT:
+                self.rows[contact] = self.tree.insert('', pos, values=self.row_values(contact))
+        # 保持显示的正好是前 DISPLAY_LIMIT 条
+        if len(self.rows) > DISPLAY_LIMIT:
+            last = self.sorter.records(DISPLAY_LIMIT, DISPLAY_LIMIT + 1)[0]
+            self.tree.delete(self.rows.pop(last))
+        while len(self.rows) < min(DISPLAY_LIMIT, len(self.sorter)):
+            contact = self.sorter.records(len(self.rows), len(self.rows) + 1)[0]
+            self.rows[contact] = self.tree.insert('', 'end', values=self.row_values(contact))
+
+    def poll_contacts(self):
+        """合并其他程序的修改，列表通过变化事件随之更新"""
+        self.address_book.poll_changes()
+        self.poll_id = self.root.after(POLL_MS, self.poll_contacts)
 
     def on_search(self, event):
         self.update_contact_list(self.search_var.get())
@@ -387,16 +601,18 @@ class CyberpunkContactApp:
             try:
                 if contact:
                     # 更新现有联系人
-                    contact.__dict__.update(data)
-                    self.address_book.save_contacts()
+                    self.address_book.update_contact(contact, data)
                     self.show_cyber_message("成功", f"{data['name']} 已更新！")
                 else:
                     # 添加新联系人
                     self.address_book.add_contact(Contact(**data))
                     self.show_cyber_message("成功", f"{data['name']} 已添加！")
 
-                self.update_contact_list()
                 dialog.destroy()
+            except ConflictError as e:
+                # 内存中已是其他终端保存的最新内容，关闭对话框让用户重新编辑
+                dialog.destroy()
+                self.show_cyber_message("冲突", str(e), is_error=True)
             except Exception as e:
                 self.show_cyber_message("错误", f"保存失败: {str(e)}", is_error=True)
 
@@ -460,8 +676,13 @@ class CyberpunkContactApp:
             btn_frame.pack()
 
             def do_delete():
-                self.address_book.delete_contact(name)
-                self.update_contact_list()
+                try:
+                    self.address_book.delete_contact(name)
+                except ConflictError as e:
+                    # 同步服务上有人刚改过，内存中已是最新内容，什么也没删
+                    confirm_dialog.destroy()
+                    self.show_cyber_message("冲突", str(e), is_error=True)
+                    return
                 confirm_dialog.destroy()
                 self.show_cyber_message("成功", f"{name} 已删除！")
 
@@ -536,6 +757,43 @@ class CyberpunkContactApp:
                 detail_dialog.grab_set()
                 self.root.wait_window(detail_dialog)
 
+    def show_dedupe(self):
+        """打开查重窗口，已打开时提到最前"""
+        if self.dedupe:
+            self.dedupe.lift()
+            return
+        from dedupe_view import DedupeWindow
+
+        self.dedupe = DedupeWindow(self.root, self.address_book, self.colors, self.main_font,
+                                   on_close=self.forget_dedupe)
+
+    def forget_dedupe(self):
+        self.dedupe = None
+
+    def export_contacts(self):
+        """导出为 vCard 或 CSV；正在搜索时可以只导出搜索结果（按列表的排序）"""
+        from tkinter import filedialog, messagebox
+
+        keyword = self.search_var.get()
+        contacts = None
+        if keyword:
+            found = self.sorter.records(0, len(self.sorter)) if self.sorter else list(self.search_results(keyword))
+            only_found = messagebox.askyesnocancel(
+                "导出", f"只导出当前搜索结果（{len(found)} 条）？\n选择“否”导出全部 {len(self.address_book.contacts)} 条。")
+            if only_found is None:
+                return
+            if only_found:
+                contacts = found
+        path = filedialog.asksaveasfilename(title="导出通讯录", defaultextension=".vcf",
+                                            filetypes=[("vCard 4.0", "*.vcf"), ("CSV", "*.csv")])
+        if not path:
+            return
+        from export_view import ExportWindow
+
+        total = len(self.address_book.contacts if contacts is None else contacts)
+        ExportWindow(self.root, self.address_book.iter_records(contacts), total, path,
+                     self.colors, self.main_font)
+
     def show_about(self):
         about_dialog = tk.Toplevel(self.root)
         about_dialog.title(">_ 关于")
@@ -662,8 +920,21 @@ class CyberpunkContactApp:
         self.root.wait_window(msg_box)
 
 
+def write_startup_probe(root, path):
+    """启动测速：主窗口绘制完成后写入当前时间并退出（供 measure_startup.py 使用）"""
+    def done():
+        with open(path, 'w') as f:
+            f.write(repr(time.time()))
+        root.destroy()
+
+    root.update_idletasks()
+    root.after_idle(done)
+
+
 if __name__ == "__main__":
+    startup_profile.run_if_requested()
     root = tk.Tk()
+    instrument.install_if_enabled(root)
 
     # 添加启动动画
     splash = tk.Toplevel(root)
@@ -700,9 +971,12 @@ if __name__ == "__main__":
         splash.destroy()
         root.deiconify()  # 显示主窗口
         CyberpunkContactApp(root)  # 创建应用实例
+        if os.environ.get('TXL_STARTUP_PROBE'):
+            write_startup_probe(root, os.environ['TXL_STARTUP_PROBE'])
 
 
     root.after(100, update_progress)
     root.withdraw()
+    startup_profile.watch_first_paint(root)
 
     root.mainloop()
\ No newline at end of file
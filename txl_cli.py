@@ -0,0 +1,580 @@
+"""通讯录和特工数据库的命令行工具（不导入 tkinter，适合写成定时批处理）
+
+用法:
+    python txl_cli.py search contacts.json 张伟 [--ranked | --text] [--limit 20]
+    python txl_cli.py search agents.ciadb "location:莫斯科 status:活跃"
+    python txl_cli.py export contacts.snap [-o contacts.jsonl] [--format jsonl|csv|vcf]
+    python txl_cli.py import contacts.json [-i new.csv] [--format jsonl|csv] [--jobs 8]
+    python txl_cli.py convert agents.ciadb agents.sqlite
+    python txl_cli.py convert dump.jsonl agents.sqlite --jobs 8
+    python txl_cli.py compact contacts.snap
+    python txl_cli.py stats agents.ciadb [--stale-days 30]
+
+文件类型按扩展名判断：.json 通讯录（数组）或特工数据库（对象），.snap 通讯录快照，
+.ciadb 特工数据库，.db / .sqlite / .sqlite3 为 SQLite（表 contacts 或 agents），
+.jsonl / .csv 为导出的记录流，只能作为导入或转换的来源。
+-i / -o 缺省或为 - 时读写标准输入输出，按行流式处理，可以接在管道里：
+    python txl_cli.py export agents.ciadb | grep 莫斯科 | python txl_cli.py import moscow.sqlite
+每条记录一行 JSON（jsonl），特工记录带 agent_id 字段；也可以用 --format csv。
+从文件导入或转换 .jsonl / .csv 时用 --jobs 多进程分片解析校验（见 parallel_ingest.py），
+导入的记录先去重，已有的联系人不重复添加，同编号的特工档案覆盖。
+为了启动快，各子命令用到的模块在子命令里才导入。
+"""
+import argparse
+import json
+import os
+import sys
+
+CONTACTS = "contacts"
+AGENTS = "agents"
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+STREAM_SUFFIXES = (".jsonl", ".csv")
+CONTACT_COLUMNS = ("id", "name", "phone", "email", "address", "version")
+# 写文件时攒够这么多行再一次写出
+WRITE_BATCH = 1000
+
+
+class CliError(Exception):
+    pass
+
+
+def suffix(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def detect_kind(path, default=None):
+    """判断文件是通讯录还是特工数据库；新文件无法判断时用 default"""
+    ext = suffix(path)
+    if ext == ".ciadb":
+        return AGENTS
+    if ext == ".snap":
+        return CONTACTS
+    if os.path.exists(path) and os.path.getsize(path):
+        if ext in SQLITE_SUFFIXES:
+            tables = sqlite_tables(path)
+            for kind in (AGENTS, CONTACTS):
+                if kind in tables:
+                    return kind
+        elif ext in STREAM_SUFFIXES:
+            with open(path, "r", encoding="utf-8") as f:
+                return AGENTS if "agent_id" in f.readline() else CONTACTS
+        elif ext == ".json":
+            with open(path, "r", encoding="utf-8") as f:
+                first = f.read(64).lstrip()[:1]
+            if first in ("[", "{"):
+                return CONTACTS if first == "[" else AGENTS
+        else:
+            raise CliError(f"不支持的文件类型: {path}")
+    if default is None:
+        raise CliError(f"无法判断 {path} 是通讯录还是特工数据库，请用 --kind 指定")
+    return default
+
+
+def check_target(path, kind):
+    ext = suffix(path)
+    if (ext == ".ciadb" and kind != AGENTS) or (ext == ".snap" and kind != CONTACTS):
+        raise CliError(f"{path} 不能保存{'通讯录' if kind == CONTACTS else '特工数据库'}")
+    if ext not in (".json", ".ciadb", ".snap") + SQLITE_SUFFIXES:
+        raise CliError(f"不支持的文件类型: {path}")
+
+
+def agent_columns():
+    import agent_schema
+
+    return ("agent_id",) + agent_schema.FIELD_NAMES
+
+
+def columns_of(kind):
+    return CONTACT_COLUMNS if kind == CONTACTS else agent_columns()
+
+
+# 标准输入输出与记录流
+
+def open_input(path):
+    if path in (None, "-"):
+        sys.stdin.reconfigure(encoding="utf-8")
+        return sys.stdin
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def open_output(path):
+    if path in (None, "-"):
+        sys.stdout.reconfigure(encoding="utf-8")
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def write_stream(f, records, fmt, columns):
+    """records 为 {字段: 值} 的可迭代对象，返回写出的条数"""
+    count = 0
+    if fmt == "csv":
+        import csv
+
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for count, record in enumerate(records, 1):
+            writer.writerow(record)
+        return count
+    batch = []
+    for count, record in enumerate(records, 1):
+        batch.append(json.dumps(record, ensure_ascii=False))
+        if len(batch) >= WRITE_BATCH:
+            f.write("\n".join(batch) + "\n")
+            batch = []
+    if batch:
+        f.write("\n".join(batch) + "\n")
+    f.flush()
+    return count
+
+
+# 通讯录记录：{id, name, phone, email, address, version}
+# 特工记录：(特工编号, Agent)，输出时转成带 agent_id 的字典
+
+def agent_record(item):
+    agent_id, agent = item
+    return dict(agent.to_dict(), agent_id=agent_id)
+
+
+def read_records(path, kind, jobs=1):
+    """按文件类型流式读出记录（JSON 和 .ciadb 本身是一个整体，只能整体读入；
+    .jsonl / .csv 先校验去重，jobs 为进程数）"""
+    import parallel_ingest
+    from parallel_ingest import contact_record
+
+    ext = suffix(path)
+    if ext in STREAM_SUFFIXES:
+        yield from parallel_ingest.ingest(path, kind, jobs=jobs).values()
+    elif ext in SQLITE_SUFFIXES:
+        yield from sqlite_read(path, kind)
+    elif kind == CONTACTS and ext == ".snap":
+        from addressbook import SNAPSHOT_FIELDS
+        from snapshot import SnapshotTable
+
+        table = SnapshotTable(path, SNAPSHOT_FIELDS)
+        try:
+            for record in table.records():
+                yield contact_record(record)
+        finally:
+            table.close()
+    elif kind == CONTACTS:
+        with open(path, "r", encoding="utf-8") as f:
+            for record in json.load(f):
+                yield contact_record(record)
+    else:
+        import agent_schema
+        import agent_store
+
+        # 已有的数据库：旧档案里解析不了的值按原文保留并警告，不让整个文件读不出来
+        yield from agent_schema.coerce_all(agent_store.load_db(path), strict=False).items()
+
+
+def write_records(path, kind, records):
+    """把记录流写成 path（覆盖），返回条数"""
+    check_target(path, kind)
+    ext = suffix(path)
+    if ext in SQLITE_SUFFIXES:
+        # 先写临时文件，记录有错时原来的数据库保持原样
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            count = sqlite_write(tmp_path, kind, records)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+    if kind == CONTACTS and ext == ".snap":
+        import snapshot
+        from addressbook import SNAPSHOT_FIELDS, snapshot_record
+
+        return snapshot.write_snapshot(path, map(snapshot_record, records), SNAPSHOT_FIELDS)
+    if kind == CONTACTS:
+        return write_contacts_json(path, records)
+    import agent_store
+
+    agents = dict(records)
+    agent_store.dump_db(agents, path, encoded=ext == ".ciadb")
+    return len(agents)
+
+
+def write_contacts_json(path, records):
+    """流式写出 AddressBook 能直接打开的 JSON 数组，缺编号的补上"""
+    from addressbook import new_contact_id
+
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for count, record in enumerate(records, 1):
+            record["id"] = record["id"] or new_contact_id()
+            f.write(("," if count > 1 else "") + "\n" + json.dumps(record))
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+    return count
+
+
+def output_record(kind, record):
+    return record if kind == CONTACTS else agent_record(record)
+
+
+# SQLite
+
+def sqlite_tables(path):
+    import sqlite3
+
+    try:
+        db = sqlite3.connect(path)
+        try:
+            return {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        raise sqlite_error(path, e) from e
+
+
+def sqlite_error(path, error):
+    """sqlite3 的异常（文件不是数据库、表结构不对等）转成 CliError"""
+    return CliError(f"{path}: SQLite 出错: {error}")
+
+
+def sqlite_schema(kind):
+    if kind == CONTACTS:
+        return ("CREATE TABLE IF NOT EXISTS contacts (id TEXT PRIMARY KEY, name TEXT, phone TEXT, "
+                "email TEXT, address TEXT, version INTEGER)")
+    # 年龄和时间用整数列，可以直接在 SQL 里做范围查询
+    return ("CREATE TABLE IF NOT EXISTS agents (agent_id TEXT PRIMARY KEY, codename TEXT, age INTEGER, "
+            "status TEXT, clearance TEXT, location TEXT, last_contact INTEGER, missions TEXT, "
+            "created INTEGER, modified INTEGER)")
+
+
+def sqlite_read(path, kind, where=None, params=()):
+    """读出 kind 表的记录；where 为 SQL 条件（参数用 ? 占位）时只读出满足条件的行"""
+    import sqlite3
+
+    import agent_schema
+    from parallel_ingest import contact_record
+
+    unparsed = []
+    try:
+        db = sqlite3.connect(path)
+        try:
+            db.row_factory = sqlite3.Row
+            sql = f"SELECT * FROM {kind}" + (f" WHERE {where}" if where else "")
+            for row in db.execute(sql, params):
+                record = dict(row)
+                if kind == CONTACTS:
+                    yield contact_record(record)
+                else:
+                    agent_id = record.pop("agent_id")
+                    raw = {k: v for k, v in record.items() if v is not None}
+                    agent, fields = agent_schema.coerce_saved(raw)
+                    unparsed.extend((agent_id, field, raw[field]) for field in fields)
+                    yield agent_id, agent
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        raise sqlite_error(path, e) from e
+    if kind == AGENTS:
+        agent_schema.warn_unparsed(unparsed)
+
+
+def sqlite_write(path, kind, records):
+    """插入或替换记录（同编号的覆盖），整批在一个事务里"""
+    import sqlite3
+
+    columns = columns_of(kind)
+    if kind == AGENTS:
+        # agent[field]：旧档案里解析不了的值按原文写入（SQLite 的整数列也能存文字）
+        records = ((agent_id,) + tuple(agent[field] for field in columns[1:])
+                   for agent_id, agent in records)
+    else:
+        from addressbook import new_contact_id
+
+        records = ((record["id"] or new_contact_id(),) + tuple(record[field] for field in columns[1:])
+                   for record in records)
+    counter = Counter(records)
+    try:
+        db = sqlite3.connect(path)
+        try:
+            with db:
+                db.execute(sqlite_schema(kind))
+                db.executemany(f"INSERT OR REPLACE INTO {kind} ({', '.join(columns)}) "
+                               f"VALUES ({', '.join('?' * len(columns))})", counter)
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        raise sqlite_error(path, e) from e
+    return counter.count
+
+
+class Counter:
+    """数着条数把可迭代对象原样传下去"""
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.iterable:
+            self.count += 1
+            yield item
+
+
+# 子命令
+
+def cmd_search(args):
+    kind = detect_kind(args.file)
+    if suffix(args.file) in SQLITE_SUFFIXES:
+        results = sqlite_search(args.file, kind, args.query)
+    elif kind == CONTACTS:
+        from addressbook import AddressBook
+        from parallel_ingest import contact_record
+
+        book = AddressBook(args.file)
+        if args.ranked:
+            found = book.search_ranked(args.query, args.limit or 20)
+        elif args.text:
+            found = book.search_text(args.query)
+        else:
+            found = book.search_contacts(args.query)
+        results = (contact_record(vars(contact)) for contact in found)
+    else:
+        import agent_store
+
+        store = agent_store.AgentStore()
+        store.load(args.file)
+        results = ((agent_id, store[agent_id]) for agent_id in store.search(args.query))
+    if args.limit:
+        import itertools
+
+        results = itertools.islice(results, args.limit)
+    records = (output_record(kind, record) for record in results)
+    write_stream(open_output(args.output), records, args.format, columns_of(kind))
+
+
+def sqlite_search(path, kind, query):
+    """SQLite 里用 LIKE 匹配文字字段，只读出匹配的行"""
+    fields = ("name", "phone", "email", "address") if kind == CONTACTS else (
+        "agent_id", "codename", "status", "clearance", "location", "missions")
+    where = " OR ".join(f"{field} LIKE ?" for field in fields)
+    return sqlite_read(path, kind, where, [f"%{query}%"] * len(fields))
+
+
+def cmd_export(args):
+    kind = detect_kind(args.file)
+    records = (output_record(kind, record) for record in read_records(args.file, kind))
+    if args.format == "vcf":
+        if kind != CONTACTS:
+            raise CliError("只有通讯录可以导出为 vCard")
+        import contact_export
+
+        count = contact_export.write(open_output(args.output), records, contact_export.VCF)
+    else:
+        count = write_stream(open_output(args.output), records, args.format, columns_of(kind))
+    print(f"已导出 {count} 条", file=sys.stderr)
+
+
+def cmd_import(args):
+    kind = detect_kind(args.file, args.kind)
+    check_target(args.file, kind)
+    records = read_input(args, kind)
+    ext = suffix(args.file)
+    if kind == CONTACTS:
+        import parallel_ingest
+
+        if ext in SQLITE_SUFFIXES:
+            existing = sqlite_read(args.file, kind) if os.path.exists(args.file) else ()
+            fresh = parallel_ingest.new_contacts(records, existing)
+            sqlite_write(args.file, kind, fresh)
+        else:
+            from addressbook import AddressBook, Contact
+
+            book = AddressBook(args.file)
+            fresh = parallel_ingest.new_contacts(records, (vars(contact) for contact in book.contacts))
+            book.add_contacts(Contact(**record) for record in fresh)
+            book.close()
+        skipped = len(records) - len(fresh)
+        print(f"已导入 {len(fresh)} 条到 {args.file}" + (f"，跳过已有的 {skipped} 条" if skipped else ""),
+              file=sys.stderr)
+        return
+    if ext in SQLITE_SUFFIXES:
+        sqlite_write(args.file, kind, records)
+    else:
+        import agent_store
+
+        store = agent_store.AgentStore()
+        encoded = ext == ".ciadb"
+        if os.path.exists(args.file):
+            store.load(args.file)
+            encoded = not is_plain(args.file)
+        for agent_id, agent in records:
+            store.put(agent_id, agent)
+        store.save(args.file, encoded=encoded)
+    print(f"已导入 {len(records)} 条到 {args.file}", file=sys.stderr)
+
+
+def read_input(args, kind):
+    """读入并校验要导入的记录，同一记录出现多次时只留最后一次；
+    返回去重字典的 values()，标准输入按批解析，不整个读进内存"""
+    import parallel_ingest
+
+    if args.input in (None, "-"):
+        return parallel_ingest.ingest_stream(open_input(args.input), kind, args.format or "jsonl").values()
+    return parallel_ingest.ingest(args.input, kind, args.format, args.jobs).values()
+
+
+def is_plain(path):
+    """.ciadb 是明文 JSON（33.py 保存的）还是 base64"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read(64).lstrip().startswith("{")
+
+
+def cmd_convert(args):
+    kind = detect_kind(args.source)
+    if os.path.abspath(args.source) == os.path.abspath(args.target):
+        raise CliError("源文件和目标文件相同")
+    count = write_records(args.target, kind, read_records(args.source, kind, args.jobs))
+    print(f"已把 {count} 条{'联系人' if kind == CONTACTS else '特工档案'}写入 {args.target}", file=sys.stderr)
+
+
+def cmd_compact(args):
+    kind = detect_kind(args.file)
+    ext = suffix(args.file)
+    if ext in SQLITE_SUFFIXES:
+        import sqlite3
+
+        try:
+            db = sqlite3.connect(args.file)
+            try:
+                db.execute("VACUUM")
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            raise sqlite_error(args.file, e) from e
+    elif kind == CONTACTS:
+        # 快照合并增量日志；JSON 通讯录重写一遍
+        from addressbook import AddressBook
+
+        book = AddressBook(args.file)
+        book.compact()
+        book.close()
+    else:
+        # 重写时统一年龄和时间的格式，并刷新全文索引文件
+        import agent_store
+
+        store = agent_store.AgentStore()
+        store.load(args.file)
+        store.save(args.file, encoded=ext == ".ciadb" and not is_plain(args.file))
+    print(f"已整理 {args.file}", file=sys.stderr)
+
+
+def cmd_stats(args):
+    kind = detect_kind(args.file)
+    records = read_records(args.file, kind)
+    stats = contact_stats(records) if kind == CONTACTS else agent_stats(dict(records), args.stale_days)
+    out = open_output(args.output)
+    out.write(json.dumps(stats, ensure_ascii=False, indent=2) + "\n")
+
+
+def contact_stats(records):
+    from collections import Counter as Tally
+
+    count = no_phone = no_email = 0
+    domains = Tally()
+    for count, record in enumerate(records, 1):
+        no_phone += not record["phone"]
+        no_email += not record["email"]
+        if "@" in record["email"]:
+            domains[record["email"].rsplit("@", 1)[1].lower()] += 1
+    return {"联系人": count, "缺少电话": no_phone, "缺少邮箱": no_email,
+            "邮箱域名前十": dict(domains.most_common(10))}
+
+
+def agent_stats(agents, stale_days):
+    import agent_schema
+    import agent_store
+
+    store = agent_store.AgentStore(agents)
+    ages = [agent.age for agent in store.agents.values() if agent.age is not None]
+    cutoff = agent_schema.current_timestamp() - int(stale_days * 86400)
+    return {
+        "特工": len(store),
+        "状态": dict(store.counts),
+        "风险": store.risk_summary(),
+        f"失联超过{stale_days:g}天": store.stale_count(cutoff),
+        "年龄": {"最小": min(ages), "最大": max(ages), "平均": round(sum(ages) / len(ages), 1)} if ages else {},
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="txl_cli", description="通讯录与特工数据库命令行工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, func, help_text):
+        command = commands.add_parser(name, help=help_text)
+        command.set_defaults(func=func)
+        return command
+
+    def add_format(command, default="jsonl"):
+        command.add_argument("--format", choices=("jsonl", "csv"), default=default, help="记录格式")
+
+    def add_jobs(command):
+        command.add_argument("-j", "--jobs", type=int, default=1,
+                             help="解析 .jsonl / .csv 的进程数，0 为 CPU 核数")
+
+    search = add("search", cmd_search, "搜索，结果输出到标准输出")
+    search.add_argument("file")
+    search.add_argument("query")
+    mode = search.add_mutually_exclusive_group()
+    mode.add_argument("--ranked", action="store_true", help="按相关度排序（拼音、首字母、容错）")
+    mode.add_argument("--text", action="store_true", help="全文检索，支持 address:广州 这样的字段过滤")
+    search.add_argument("--limit", type=int, default=None)
+    search.add_argument("-o", "--output", default="-")
+    add_format(search)
+
+    export = add("export", cmd_export, "导出全部记录")
+    export.add_argument("file")
+    export.add_argument("-o", "--output", default="-")
+    export.add_argument("--format", choices=("jsonl", "csv", "vcf"), default="jsonl",
+                        help="记录格式；vcf 为 vCard 4.0，只用于通讯录")
+
+    imp = add("import", cmd_import, "从标准输入或文件追加记录")
+    imp.add_argument("file")
+    imp.add_argument("-i", "--input", default="-")
+    imp.add_argument("--kind", choices=(CONTACTS, AGENTS), help="新建 .json 或 SQLite 文件时指定类型")
+    add_format(imp, default=None)
+    add_jobs(imp)
+
+    convert = add("convert", cmd_convert, "转换格式：JSON / .snap / .ciadb / SQLite，来源还可以是 .jsonl / .csv")
+    convert.add_argument("source")
+    convert.add_argument("target")
+    add_jobs(convert)
+
+    compact = add("compact", cmd_compact, "合并快照增量、重写 JSON/.ciadb 或 VACUUM SQLite")
+    compact.add_argument("file")
+
+    stats = add("stats", cmd_stats, "统计信息（JSON）")
+    stats.add_argument("file")
+    stats.add_argument("--stale-days", type=float, default=30, help="失联阈值（天）")
+    stats.add_argument("-o", "--output", default="-")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # 输出接到 head 之类提前退出的命令时，不打印异常
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except (CliError, ValueError, OSError) as e:
+        # ValueError：导入的记录不合法（IngestError、SchemaError）或文件内容损坏；
+        # OSError：文件不存在、没有权限等
+        sys.exit(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 启动优化版打包配置：pyinstaller txl_fast.spec
+#
+# 与 txl.spec 相比：
+#   * 输出 onedir 目录（dist/txl_fast/），启动时不再把整个程序解压到临时目录
+#   * 排除通讯录用不到的标准库模块和 Tcl/Tk 数据文件，PYZ 和目录体积更小
+#   * 字节码按 optimize=2 编译，并关闭 UPX（UPX 压缩的 DLL 每次启动都要解压）
+# 用 measure_startup.py 对比两种打包结果的启动耗时。
+
+# 通讯录用不到的模块（random 仍被二进制雨效果使用，不能排除）
+EXCLUDES = [
+    'asyncio', 'bz2', 'concurrent', 'decimal', '_pydecimal', 'doctest',
+    'email', 'fractions', 'ftplib', 'http', 'idlelib', 'lib2to3', 'lzma',
+    'multiprocessing', 'pdb', 'pydoc', 'sqlite3', 'ssl', 'statistics',
+    'tarfile', 'tracemalloc', 'turtle', 'turtledemo', 'unittest',
+    'xml', 'xmlrpc',
+    # 用不到的 Tk 组件
+    'tkinter.dnd', 'tkinter.tix', 'tkinter.scrolledtext', 'tkinter.test',
+    # JSON 替代实现及其它第三方库
+    'simplejson', 'ujson', 'orjson', 'numpy', 'PIL',
+]
+
+# 不需要打包的 Tcl/Tk 数据：时区库、多语言消息、示例图片和测试包
+TCL_TK_EXCLUDES = (
+    '_tcl_data/tzdata/', '_tcl_data/msgs/', '_tk_data/msgs/',
+    '_tk_data/images/', '_tk_data/demos/', 'tcl8/8.5/tcltest',
+)
+
+
+a = Analysis(
+    ['txl.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=2,
+)
+a.datas = [d for d in a.datas
+           if not d[0].replace('\\', '/').startswith(TCL_TK_EXCLUDES)]
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='txl',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='txl_fast',
+)